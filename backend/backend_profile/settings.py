@@ -38,6 +38,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS debe ir primero
+    'usuarios.metrics.MetricsMiddleware',  # Peticiones, latencia y consultas por ruta
+    'usuarios.instrumentation.RequestInstrumentationMiddleware',  # Mide todo lo que sigue
+    'usuarios.compression.CompressionMiddleware',  # Antes de cualquier middleware que lea el cuerpo
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,10 +71,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend_profile.wsgi.application'
 
 # Database
+# Pragmas de SQLite aplicados al abrir cada conexión
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # los lectores no esperan a la transacción de escritura
+    'synchronous': 'NORMAL',  # seguro con WAL: fsync solo en los checkpoints
+    'cache_size': -64000,  # negativo = KiB: 64 MB de caché de páginas por conexión
+    'mmap_size': 256 * 1024 * 1024,  # bytes
+    'busy_timeout': 5000,  # ms esperando el lock de escritura antes de "database is locked"
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexión persistente por hilo (se reutiliza entre peticiones)
+        'CONN_MAX_AGE': 600,  # segundos
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # BEGIN IMMEDIATE: la transacción toma el lock de escritura al empezar y
+            # espera busy_timeout, en lugar de fallar al pasar de lectura a escritura
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -105,19 +127,31 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Envío de los archivos media (usuarios.media)
+MEDIA_SERVING = {
+    # None = FileResponse (sendfile con gunicorn); 'x-accel-redirect' detrás de nginx;
+    # 'x-sendfile' con Apache mod_xsendfile o lighttpd
+    'BACKEND': None,
+    'ACCEL_PREFIX': '/protected-media/',  # location internal de nginx con alias a MEDIA_ROOT
+    'MAX_AGE': 365 * 24 * 60 * 60,  # los nombres de perfiles/ son únicos: immutable
+    'IMMUTABLE_PREFIXES': ['perfiles/'],
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.authentication.CachedJWTAuthentication',
+        'usuarios.authentication.BatchSubrequestAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # Mismos bytes que JSONRenderer, serializados con orjson si está instalado
+        'usuarios.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
@@ -152,6 +186,97 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# Revocación de refresh tokens rotados (usuarios.revocation). Reemplaza a
+# rest_framework_simplejwt.token_blacklist para BLACKLIST_AFTER_ROTATION
+TOKEN_REVOCATION = {
+    'CAPACITY': 100000,  # revocaciones vigentes esperadas (tamaño del filtro de Bloom)
+    'ERROR_RATE': 0.001,
+    'PRUNE_INTERVAL': timedelta(hours=1),  # limpieza de tokens ya expirados
+}
+
+# Vistas async nativas (usuarios.async_views) para login, perfil, user/info y
+# status. Activar cuando se sirve con ASGI: uvicorn backend_profile.asgi:application
+ASYNC_API_VIEWS = False
+
+# Pools de hilos para trabajo bloqueante (usuarios.executors)
+# WORKERS: hilos; MAX_QUEUE: trabajos en espera antes de rechazar (None = sin límite)
+EXECUTORS = {
+    # Hashes simultáneos en login. MAX_QUEUE solo aplica en ASGI; en WSGI el
+    # hash ocupa el hilo del request y se admiten SYNC_MAX_CONCURRENT por
+    # proceso, menos que GUNICORN_THREADS para que quede un hilo libre que
+    # responda 503 en lugar de encolar en gunicorn
+    'hashing': {'WORKERS': 4, 'MAX_QUEUE': 16, 'SYNC_MAX_CONCURRENT': 3},
+    'images': {'WORKERS': 2, 'MAX_QUEUE': None},  # derivados de fotos; 0 = generar en el request
+    'batch': {'WORKERS': 4, 'MAX_QUEUE': None},  # lecturas en paralelo de /batch/; 0 = en orden
+}
+
+# Control de admisión de login (usuarios.login)
+LOGIN_ADMISSION = {
+    'MAX_FAILURES': 5,  # fallos por usuario/IP antes de responder 429
+    'FAILURE_WINDOW': 300,  # segundos
+    'REJECT_UNKNOWN_USERS': False,  # True = sin hash para usernames inexistentes (permite enumerarlos)
+    'RETRY_AFTER': 1,  # segundos, cuando el pool de hashing está saturado
+}
+
+# Compresión de respuestas (usuarios.compression.CompressionMiddleware)
+# brotli y zstd solo se ofrecen si los paquetes brotli / zstandard están instalados
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,  # bytes; los sobres pequeños se envían sin comprimir
+    'ENCODINGS': ['zstd', 'br', 'gzip'],  # preferencia ante el mismo q
+    'GZIP_LEVEL': 6,
+    # Respuestas con tokens: sin compresión (BREACH)
+    'EXCLUDED_PATHS': ['/usuarios/api/login/', '/usuarios/api/token/refresh/'],
+}
+
+# Consultas y tiempos por petición (cabecera Server-Timing)
+# Las peticiones fuera de presupuesto se escriben en el log usuarios.instrumentation
+REQUEST_INSTRUMENTATION = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    # Server-Timing expone consultas y tiempos de BD: solo con DEBUG o para estas IPs
+    'SERVER_TIMING_ALLOWED_IPS': ['127.0.0.1', '::1'],
+    'MAX_QUERIES': 20,  # None = sin límite
+    'MAX_DURATION_MS': 1000,  # el login (PBKDF2) ya ronda los 500 ms
+    'LOGGED_FINGERPRINTS': 5,  # huellas SQL incluidas en cada entrada del log
+    'MAX_CAPTURED_QUERIES': 200,  # SQL guardado por petición para esas huellas
+}
+
+# Escritura diferida de last_login (usuarios.writebehind)
+# Un valor tarda como máximo FLUSH_INTERVAL segundos en llegar a la base de datos
+WRITE_BEHIND = {
+    'FLUSH_INTERVAL': 5,  # segundos; 0 = escribir en cada login
+    'MAX_PENDING': 1000,  # usuarios pendientes que adelantan la escritura
+    'BATCH_SIZE': 500,
+}
+
+# Métricas de Prometheus (GET /usuarios/api/metrics/)
+METRICS = {
+    # Directorio compartido por los workers de gunicorn (un archivo mmap por proceso);
+    # gunicorn.conf.py lo vacía al arrancar. None = solo este proceso
+    'DIRECTORY': BASE_DIR / 'tmp_metrics',
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],  # el scraper de Prometheus; None = cualquiera
+}
+
+# Caché de perfiles serializados (get_profile)
+# BACKEND: 'usuarios.cache.LocMemLRUBackend' o 'usuarios.cache.DjangoCacheBackend'
+PROFILE_CACHE = {
+    'BACKEND': 'usuarios.cache.LocMemLRUBackend',
+    'TIMEOUT': 60,  # segundos
+    'KEY_PREFIX': 'perfil',
+    'OPTIONS': {
+        'MAX_ENTRIES': 1000,
+        # Para DjangoCacheBackend: 'ALIAS': 'default'
+    },
+}
+
+# Instantáneas de User/Profile usadas por CachedJWTAuthentication (por
+# proceso). TIMEOUT es la ventana máxima en la que otro worker sigue aceptando
+# a un usuario desactivado o con la contraseña cambiada.
+AUTH_SNAPSHOT_CACHE = {
+    'TIMEOUT': 60,  # segundos
+    'MAX_ENTRIES': 10000,
+}
+
 # CORS settings para desarrollo
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -171,12 +296,22 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-match',
+    'if-modified-since',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
 ]
 
+# Headers legibles desde el frontend (peticiones condicionales)
+CORS_EXPOSE_HEADERS = [
+    'etag',
+    'last-modified',
+    'retry-after',
+]
+
 # Métodos permitidos
 CORS_ALLOW_METHODS = [
     'DELETE',
@@ -191,6 +326,22 @@ CORS_ALLOW_METHODS = [
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024   # 5MB
 
+# Derivados de fotos de perfil (usuarios.images)
+PROFILE_PHOTO_VARIANTS = {
+    'SIZES': [64, 256, 512],  # px, lado mayor
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 82,
+    # Hilos que los generan: EXECUTORS['images']
+}
+
+# Subidas de fotos por bloques (usuarios.uploads)
+PHOTO_UPLOADS = {
+    'TEMP_DIR': BASE_DIR / 'tmp_uploads',  # mismo disco que MEDIA_ROOT
+    'MAX_CHUNK_SIZE': 1024 * 1024,  # 1MB
+    'TTL': timedelta(hours=24),
+    'MAX_ACTIVE_PER_USER': 3,  # subidas sin finalizar por usuario
+}
+
 # Configuración de logging
 LOGGING = {
     'version': 1,
@@ -6,12 +6,17 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from usuarios.views import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('usuarios/api/', include('usuarios.urls')),
 ]
 
-# Servir archivos media en desarrollo
+# Archivos media (también en producción; ver usuarios.media)
+if '://' not in settings.MEDIA_URL:
+    urlpatterns.append(path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', serve_media, name='media'))
+
+# Servir archivos estáticos en desarrollo
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
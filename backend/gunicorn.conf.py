@@ -0,0 +1,28 @@
+"""
+Configuración de gunicorn para producción.
+
+Uso: gunicorn -c gunicorn.conf.py
+
+Los workers comparten las métricas a través de ``settings.METRICS['DIRECTORY']``
+(un archivo por proceso); ``on_starting`` borra los de la ejecución anterior.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_profile.settings')
+
+wsgi_app = 'backend_profile.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8010')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+# Mayor que EXECUTORS['hashing']['SYNC_MAX_CONCURRENT']: un hilo sin hash
+# responde 503 a los logins que no caben
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Reciclar los workers de vez en cuando; sus contadores se siguen sumando
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def on_starting(server):
+    """En el proceso maestro, antes de crear los workers"""
+    from usuarios.metrics import clear_directory
+
+    clear_directory()
@@ -1,10 +1,32 @@
 """
 Configuración del panel de administración
 """
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from . import search
+from .importers import PROFILE_COLUMNS, USER_COLUMNS, ProfileImporter, iter_rows
 from .models import Profile
+from .pagination import EstimatedCountPaginator
+
+# Máximo de filas rechazadas que se muestran tras una importación
+MAX_ERROR_ROWS_SHOWN = 200
+
+
+class ProfileImportForm(forms.Form):
+    """Formulario de importación masiva de perfiles"""
+    archivo = forms.FileField(help_text='Archivo CSV o XLSX')
+    chunk_size = forms.IntegerField(
+        label='Filas por bloque',
+        initial=1000,
+        min_value=1,
+        max_value=50000
+    )
 
 
 class ProfileInline(admin.StackedInline):
@@ -35,6 +57,17 @@ class CustomUserAdmin(UserAdmin):
     inlines = (ProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'get_tipo_usuario')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'profile__tipo_usuario')
+    # Una sola consulta por página (get_tipo_usuario) y sin COUNT(*) sobre la tabla
+    list_select_related = ('profile',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Buscar con el índice FTS5 en lugar de LIKE '%term%'"""
+        match = search.build_match_query(search_term)
+        if not match or not search.fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search.matching_user_ids(match)), False
     
     def get_tipo_usuario(self, obj):
         """Obtener tipo de usuario del perfil"""
@@ -54,6 +87,10 @@ class ProfileAdmin(admin.ModelAdmin):
     list_filter = ('tipo_usuario', 'tipo_naturaleza', 'esta_verificado', 'created_at')
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'user__email', 'telefono')
     readonly_fields = ('created_at', 'updated_at')
+    # Una sola consulta por página (user, get_full_name) y sin COUNT(*) sobre la tabla
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Usuario', {
@@ -78,10 +115,71 @@ class ProfileAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_search_results(self, request, queryset, search_term):
+        """Buscar con el índice FTS5 en lugar de LIKE '%term%'"""
+        match = search.build_match_query(search_term)
+        if not match or not search.fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search.matching_profile_ids(match)), False
+    
     def get_full_name(self, obj):
         """Obtener nombre completo"""
         return obj.full_name or 'Sin nombre'
     get_full_name.short_description = 'Nombre Completo'
+    
+    def get_urls(self):
+        """Agregar la vista de importación masiva"""
+        urls = [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.import_view),
+                name='usuarios_profile_import'
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def import_view(self, request):
+        """Importar usuarios y perfiles desde un archivo CSV o XLSX"""
+        if not (self.has_add_permission(request) and request.user.has_perm('auth.add_user')):
+            raise PermissionDenied
+        
+        error_rows = []
+        error_count = 0
+        form = ProfileImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            # En el proceso del request: sin pool de procesos. Los archivos
+            # grandes se importan con el comando import_profiles
+            importer = ProfileImporter(
+                chunk_size=form.cleaned_data['chunk_size'],
+                workers=1,
+                max_error_rows=MAX_ERROR_ROWS_SHOWN,
+            )
+            try:
+                result = importer.run(iter_rows(archivo, archivo.name))
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                error_rows = result.error_rows
+                error_count = result.errors
+                level = messages.WARNING if result.errors else messages.SUCCESS
+                messages.add_message(
+                    request, level,
+                    f'Filas procesadas: {result.rows_done}. '
+                    f'Creados: {result.created}. Errores: {result.errors}.'
+                )
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar perfiles',
+            'form': form,
+            'columns': USER_COLUMNS + PROFILE_COLUMNS,
+            'error_rows': error_rows,
+            'error_count': error_count,
+            'error_rows_truncated': error_count > len(error_rows),
+        }
+        return TemplateResponse(request, 'admin/usuarios/profile/import_profiles.html', context)
 
 
 # Re-registrar UserAdmin con la configuración personalizada
@@ -11,4 +11,14 @@ class UsuariosConfig(AppConfig):
     
     def ready(self):
         """Importar signals cuando la app esté lista"""
-        import usuarios.models  # Esto asegura que los signals se registren
\ No newline at end of file
+        import usuarios.models  # Esto asegura que los signals se registren
+        import usuarios.checks  # noqa: F401
+        from django.db.models.signals import post_migrate, pre_migrate
+        from usuarios import counts, search
+        
+        # Triggers del índice FTS5 fuera de las reconstrucciones de tablas
+        pre_migrate.connect(search.suspend_index, sender=self)
+        post_migrate.connect(search.restore_index, sender=self)
+        # Igual para los triggers de los contadores de filas
+        pre_migrate.connect(counts.suspend_counts, sender=self)
+        post_migrate.connect(counts.restore_counts, sender=self)
@@ -0,0 +1,278 @@
+"""
+Vistas async nativas para servir la API bajo ASGI.
+
+Devuelven exactamente las mismas respuestas que ``usuarios.views`` pero sin
+pasar por ``sync_to_async`` en cada petición: la autenticación y la caché de
+perfiles se resuelven en memoria y solo los fallos de caché y las escrituras
+tocan el ORM. El hash de contraseñas se ejecuta en el pool acotado de
+``usuarios.executors`` con el control de admisión de ``usuarios.login``.
+
+Se activan con ``ASYNC_API_VIEWS = True`` (ver ``usuarios/urls.py``).
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, serializers, status
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import CachedJWTAuthentication
+from .cache import get_profile_cache
+from .conditional import (
+    PreconditionFailed,
+    get_profile_validators,
+    is_conditional,
+    lookup_profile_validators,
+    not_modified,
+    set_validators,
+    user_etag,
+)
+from .login import LoginRejected, acheck_credentials
+from .renderers import FastJSONRenderer
+from .serializers import FieldSelection, ProfileSerializer, ProfileUpdateSerializer
+from .views import (
+    absolutize_profile_urls,
+    build_api_status,
+    build_profile_entry,
+    build_user_info,
+    get_api_response,
+    invalid_selection_response,
+    save_profile_update,
+    serialize_profile,
+    serialize_profile_delta,
+    wants_delta,
+)
+from .writebehind import atouch_last_login
+
+
+renderer = FastJSONRenderer()
+authenticator = CachedJWTAuthentication()
+
+
+def render_response(data, status_code=status.HTTP_200_OK, headers=None):
+    """Renderizar igual que el renderer configurado en DRF"""
+    response = HttpResponse(
+        renderer.render(data),
+        status=status_code,
+        content_type=renderer.media_type
+    )
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def render_exception(exc):
+    """Mismo formato que el exception handler de DRF"""
+    data = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    headers = {}
+    if isinstance(exc, (exceptions.AuthenticationFailed, exceptions.NotAuthenticated)):
+        headers['WWW-Authenticate'] = authenticator.authenticate_header(None)
+        exc.status_code = status.HTTP_401_UNAUTHORIZED
+    return render_response(data, exc.status_code, headers)
+
+
+def render_invalid_selection(error):
+    """Mismo cuerpo que ``views.invalid_selection_response``"""
+    response = invalid_selection_response(error)
+    return render_response(response.data, response.status_code)
+
+
+def async_api_view(methods, authenticated=True):
+    """
+    Equivalente async de ``@api_view`` + ``@permission_classes`` para las
+    vistas de este módulo: valida el método, autentica con JWT y aplica
+    IsAuthenticated/AllowAny.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                result = await authenticator.aauthenticate(request)
+                if result is not None:
+                    request.user, request.auth = result
+                elif authenticated:
+                    raise exceptions.NotAuthenticated()
+            except exceptions.APIException as exc:
+                return render_exception(exc)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@async_api_view(['POST'], authenticated=False)
+async def login_view(request):
+    """
+    Endpoint para autenticación de usuario
+    POST /usuarios/api/login/
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        data = request.POST
+    username = data.get('username')
+    password = data.get('password')
+    
+    if not username or not password:
+        return render_response(
+            get_api_response('error', 'Username y password son requeridos'),
+            status.HTTP_400_BAD_REQUEST
+        )
+    
+    # El hash PBKDF2 se calcula fuera del event loop, en el pool acotado
+    try:
+        user = await acheck_credentials(request, username, password)
+    except LoginRejected as e:
+        return render_response(
+            get_api_response('error', e.message),
+            e.status,
+            {'Retry-After': str(e.retry_after)}
+        )
+    
+    if user is None:
+        return render_response(
+            get_api_response('error', 'Credenciales inválidas'),
+            status.HTTP_401_UNAUTHORIZED
+        )
+    if not user.is_active:
+        return render_response(
+            get_api_response('error', 'Cuenta desactivada'),
+            status.HTTP_401_UNAUTHORIZED
+        )
+    if jwt_settings.UPDATE_LAST_LOGIN:
+        await atouch_last_login(user)
+    
+    refresh = RefreshToken.for_user(user)
+    return render_response({
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    })
+
+
+@async_api_view(['GET'])
+async def get_profile(request):
+    """
+    Obtener perfil del usuario autenticado
+    GET /usuarios/api/perfil/?fields=&exclude=&expand=user
+    """
+    try:
+        selection = FieldSelection.parse(request.GET, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return render_invalid_selection(e)
+    
+    try:
+        cache = get_profile_cache()
+        entry = await cache.aget(request.user.pk)
+        if entry is None and is_conditional(request):
+            validators = await sync_to_async(lookup_profile_validators)(request.user)
+            if validators is not None:
+                response = not_modified(request, *validators)
+                if response is not None:
+                    return response
+        if entry is None:
+            # Fallo de caché: una sola reconstrucción (con el ORM sync) por usuario
+            entry = await sync_to_async(cache.get_or_build)(
+                request.user.pk,
+                lambda: build_profile_entry(request.user)
+            )
+        
+        response = not_modified(request, entry['etag'], entry['last_modified'])
+        if response is not None:
+            return response
+        response = render_response(absolutize_profile_urls(selection.select(entry['data']), request))
+        return set_validators(response, entry['etag'], entry['last_modified'])
+    except Exception as e:
+        return render_response(
+            get_api_response('error', f'Error al obtener perfil: {str(e)}'),
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_api_view(['PUT', 'PATCH'])
+async def update_profile(request):
+    """
+    Actualizar perfil del usuario
+    PUT /usuarios/api/usuario/perfil/?fields=          perfil completo
+    PATCH /usuarios/api/usuario/perfil/?fields=&delta=  solo los campos enviados
+    """
+    try:
+        selection = FieldSelection.parse(request.GET, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return render_invalid_selection(e)
+    
+    try:
+        try:
+            data = json.loads(request.body)
+        except ValueError as e:
+            raise exceptions.ParseError(f'JSON parse error - {str(e)}')
+        
+        serializer = ProfileUpdateSerializer(data=data, partial=request.method == 'PATCH')
+        if not serializer.is_valid():
+            return render_response(
+                get_api_response('error', 'Datos inválidos', serializer.errors),
+                status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Django no tiene transacciones async: la escritura completa va en un hilo
+        profile = await sync_to_async(save_profile_update)(
+            serializer,
+            request.user,
+            if_match=request.headers.get('If-Match')
+        )
+        if wants_delta(request.GET):
+            data = serialize_profile_delta(profile, serializer.changed_fields, request)
+        else:
+            data = serialize_profile(profile, selection, request)
+        response = render_response(
+            get_api_response('success', 'Perfil actualizado correctamente', data)
+        )
+        return set_validators(response, *get_profile_validators(profile))
+    except PreconditionFailed as e:
+        return render_response(
+            get_api_response('error', str(e.detail)),
+            e.status_code
+        )
+    except exceptions.APIException as exc:
+        return render_exception(exc)
+    except Exception as e:
+        return render_response(
+            get_api_response('error', f'Error al actualizar perfil: {str(e)}'),
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_api_view(['GET'])
+async def user_info(request):
+    """
+    Información básica del usuario (para debugging)
+    GET /usuarios/api/user/info/
+    """
+    data = build_user_info(request.user)
+    etag = user_etag(data)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return set_validators(
+        render_response(get_api_response('success', 'Información del usuario', data)),
+        etag
+    )
+
+
+@async_api_view(['GET'], authenticated=False)
+async def api_status(request):
+    """
+    Endpoint para verificar estado de la API
+    GET /usuarios/api/status/
+    """
+    return render_response(
+        get_api_response(
+            'success',
+            'API funcionando correctamente',
+            build_api_status()
+        )
+    )
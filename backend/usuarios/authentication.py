@@ -0,0 +1,163 @@
+"""
+Autenticación JWT con instantáneas de identidad en memoria.
+"""
+from django.contrib.auth.models import User
+from django.db.models.fields.files import FieldFile
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import get_user_snapshot_cache
+from .instrumentation import phase
+from .models import Profile
+
+
+USER_FIELDS = tuple(f.attname for f in User._meta.concrete_fields)
+PROFILE_FIELDS = tuple(f.attname for f in Profile._meta.concrete_fields)
+PROFILE_USER_FIELD = Profile._meta.get_field('user')
+
+# Clave del environ WSGI con las credenciales de una sub-petición de /batch/.
+# Los clientes no pueden definirla: sus cabeceras llegan como HTTP_*.
+BATCH_CREDENTIALS = 'usuarios.batch_credentials'
+
+
+def snapshot_value(instance, name):
+    """Valor crudo del campo; los FieldFile se guardan por nombre para no compartirlos"""
+    value = getattr(instance, name)
+    if isinstance(value, FieldFile):
+        return value.name
+    return value
+
+
+def take_snapshot(user):
+    """Capturar los valores de User y Profile como tuplas inmutables"""
+    user_values = tuple(snapshot_value(user, name) for name in USER_FIELDS)
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        return user._state.db, user_values, None
+    profile_values = tuple(snapshot_value(profile, name) for name in PROFILE_FIELDS)
+    return user._state.db, user_values, profile_values
+
+
+def restore_snapshot(snapshot):
+    """Construir instancias nuevas de User y Profile sin consultar la base de datos"""
+    db, user_values, profile_values = snapshot
+    user = User.from_db(db, USER_FIELDS, user_values)
+    profile = None
+    if profile_values is not None:
+        profile = Profile.from_db(db, PROFILE_FIELDS, profile_values)
+        PROFILE_USER_FIELD.set_cached_value(profile, user)
+    # Cachear también la relación inversa (None => Profile.DoesNotExist)
+    PROFILE_USER_FIELD.remote_field.set_cached_value(user, profile)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que reutiliza una instantánea del usuario y su perfil.
+
+    La primera petición con un token carga User y Profile en una sola
+    consulta; las siguientes con el mismo ``(user_id, jti)`` no tocan la base
+    de datos. Las instantáneas se invalidan desde las señales de User/Profile
+    en el proceso que escribe; en el resto expiran a los
+    ``AUTH_SNAPSHOT_CACHE['TIMEOUT']`` segundos.
+
+    El usuario devuelto puede ser una instantánea: las vistas que escriben
+    deben leer antes las filas actuales y no guardar ``request.user``.
+    """
+
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id, jti, snapshot, epoch = self.lookup_snapshot(validated_token)
+        if snapshot is not None:
+            return restore_snapshot(snapshot)
+
+        try:
+            user = self.get_queryset().get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+
+        return self.remember_user(user, validated_token, user_id, jti, epoch)
+
+    async def aauthenticate(self, request):
+        """Versión async de ``authenticate`` para vistas nativas async"""
+        with phase('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        """Como ``get_user`` pero con el ORM async en caso de fallo de caché"""
+        user_id, jti, snapshot, epoch = self.lookup_snapshot(validated_token)
+        if snapshot is not None:
+            return restore_snapshot(snapshot)
+
+        try:
+            user = await self.get_queryset().aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found') from e
+
+        return self.remember_user(user, validated_token, user_id, jti, epoch)
+
+    def get_queryset(self):
+        return self.user_model.objects.select_related('profile')
+
+    def lookup_snapshot(self, validated_token):
+        """Retorna (user_id, jti, instantánea o None, época de la caché)"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            ) from e
+
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        cache = get_user_snapshot_cache()
+        # La época se lee antes de la consulta para descartar cargas que
+        # compitan con una invalidación
+        epoch = cache.epoch(user_id)
+        return user_id, jti, cache.get(user_id, jti), epoch
+
+    def remember_user(self, user, validated_token, user_id, jti, epoch=None):
+        """Validar el usuario recién cargado y guardar su instantánea"""
+        self.check_user(user, validated_token)
+        get_user_snapshot_cache().set(user_id, jti, take_snapshot(user), epoch)
+        return user
+
+    def check_user(self, user, validated_token):
+        """Mismas validaciones que ``JWTAuthentication.get_user``"""
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed'
+                )
+
+
+class BatchSubrequestAuthentication(BaseAuthentication):
+    """
+    Autenticación de las sub-peticiones de ``/batch/``: reutiliza el usuario
+    y el token que ya autenticó la petición batch (``usuarios.batch``).
+    En cualquier otra petición retorna None.
+    """
+
+    def authenticate(self, request):
+        return request.META.get(BATCH_CREDENTIALS)
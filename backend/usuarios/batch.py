@@ -0,0 +1,191 @@
+"""
+Ejecución de varias peticiones de la API en una sola (``/usuarios/api/batch/``).
+
+Las sub-peticiones se despachan en el mismo proceso contra las rutas de
+``usuarios/urls.py``, sin volver a pasar por los middlewares ni decodificar
+el JWT: todas usan el usuario ya autenticado por la petición batch
+(``BatchSubrequestAuthentication``). Las rutas que emiten tokens no se
+admiten: el batch se comprime y los tokens quedarían expuestos a BREACH.
+
+- Las lecturas (GET) consecutivas se ejecutan en paralelo en el pool
+  ``batch``; cualquier escritura actúa de barrera y se ejecuta en orden.
+- Las sub-peticiones comparten un mapa de identidad: una instancia del ORM
+  cargada por una de ellas (p. ej. el perfil) se reutiliza en las demás.
+  Se vacía después de cada escritura.
+"""
+import contextvars
+import io
+import json
+import logging
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+from .authentication import BATCH_CREDENTIALS
+from .executors import get_executor_config, submit
+
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_REQUESTS = 20
+
+# Rutas que no se ejecutan dentro de un batch (emiten tokens o anidan batches)
+EXCLUDED_URL_NAMES = ['batch', 'login', 'token_refresh']
+
+READ_METHODS = ['GET', 'HEAD']
+
+# Cabeceras que cada sub-petición puede definir
+FORWARDED_HEADERS = ['If-Match', 'If-None-Match', 'If-Modified-Since', 'Upload-Offset']
+
+# Cabeceras de la sub-respuesta incluidas en el resultado
+RESPONSE_HEADERS = ['ETag', 'Last-Modified', 'Retry-After', 'Upload-Offset']
+
+_identity_map = contextvars.ContextVar('usuarios_batch_identity_map', default=None)
+
+
+class RouteNotAllowed(Exception):
+    """La ruta existe pero no se puede ejecutar dentro de un batch"""
+
+
+class IdentityMap:
+    """Instancias del ORM compartidas por las sub-peticiones de un batch"""
+
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, model, key, loader):
+        identity = (model._meta.label, key)
+        with self._lock:
+            if identity in self._objects:
+                return self._objects[identity]
+        instance = loader()
+        with self._lock:
+            return self._objects.setdefault(identity, instance)
+
+    def clear(self):
+        with self._lock:
+            self._objects.clear()
+
+
+def get_or_load(model, key, loader):
+    """
+    Dentro de un batch, retornar la instancia ya cargada para ``(model, key)``
+    o cargarla con ``loader``; fuera de un batch, simplemente ``loader()``.
+    """
+    identity_map = _identity_map.get()
+    if identity_map is None:
+        return loader()
+    return identity_map.get_or_load(model, key, loader)
+
+
+def build_subrequest(request, item):
+    """Construir el HttpRequest de una sub-petición a partir del batch"""
+    path, _, query_string = item['path'].partition('?')
+    body = json.dumps(item['body']).encode('utf-8') if 'body' in item else b''
+
+    environ = {
+        key: value for key, value in request.META.items()
+        if not key.startswith(('wsgi.', 'CONTENT_', 'HTTP_IF_', 'HTTP_UPLOAD_', 'HTTP_AUTHORIZATION'))
+    }
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': request.scheme,
+        BATCH_CREDENTIALS: (request.user, request.auth),
+    })
+    headers = {name.lower(): value for name, value in item.get('headers', {}).items()}
+    for name in FORWARDED_HEADERS:
+        if name.lower() in headers:
+            environ['HTTP_' + name.upper().replace('-', '_')] = headers[name.lower()]
+
+    return WSGIRequest(environ)
+
+
+def resolve_view(path):
+    """
+    Retorna (vista, args, kwargs) para una ruta de la API, o None si no existe.
+    Lanza RouteNotAllowed para las rutas de ``EXCLUDED_URL_NAMES``.
+    """
+    try:
+        match = resolve(path.partition('?')[0])
+    except Resolver404:
+        return None
+    if match.namespace != 'usuarios':
+        return None
+    if match.url_name in EXCLUDED_URL_NAMES:
+        raise RouteNotAllowed(path)
+    view = match.func
+    if iscoroutinefunction(view):
+        # Las vistas async autentican por cabecera: el batch usa su par sync
+        from . import views
+        view = getattr(views, view.__name__)
+    return view, match.args, match.kwargs
+
+
+def serialize_response(response):
+    """Resultado de una sub-petición: status, cabeceras relevantes y cuerpo"""
+    headers = {name: response[name] for name in RESPONSE_HEADERS if name in response}
+    if isinstance(response, Response):
+        # Sin renderizar: el cuerpo se renderiza una sola vez con la respuesta batch
+        body = response.data
+    elif response.content:
+        try:
+            body = json.loads(response.content)
+        except ValueError:
+            body = response.content.decode('utf-8', errors='replace')
+    else:
+        body = None
+    return {'status': response.status_code, 'headers': headers, 'body': body}
+
+
+def run_item(request, item):
+    try:
+        resolved = resolve_view(item['path'])
+    except RouteNotAllowed:
+        return {'status': 403, 'headers': {}, 'body': {'detail': 'Ruta no permitida en un batch'}}
+    if resolved is None:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Ruta no encontrada'}}
+    view, args, kwargs = resolved
+    try:
+        response = view(build_subrequest(request, item), *args, **kwargs)
+    except Exception as e:
+        logger.exception('Error en sub-petición %s %s', item['method'], item['path'])
+        return {'status': 500, 'headers': {}, 'body': {'detail': str(e)}}
+    return serialize_response(response)
+
+
+def execute_batch(request, items):
+    """Ejecutar las sub-peticiones y retornar sus resultados en el mismo orden"""
+    identity_map = IdentityMap()
+    token = _identity_map.set(identity_map)
+    concurrent = bool(get_executor_config('batch')['WORKERS'])
+    results = [None] * len(items)
+    pending = []
+
+    def wait_pending():
+        for index, future in pending:
+            results[index] = future.result()
+        pending.clear()
+
+    try:
+        for index, item in enumerate(items):
+            if item['method'] in READ_METHODS and concurrent:
+                pending.append((index, submit('batch', run_item, request, item)))
+                continue
+            # Escritura: esperar las lecturas anteriores y ejecutar en orden
+            wait_pending()
+            results[index] = run_item(request, item)
+            if item['method'] not in READ_METHODS:
+                identity_map.clear()
+        wait_pending()
+    finally:
+        _identity_map.reset(token)
+    return results
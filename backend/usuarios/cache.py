@@ -0,0 +1,302 @@
+"""
+Cachés en memoria para usuarios y perfiles.
+
+El payload que devuelve ``get_profile`` se guarda por usuario en un backend
+intercambiable (LRU en memoria local o el framework de caché de Django) y se
+invalida desde las señales ``post_save`` y desde las vistas que escriben el
+perfil. La autenticación JWT mantiene además una instantánea de la identidad
+del usuario por ``(user_id, jti)``.
+
+Ambas cachés viven en la memoria de cada proceso y la invalidación solo llega
+al proceso que hizo la escritura. En los demás workers una instantánea sigue
+autenticando hasta que expira: ``AUTH_SNAPSHOT_CACHE['TIMEOUT']`` es la
+ventana máxima en la que un usuario desactivado o con la contraseña cambiada
+puede seguir usando un access token ya emitido.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+DEFAULT_PROFILE_CACHE = {
+    'BACKEND': 'usuarios.cache.LocMemLRUBackend',
+    'TIMEOUT': 60,
+    'KEY_PREFIX': 'perfil',
+    'OPTIONS': {
+        'MAX_ENTRIES': 1000,
+    },
+}
+
+DEFAULT_AUTH_SNAPSHOT_CACHE = {
+    # Ventana de revocación entre procesos, en segundos
+    'TIMEOUT': 60,
+    'MAX_ENTRIES': 10000,
+}
+
+# Número de locks usados para agrupar las reconstrucciones por clave
+LOCK_STRIPES = 64
+
+
+class LocMemLRUBackend:
+    """Caché LRU en memoria del proceso con expiración por TTL"""
+
+    def __init__(self, MAX_ENTRIES=1000, **kwargs):
+        self.max_entries = MAX_ENTRIES
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def aget(self, key):
+        # Solo memoria local: no bloquea el event loop
+        return self.get(key)
+
+    def set(self, key, value, timeout):
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Adaptador sobre un alias de ``settings.CACHES``"""
+
+    def __init__(self, ALIAS='default', **kwargs):
+        self.alias = ALIAS
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ProfileCache:
+    """
+    Caché read-through de perfiles serializados.
+
+    Las reconstrucciones concurrentes de una misma clave se serializan con
+    locks por franja, de modo que una ráfaga de fallos solo ejecuta el
+    builder una vez; el resto de hilos espera y lee el valor ya guardado.
+
+    Las invalidaciones toman el mismo lock: esperan a que termine la
+    reconstrucción en curso y borran lo que haya guardado. Las épocas y los
+    locks son del proceso; con ``DjangoCacheBackend`` sobre una caché
+    compartida (Redis, Memcached) la invalidación de otro worker no detiene
+    una reconstrucción de este, que puede guardar un payload viejo hasta
+    ``TIMEOUT``.
+    """
+
+    def __init__(self, backend, timeout=60, key_prefix='perfil'):
+        self.backend = backend
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._epochs = [0] * LOCK_STRIPES
+
+    def make_key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def _stripe(self, key):
+        return hash(key) % LOCK_STRIPES
+
+    def get(self, user_id):
+        return self.record(self.backend.get(self.make_key(user_id)))
+
+    async def aget(self, user_id):
+        return self.record(await self.backend.aget(self.make_key(user_id)))
+
+    def record(self, payload):
+        metrics.cache_requests.inc(cache='perfil', result='miss' if payload is None else 'hit')
+        return payload
+
+    def get_or_build(self, user_id, builder):
+        """Retornar el payload cacheado o construirlo una sola vez"""
+        key = self.make_key(user_id)
+        payload = self.backend.get(key)
+        if payload is not None:
+            return payload
+
+        stripe = self._stripe(key)
+        with self._locks[stripe]:
+            payload = self.backend.get(key)
+            if payload is not None:
+                return payload
+            epoch = self._epochs[stripe]
+            payload = builder()
+            # No guardar si hubo una invalidación mientras se construía
+            if self._epochs[stripe] == epoch:
+                self.backend.set(key, payload, self.timeout)
+            return payload
+
+    def invalidate(self, user_id):
+        """Eliminar el payload cacheado de un usuario"""
+        key = self.make_key(user_id)
+        stripe = self._stripe(key)
+        with self._locks[stripe]:
+            self._epochs[stripe] += 1
+            self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+
+
+class UserSnapshotCache:
+    """
+    LRU acotada con TTL de instantáneas de identidad por ``(user_id, jti)``.
+
+    Mantiene un índice por usuario para poder invalidar todas las
+    instantáneas de un usuario (un token por sesión) en O(tokens). Como en
+    ``ProfileCache``, cada invalidación avanza la época de su franja: una
+    carga que empezó antes de la invalidación no vuelve a guardar la
+    instantánea vieja.
+    """
+
+    def __init__(self, timeout=60, max_entries=10000):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+        self._epochs = [0] * LOCK_STRIPES
+
+    def _stripe(self, user_id):
+        return hash(str(user_id)) % LOCK_STRIPES
+
+    def epoch(self, user_id):
+        """Época actual del usuario; se captura antes de cargarlo de la base de datos"""
+        return self._epochs[self._stripe(user_id)]
+
+    def get(self, user_id, jti):
+        key = (str(user_id), jti)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] <= time.monotonic():
+                self._discard(key)
+                item = None
+            if item is not None:
+                self._data.move_to_end(key)
+        metrics.cache_requests.inc(cache='auth', result='miss' if item is None else 'hit')
+        return item[0] if item is not None else None
+
+    def set(self, user_id, jti, snapshot, epoch=None):
+        """Guardar la instantánea salvo que el usuario se haya invalidado desde ``epoch``"""
+        key = (str(user_id), jti)
+        with self._lock:
+            if epoch is not None and self._epochs[self._stripe(user_id)] != epoch:
+                return
+            self._data[key] = (snapshot, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._data) > self.max_entries:
+                self._discard(next(iter(self._data)))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._epochs[self._stripe(user_id)] += 1
+            for key in self._by_user.pop(str(user_id), ()):
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_user.clear()
+
+    def _discard(self, key):
+        self._data.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+
+_profile_cache = None
+_user_snapshot_cache = None
+
+
+def get_profile_cache():
+    """Retornar la caché de perfiles configurada en ``settings.PROFILE_CACHE``"""
+    global _profile_cache
+    if _profile_cache is None:
+        config = {**DEFAULT_PROFILE_CACHE, **getattr(settings, 'PROFILE_CACHE', {})}
+        backend_class = import_string(config['BACKEND'])
+        _profile_cache = ProfileCache(
+            backend_class(**config.get('OPTIONS', {})),
+            timeout=config['TIMEOUT'],
+            key_prefix=config['KEY_PREFIX'],
+        )
+    return _profile_cache
+
+
+def invalidate_profile(user_id):
+    """Invalidar el perfil cacheado de un usuario"""
+    get_profile_cache().invalidate(user_id)
+
+
+def get_user_snapshot_cache():
+    """Retornar la caché de identidades configurada en ``settings.AUTH_SNAPSHOT_CACHE``"""
+    global _user_snapshot_cache
+    if _user_snapshot_cache is None:
+        config = {**DEFAULT_AUTH_SNAPSHOT_CACHE, **getattr(settings, 'AUTH_SNAPSHOT_CACHE', {})}
+        _user_snapshot_cache = UserSnapshotCache(
+            timeout=config['TIMEOUT'],
+            max_entries=config['MAX_ENTRIES'],
+        )
+    return _user_snapshot_cache
+
+
+def invalidate_user_snapshot(user_id):
+    """Invalidar las instantáneas de autenticación de un usuario"""
+    get_user_snapshot_cache().invalidate(user_id)
+
+
+@receiver(setting_changed)
+def reset_caches(setting, **kwargs):
+    """Reconstruir las cachés cuando cambia la configuración (tests)"""
+    global _profile_cache, _user_snapshot_cache
+    if setting == 'PROFILE_CACHE':
+        _profile_cache = None
+    elif setting == 'AUTH_SNAPSHOT_CACHE':
+        _user_snapshot_cache = None
@@ -0,0 +1,55 @@
+"""
+System checks de la app usuarios.
+
+Son checks de base de datos (``Tags.database``): se ejecutan con
+``migrate`` y con ``python manage.py check --database default``.
+"""
+from django.core.checks import Tags, Warning, register
+from django.db import connections
+
+from . import counts, search
+
+
+@register(Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    """Avisar si el índice FTS5 existe pero le faltan triggers (índice desactualizado)"""
+    errors = []
+    for alias in databases or []:
+        using = connections[alias]
+        if not search.fts_available(using):
+            continue
+        missing = search.missing_triggers(using)
+        if missing:
+            errors.append(Warning(
+                f'Faltan triggers del índice de búsqueda: {", ".join(missing)}',
+                hint='Ejecute python manage.py rebuild_profile_search',
+                obj=alias,
+                id='usuarios.W001',
+            ))
+    return errors
+
+
+@register(Tags.database)
+def check_row_counts(app_configs, databases=None, **kwargs):
+    """Avisar si faltan los triggers de conteo o si un contador se desvió de COUNT(*)"""
+    errors = []
+    for alias in databases or []:
+        using = connections[alias]
+        if not counts.counts_available(using):
+            continue
+        problems = []
+        missing = counts.missing_triggers(using)
+        if missing:
+            problems.append(f'faltan triggers: {", ".join(missing)}')
+        problems.extend(
+            f'{table} tiene {stored} en el contador y {actual} filas'
+            for table, stored, actual in counts.drifted_tables(using)
+        )
+        if problems:
+            errors.append(Warning(
+                f'Contadores de filas desactualizados ({"; ".join(problems)})',
+                hint='Ejecute python manage.py recount_rows',
+                obj=alias,
+                id='usuarios.W002',
+            ))
+    return errors
@@ -0,0 +1,285 @@
+"""
+Compresión de respuestas negociada con ``Accept-Encoding``.
+
+Se elige la codificación con mayor ``q`` entre las disponibles (zstd y
+brotli solo si ``zstandard`` / ``brotli`` están instalados; gzip siempre),
+desempatando por el orden de ``RESPONSE_COMPRESSION['ENCODINGS']``.
+
+No se comprimen:
+
+- cuerpos menores que ``MIN_SIZE`` (los sobres de ``get_api_response``
+  cuestan más CPU de lo que ahorran),
+- tipos que no están en ``COMPRESSIBLE_TYPES`` (imágenes y demás media ya
+  comprimida),
+- respuestas con Content-Encoding, Content-Range o ``no-transform``,
+- las rutas de ``EXCLUDED_PATHS``: las que devuelven tokens, para no
+  exponerlos a ataques tipo BREACH.
+
+Las ``StreamingHttpResponse`` se comprimen por bloques a medida que se
+envían (con un flush cada ``STREAM_FLUSH_SIZE`` bytes).
+
+Bytes de entrada y salida y CPU usada se publican por codificación en
+``usuarios.metrics`` (``usuarios_compression_*``), junto con las respuestas
+que no se comprimen por motivo.
+"""
+import re
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependencia opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+
+DEFAULT_RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    # Preferencia del servidor cuando el cliente acepta varias con el mismo q
+    'ENCODINGS': ['zstd', 'br', 'gzip'],
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,
+    'ZSTD_LEVEL': 3,
+    # Streaming: enviar lo comprimido cada vez que entran estos bytes
+    'STREAM_FLUSH_SIZE': 16 * 1024,
+    'COMPRESSIBLE_TYPES': [
+        'text/',
+        'application/json',
+        'application/javascript',
+        'application/xml',
+        'image/svg+xml',
+    ],
+    'EXCLUDED_PATHS': [],
+}
+
+accept_encoding_re = re.compile(r'^\s*([A-Za-z0-9*_-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, config):
+        # wbits=31: formato gzip (cabecera y CRC) en lugar de zlib
+        self._compressor = zlib.compressobj(config['GZIP_LEVEL'], zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, config):
+        self._compressor = brotli.Compressor(quality=config['BROTLI_QUALITY'])
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    name = 'zstd'
+
+    def __init__(self, config):
+        self._compressor = zstandard.ZstdCompressor(level=config['ZSTD_LEVEL']).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+ENCODERS = {'gzip': GzipEncoder}
+if brotli is not None:
+    ENCODERS['br'] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS['zstd'] = ZstdEncoder
+
+
+def get_compression_config():
+    return {**DEFAULT_RESPONSE_COMPRESSION, **getattr(settings, 'RESPONSE_COMPRESSION', {})}
+
+
+def parse_accept_encoding(header):
+    """``{codificación: q}`` de una cabecera Accept-Encoding"""
+    accepted = {}
+    for item in header.split(','):
+        match = accept_encoding_re.match(item)
+        if not match:
+            continue
+        coding, q = match.groups()
+        try:
+            accepted[coding.lower()] = float(q) if q else 1.0
+        except ValueError:
+            continue
+    if 'x-gzip' in accepted and 'gzip' not in accepted:
+        accepted['gzip'] = accepted['x-gzip']
+    return accepted
+
+
+def choose_encoding(header, encodings):
+    """Codificación de ``encodings`` con mayor q para el cliente, o None"""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0
+    for encoding in encodings:
+        if encoding not in ENCODERS:
+            continue
+        q = accepted.get(encoding, accepted.get('*', 0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type, config):
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return media_type.startswith(tuple(config['COMPRESSIBLE_TYPES']))
+
+
+def record_compression(encoding, bytes_in, bytes_out, cpu_time):
+    if bytes_in:
+        metrics.compression_bytes_in.inc(bytes_in, encoding=encoding)
+    if bytes_out:
+        metrics.compression_bytes_out.inc(bytes_out, encoding=encoding)
+    metrics.compression_cpu_seconds.inc(cpu_time, encoding=encoding)
+
+
+def compress_content(encoder, content):
+    started = time.thread_time()
+    compressed = encoder.compress(content) + encoder.finish()
+    return compressed, time.thread_time() - started
+
+
+def compress_chunk(encoder, chunk, flush):
+    started = time.thread_time()
+    compressed = encoder.compress(chunk)
+    if flush:
+        compressed += encoder.flush()
+    record_compression(encoder.name, len(chunk), len(compressed), time.thread_time() - started)
+    return compressed
+
+
+def finish_stream(encoder):
+    started = time.thread_time()
+    compressed = encoder.finish()
+    record_compression(encoder.name, 0, len(compressed), time.thread_time() - started)
+    return compressed
+
+
+class StreamFlusher:
+    """
+    Decide cuándo vaciar el compresor. Un flush por bloque pequeño (p. ej.
+    una fila de CSV) agrega más bytes de los que ahorra; se vacía cada
+    ``flush_size`` bytes de entrada para no retener datos indefinidamente.
+    """
+
+    def __init__(self, flush_size):
+        self.flush_size = flush_size
+        self.pending = 0
+
+    def __call__(self, chunk):
+        self.pending += len(chunk)
+        if self.pending < self.flush_size:
+            return False
+        self.pending = 0
+        return True
+
+
+def compress_sequence(encoder, sequence, flush_size):
+    should_flush = StreamFlusher(flush_size)
+    for chunk in sequence:
+        data = compress_chunk(encoder, chunk, should_flush(chunk))
+        if data:
+            yield data
+    yield finish_stream(encoder)
+
+
+async def acompress_sequence(encoder, sequence, flush_size):
+    should_flush = StreamFlusher(flush_size)
+    async for chunk in sequence:
+        data = compress_chunk(encoder, chunk, should_flush(chunk))
+        if data:
+            yield data
+    yield finish_stream(encoder)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Comprimir la respuesta con gzip, brotli o zstd según Accept-Encoding"""
+
+    def process_response(self, request, response):
+        config = get_compression_config()
+        reason = self.skip_reason(request, response, config)
+        if reason:
+            metrics.compression_skipped.inc(reason=reason)
+            return response
+
+        # Desde aquí la respuesta depende de Accept-Encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), config['ENCODINGS'])
+        if encoding is None:
+            metrics.compression_skipped.inc(reason='not_accepted')
+            return response
+        encoder = ENCODERS[encoding](config)
+
+        if response.streaming:
+            flush_size = config['STREAM_FLUSH_SIZE']
+            if response.is_async:
+                response.streaming_content = acompress_sequence(encoder, response.streaming_content, flush_size)
+            else:
+                response.streaming_content = compress_sequence(encoder, response.streaming_content, flush_size)
+            metrics.compression_responses.inc(encoding=encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed, cpu_time = compress_content(encoder, response.content)
+            if len(compressed) >= len(response.content):
+                metrics.compression_skipped.inc(reason='no_gain')
+                return response
+            record_compression(encoding, len(response.content), len(compressed), cpu_time)
+            metrics.compression_responses.inc(encoding=encoding)
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # El cuerpo ya no es idéntico byte a byte: el ETag pasa a ser débil
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def skip_reason(self, request, response, config):
+        """Motivo para no comprimir la respuesta, o None"""
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return 'encoded'
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return 'no_transform'
+        if request.path_info in config['EXCLUDED_PATHS']:
+            return 'excluded_path'
+        if not is_compressible(response.get('Content-Type', ''), config):
+            return 'content_type'
+        if not response.streaming and len(response.content) < config['MIN_SIZE']:
+            return 'small'
+        return None
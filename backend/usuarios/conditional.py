@@ -0,0 +1,111 @@
+"""
+Peticiones condicionales (ETag / Last-Modified) para las lecturas de perfil.
+
+El ETag de un perfil es un hash de ``Profile.updated_at``, los campos del
+usuario que aparecen en la respuesta y el nombre de la foto: cambia con
+cualquier escritura visible en el payload. Se calcula desde el modelo
+(al construir la entrada de caché o con una consulta de columnas) para que
+un 304 no requiera serializar el perfil.
+"""
+import hashlib
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import Profile
+
+
+# Campos del usuario incluidos en el payload del perfil (UserSerializer)
+ETAG_USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name']
+
+# Cabeceras que hacen que una petición sea condicional
+CONDITIONAL_HEADERS = ['HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE']
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'El perfil fue modificado por otra petición'
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    """ETag fuerte (entre comillas) a partir de una secuencia de valores"""
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8'))
+    return quote_etag(digest.hexdigest())
+
+
+def profile_etag(user_values, updated_at, foto_name):
+    """ETag del perfil; ``user_values`` en el orden de ETAG_USER_FIELDS"""
+    return make_etag(*user_values, updated_at.isoformat(), foto_name or '')
+
+
+def get_profile_validators(profile):
+    """Retorna (etag, last_modified) de un perfil con su usuario cargado"""
+    user_values = [getattr(profile.user, field) for field in ETAG_USER_FIELDS]
+    etag = profile_etag(user_values, profile.updated_at, profile.foto.name)
+    return etag, profile.updated_at
+
+
+def lookup_profile_validators(user):
+    """
+    Retorna (etag, last_modified) leyendo solo las columnas necesarias,
+    o None si el usuario no tiene perfil.
+    """
+    row = Profile.objects.filter(user=user).values_list(
+        'updated_at', 'foto', *(f'user__{field}' for field in ETAG_USER_FIELDS)
+    ).first()
+    if row is None:
+        return None
+    updated_at, foto_name, *user_values = row
+    return profile_etag(user_values, updated_at, foto_name), updated_at
+
+
+def user_etag(data):
+    """ETag de un diccionario de valores planos (user_info)"""
+    return make_etag(*(f'{key}={value}' for key, value in sorted(data.items())))
+
+
+def is_conditional(request):
+    return any(request.META.get(header) for header in CONDITIONAL_HEADERS)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Agregar ETag/Last-Modified; los clientes deben revalidar siempre"""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Respuesta por usuario: solo caché privada y siempre con revalidación
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Evaluar If-None-Match / If-Modified-Since (RFC 9110).
+    Retorna la respuesta 304/412 a devolver, o None si hay que responder
+    con el cuerpo completo.
+    """
+    validators = set_validators(HttpResponse(), etag, last_modified)
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag, timestamp, validators)
+    if response is validators:
+        return None
+    return response
+
+
+def check_if_match(if_match, etag):
+    """Lanzar PreconditionFailed si ``etag`` no cumple la cabecera If-Match"""
+    if not if_match:
+        return
+    etags = parse_etags(if_match)
+    if etags == ['*']:
+        return
+    # Comparación fuerte: los ETags débiles nunca coinciden. Excepción: la
+    # compresión (usuarios.compression) debilita el ETag fuerte que generamos
+    # aquí, así que su forma W/ sigue identificando los mismos datos.
+    etags = [value[2:] if value.startswith('W/') else value for value in etags]
+    if etag.startswith('W/') or etag not in etags:
+        raise PreconditionFailed()
@@ -0,0 +1,138 @@
+"""
+Conteo de filas de las tablas grandes sin COUNT(*).
+
+``usuarios_rowcount`` guarda una fila por tabla con su cantidad de filas,
+mantenida por triggers AFTER INSERT/DELETE (solo SQLite), igual que el
+índice FTS5 de ``usuarios.search``: cubre ``bulk_create`` y los borrados en
+cascada, que no disparan señales.
+
+SQLite elimina los triggers de una tabla cuando la reconstruye (AddField,
+AlterField), así que no los crea ninguna migración: ``suspend_counts``
+(``pre_migrate``) los elimina antes de migrar y ``restore_counts``
+(``post_migrate``) recuenta y los vuelve a crear si faltan. El check
+``usuarios.W002`` avisa si faltan o si un contador no coincide con
+``COUNT(*)``; ``python manage.py recount_rows`` los repara.
+
+Uso::
+
+    get_row_count(Profile)  # None si no hay contador (otro motor)
+"""
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from .models import RowCount
+
+
+COUNTED_TABLES = ['auth_user', 'usuarios_profile']
+
+COUNT_TABLE = RowCount._meta.db_table
+
+TRIGGER_NAMES = [
+    f'{COUNT_TABLE}_{table}_{suffix}' for table in COUNTED_TABLES for suffix in ('ai', 'ad')
+]
+
+
+def counts_available(using=connection):
+    """SQLite y la tabla de contadores ya creada (migración 0007)"""
+    return using.vendor == 'sqlite' and COUNT_TABLE in using.introspection.table_names()
+
+
+def trigger_sql(table):
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {COUNT_TABLE}_{table}_ai AFTER INSERT ON {table} BEGIN
+            UPDATE {COUNT_TABLE} SET row_count = row_count + 1 WHERE table_name = '{table}';
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {COUNT_TABLE}_{table}_ad AFTER DELETE ON {table} BEGIN
+            UPDATE {COUNT_TABLE} SET row_count = row_count - 1 WHERE table_name = '{table}';
+        END
+        """,
+    ]
+
+
+def create_triggers(using=connection):
+    with using.cursor() as cursor:
+        for table in COUNTED_TABLES:
+            for sql in trigger_sql(table):
+                cursor.execute(sql)
+
+
+def drop_triggers(using=connection):
+    with using.cursor() as cursor:
+        for table in COUNTED_TABLES:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {COUNT_TABLE}_{table}_ai')
+            cursor.execute(f'DROP TRIGGER IF EXISTS {COUNT_TABLE}_{table}_ad')
+
+
+def missing_triggers(using=connection):
+    """Nombres de los triggers de conteo que no existen en la base de datos"""
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (%s, %s)",
+            COUNTED_TABLES
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGER_NAMES if name not in existing]
+
+
+def drifted_tables(using=connection):
+    """[(tabla, contador, COUNT(*))] de los contadores que no coinciden"""
+    drifted = []
+    with using.cursor() as cursor:
+        for table in COUNTED_TABLES:
+            cursor.execute(f'SELECT row_count FROM {COUNT_TABLE} WHERE table_name = %s', [table])
+            row = cursor.fetchone()
+            stored = row[0] if row else None
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            (actual,) = cursor.fetchone()
+            if stored != actual:
+                drifted.append((table, stored, actual))
+    return drifted
+
+
+def recount(using=connection):
+    """Recalcular los contadores con COUNT(*) (migración, reparación)"""
+    with using.cursor() as cursor:
+        for table in COUNTED_TABLES:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {COUNT_TABLE} (table_name, row_count) '
+                f"SELECT '{table}', count(*) FROM {table}"
+            )
+
+
+def add_rows(table, delta, using=connection):
+    """Sumar ``delta`` al contador (cargas con los triggers suspendidos)"""
+    with using.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {COUNT_TABLE} SET row_count = row_count + %s WHERE table_name = %s',
+            [delta, table]
+        )
+
+
+def suspend_counts(sender, using=DEFAULT_DB_ALIAS, plan=None, **kwargs):
+    """Receptor de ``pre_migrate``: eliminar los triggers si hay migraciones por aplicar"""
+    using = connections[using]
+    if plan and counts_available(using):
+        drop_triggers(using)
+
+
+def restore_counts(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Receptor de ``post_migrate``: recrear los triggers que falten y recontar,
+    porque las filas escritas sin triggers no llegaron a los contadores.
+    """
+    using = connections[using]
+    if counts_available(using) and missing_triggers(using):
+        recount(using)
+        create_triggers(using)
+
+
+def get_row_count(model):
+    """Filas de la tabla de ``model`` según el contador, o None si no tiene"""
+    if connection.vendor != 'sqlite' or model._meta.db_table not in COUNTED_TABLES:
+        return None
+    return (
+        RowCount.objects.filter(table_name=model._meta.db_table)
+        .values_list('row_count', flat=True).first()
+    )
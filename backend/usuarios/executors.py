@@ -0,0 +1,198 @@
+"""
+Pools de hilos acotados para trabajo bloqueante.
+
+Las vistas async no deben bloquear el event loop con trabajo de CPU
+(hash de contraseñas) o de disco (imágenes). Cada tipo de trabajo tiene su
+propio pool con un tamaño fijo, así una ráfaga de uno no agota los hilos
+del otro ni el executor por defecto de asgiref.
+
+Un pool puede limitar además su cola (``MAX_QUEUE``): cuando hay
+``WORKERS + MAX_QUEUE`` trabajos pendientes, ``submit`` lanza
+``ExecutorSaturated`` en lugar de encolar, y la vista responde 503 de
+inmediato en vez de acumular esperas.
+
+Las vistas sync no ganan nada enviando el trabajo a un pool: el worker WSGI
+queda bloqueado esperando el resultado. Para ellas ``run_admitted`` ejecuta
+en el hilo del worker y solo limita cuántas ejecuciones simultáneas se
+admiten (``SYNC_MAX_CONCURRENT``, como mucho ``WORKERS``), sin cola: la cola
+es la del propio servidor. El límite tiene que ser menor que los hilos de
+cada worker de gunicorn (``GUNICORN_THREADS``); si no, nunca se alcanza y
+el worker se llena de hashes antes de poder responder 503.
+
+Espera en cola, tiempo de ejecución y rechazos de cada pool se publican en
+``usuarios.metrics`` (``usuarios_executor_*{pool}``).
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+from . import metrics
+
+
+DEFAULT_EXECUTORS = {
+    'hashing': {'WORKERS': 4, 'MAX_QUEUE': 16, 'SYNC_MAX_CONCURRENT': 3},
+    'images': {'WORKERS': 2, 'MAX_QUEUE': None},
+    'batch': {'WORKERS': 4, 'MAX_QUEUE': None},
+}
+
+_executors = {}
+_lock = threading.Lock()
+
+
+class ExecutorSaturated(Exception):
+    """El pool alcanzó su límite de trabajos pendientes"""
+
+    def __init__(self, name):
+        super().__init__(f'Pool {name} saturado')
+        self.name = name
+
+
+class BoundedExecutor(Executor):
+    """ThreadPoolExecutor con cola acotada y métricas"""
+
+    def __init__(self, name, max_workers, max_queue=None, max_concurrent=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_concurrent = min(max_concurrent or max_workers, max_workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f'usuarios-{name}'
+        )
+        self._admission = threading.BoundedSemaphore(self.max_concurrent)
+        self._slots = None
+        if max_queue is not None:
+            self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+            metrics.executor_capacity.set(max_workers + max_queue, pool=name)
+        metrics.executor_workers.set(max_workers, pool=name)
+
+    def submit(self, func, /, *args, **kwargs):
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            metrics.executor_rejected.inc(pool=self.name)
+            raise ExecutorSaturated(self.name)
+
+        submitted_at = time.perf_counter()
+
+        def run():
+            started_at = time.perf_counter()
+            metrics.executor_queue_wait.observe(started_at - submitted_at, pool=self.name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.executor_run_time.observe(time.perf_counter() - started_at, pool=self.name)
+
+        metrics.executor_submitted.inc(pool=self.name)
+        metrics.executor_pending.inc(pool=self.name)
+        try:
+            future = self._executor.submit(run)
+        except BaseException:
+            self._release(done=True)
+            raise
+        # También se ejecuta si el trabajo se cancela antes de empezar
+        future.add_done_callback(lambda _: self._release(done=True))
+        return future
+
+    def run_admitted(self, func, /, *args, **kwargs):
+        """
+        Ejecutar ``func`` en el hilo que llama si hay menos de
+        ``max_concurrent`` ejecuciones en curso; si no, lanzar
+        ExecutorSaturated sin esperar.
+        """
+        if not self._admission.acquire(blocking=False):
+            metrics.executor_rejected.inc(pool=self.name)
+            raise ExecutorSaturated(self.name)
+
+        metrics.executor_submitted.inc(pool=self.name)
+        metrics.executor_pending.inc(pool=self.name)
+        started_at = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.executor_run_time.observe(time.perf_counter() - started_at, pool=self.name)
+            metrics.executor_pending.dec(pool=self.name)
+            self._admission.release()
+
+    def _release(self, done=False):
+        if done:
+            metrics.executor_pending.dec(pool=self.name)
+        if self._slots is not None:
+            self._slots.release()
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+def get_executor_config(name):
+    """Configuración de un pool; acepta un entero (solo WORKERS) por compatibilidad"""
+    configured = getattr(settings, 'EXECUTORS', {}).get(name, {})
+    if isinstance(configured, int):
+        configured = {'WORKERS': configured}
+    return {**DEFAULT_EXECUTORS.get(name, {'MAX_QUEUE': None}), **configured}
+
+
+def get_executor(name):
+    """Retornar (creando si hace falta) el pool ``name``"""
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            config = get_executor_config(name)
+            executor = BoundedExecutor(
+                name, config['WORKERS'], config['MAX_QUEUE'],
+                config.get('SYNC_MAX_CONCURRENT')
+            )
+            _executors[name] = executor
+        return executor
+
+
+def _call_closing_connections(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Los hilos del pool no pasan por request_finished
+        close_old_connections()
+
+
+def submit(name, func, *args, **kwargs):
+    """Encolar ``func`` en el pool ``name`` con el contexto (contextvars) actual"""
+    context = contextvars.copy_context()
+    return get_executor(name).submit(context.run, _call_closing_connections, func, *args, **kwargs)
+
+
+def run_admitted(name, func, *args, **kwargs):
+    """Ejecutar ``func`` en el hilo actual con el límite de concurrencia del pool ``name`` (vistas sync)"""
+    if not get_executor_config(name)['WORKERS']:
+        # 0 = sin límite (tests, comandos de gestión)
+        return func(*args, **kwargs)
+    return get_executor(name).run_admitted(func, *args, **kwargs)
+
+
+async def run_blocking(name, func, *args, **kwargs):
+    """Ejecutar ``func`` en el pool ``name`` sin bloquear el event loop"""
+    if not get_executor_config(name)['WORKERS']:
+        return await sync_to_async(func)(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, _call_closing_connections, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(name), call)
+
+
+def shutdown_executors(wait=True):
+    with _lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
+
+
+@receiver(setting_changed)
+def reset_executors(setting, **kwargs):
+    if setting == 'EXECUTORS':
+        shutdown_executors()
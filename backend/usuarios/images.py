@@ -0,0 +1,165 @@
+"""
+Generación de derivados de las fotos de perfil.
+
+Tras subir una foto se encola un trabajo en un pool de hilos que genera
+versiones reducidas (WebP y JPEG, sin EXIF) y guarda el mapa de URLs en
+``Profile.foto_variants``. Los clientes eligen la imagen más pequeña que
+les sirva en lugar de descargar el original.
+
+Los derivados se sirven como ``immutable`` (ver ``usuarios.media``): su
+nombre lleva un hash del contenido, así que regenerarlos con otra
+``QUALITY`` o ``FORMATS`` produce URLs nuevas en lugar de bytes distintos
+bajo una URL ya cacheada.
+"""
+import hashlib
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_profile, invalidate_user_snapshot
+from . import executors
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_PHOTO_VARIANTS = {
+    'SIZES': [64, 256, 512],
+    'FORMATS': ['webp', 'jpeg'],
+    'QUALITY': 82,
+}
+
+PIL_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+
+def get_variants_config():
+    return {**DEFAULT_PROFILE_PHOTO_VARIANTS, **getattr(settings, 'PROFILE_PHOTO_VARIANTS', {})}
+
+
+def variant_name(original_name, size, fmt, content):
+    """``perfiles/abc.png`` -> ``perfiles/variantes/abc_64.<hash del contenido>.webp``"""
+    directory, filename = os.path.split(original_name)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return os.path.join(directory, 'variantes', f'{stem}_{size}.{digest}.{fmt}')
+
+
+def render_variants(image, sizes, formats, quality):
+    """Generar los derivados en memoria. Retorna {(size, fmt): bytes}"""
+    # Aplicar la orientación EXIF antes de descartar los metadatos
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    rendered = {}
+    for size in sorted(sizes, reverse=True):
+        # Reducir desde el derivado anterior (más grande) es más barato que desde el original
+        image = image.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            frame = image
+            if fmt == 'jpeg' and frame.mode == 'RGBA':
+                background = Image.new('RGB', frame.size, (255, 255, 255))
+                background.paste(frame, mask=frame.getchannel('A'))
+                frame = background
+            buffer = io.BytesIO()
+            # Sin exif=...: el archivo resultante no conserva metadatos
+            frame.save(buffer, PIL_FORMATS[fmt], quality=quality, optimize=fmt == 'jpeg')
+            rendered[(size, fmt)] = buffer.getvalue()
+    return rendered
+
+
+def generate_variants(profile_id, original_name):
+    """Generar y guardar los derivados de una foto; actualiza Profile.foto_variants"""
+    from .models import Profile
+
+    config = get_variants_config()
+    with default_storage.open(original_name, 'rb') as fh:
+        with Image.open(fh) as image:
+            image.load()
+            rendered = render_variants(image, config['SIZES'], config['FORMATS'], config['QUALITY'])
+
+    previous = Profile.objects.filter(pk=profile_id).values_list('foto_variants', flat=True).first()
+    variants = {}
+    for (size, fmt), content in sorted(rendered.items()):
+        name = variant_name(original_name, size, fmt, content)
+        # Mismo nombre = mismos bytes: no hace falta reescribirlo
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        variants.setdefault(str(size), {})[fmt] = name
+
+    # Solo si la foto no cambió mientras se generaban los derivados.
+    # update() no aplica auto_now: updated_at se actualiza a mano para el ETag
+    updated = Profile.objects.filter(pk=profile_id, foto=original_name).update(
+        foto_variants=variants,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        delete_variants(variants, keep=previous)
+        return None
+    # Regeneración: borrar los derivados anteriores que cambiaron de nombre
+    delete_variants(previous, keep=variants)
+
+    user_id = Profile.objects.filter(pk=profile_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate_profile(user_id)
+        invalidate_user_snapshot(user_id)
+    return variants
+
+
+def _run_job(profile_id, original_name):
+    try:
+        generate_variants(profile_id, original_name)
+    except Exception:
+        logger.exception('Error generando derivados de %s', original_name)
+
+
+def enqueue_variants(profile):
+    """
+    Encolar la generación de derivados en el pool ``images`` cuando la
+    transacción se confirme (``EXECUTORS['images']['WORKERS'] = 0``: en el
+    mismo hilo, para tests y comandos de gestión)
+    """
+    if not profile.foto:
+        return
+    profile_id, original_name = profile.pk, profile.foto.name
+
+    def submit():
+        if not executors.get_executor_config('images')['WORKERS']:
+            _run_job(profile_id, original_name)
+            return
+        try:
+            executors.submit('images', _run_job, profile_id, original_name)
+        except executors.ExecutorSaturated:
+            logger.warning(
+                'Pool images saturado: derivados de %s pendientes (generate_photo_variants)', original_name
+            )
+
+    transaction.on_commit(submit)
+
+
+def delete_variants(variants, keep=None):
+    """Eliminar del storage los archivos de un mapa de derivados (salvo los de ``keep``)"""
+    kept = {name for formats in (keep or {}).values() for name in formats.values()}
+    for formats in (variants or {}).values():
+        for name in formats.values():
+            if name not in kept:
+                default_storage.delete(name)
+
+
+def variant_urls(variants):
+    """Convertir el mapa de nombres en un mapa de URLs"""
+    return {
+        size: {fmt: default_storage.url(name) for fmt, name in formats.items()}
+        for size, formats in (variants or {}).items()
+    }
@@ -0,0 +1,284 @@
+"""
+Importación masiva de usuarios y perfiles desde CSV o XLSX.
+
+Los archivos se leen fila a fila (memoria constante), las contraseñas se
+hashean en lotes en un pool de procesos y los registros se insertan con
+``bulk_create`` por bloques, sin disparar las señales ``post_save`` por fila.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import Profile
+
+
+USER_COLUMNS = ['username', 'password', 'email', 'first_name', 'last_name']
+
+PROFILE_COLUMNS = [
+    'telefono',
+    'documento',
+    'tipo_usuario',
+    'tipo_naturaleza',
+    'biografia',
+    'linkedin',
+    'twitter',
+    'github',
+    'sitio_web',
+    'esta_verificado',
+]
+
+ERROR_REPORT_COLUMNS = ['fila', 'username', 'error']
+
+
+def iter_csv_rows(fileobj):
+    """Iterar filas de un CSV (abierto en modo binario) como diccionarios"""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        # No cerrar el archivo del llamador
+        text.detach()
+
+
+def iter_xlsx_rows(fileobj):
+    """Iterar filas de la primera hoja de un XLSX en modo solo lectura"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        for values in rows:
+            yield {
+                column: ('' if value is None else str(value))
+                for column, value in zip(header, values)
+                if column
+            }
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename):
+    """Seleccionar el lector según la extensión del archivo"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(fileobj)
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(fileobj)
+    raise ValueError(f'Formato no soportado: {extension}. Use CSV o XLSX.')
+
+
+def _init_hash_worker(settings_module):
+    """Inicializar Django en los procesos del pool (start method spawn)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ['true', '1', 'yes', 'on', 'si', 'sí']
+
+
+@dataclass
+class ImportResult:
+    """Resumen de una importación"""
+
+    rows_done: int = 0
+    created: int = 0
+    errors: int = 0
+    error_rows: list = field(default_factory=list)
+
+
+class ProfileImporter:
+    """
+    Importador de usuarios y perfiles por bloques.
+
+    ``checkpoint_path`` guarda cuántas filas del archivo ya se procesaron
+    tras cada bloque confirmado, de modo que una importación interrumpida
+    puede reanudarse. ``error_report_path`` recibe una fila por cada
+    registro rechazado; sin reporte, ``error_rows`` guarda como máximo
+    ``max_error_rows`` errores (``errors`` los cuenta todos).
+    """
+
+    def __init__(self, chunk_size=1000, workers=None, checkpoint_path=None,
+                 error_report_path=None, max_error_rows=None):
+        self.chunk_size = chunk_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.checkpoint_path = checkpoint_path
+        self.error_report_path = error_report_path
+        self.max_error_rows = max_error_rows
+
+    # Checkpoint
+    def load_checkpoint(self, source):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return ImportResult()
+        with open(self.checkpoint_path, encoding='utf-8') as fh:
+            data = json.load(fh)
+        if data.get('source') != source:
+            return ImportResult()
+        return ImportResult(
+            rows_done=data['rows_done'],
+            created=data['created'],
+            errors=data['errors'],
+        )
+
+    def save_checkpoint(self, source, result):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            json.dump({
+                'source': source,
+                'rows_done': result.rows_done,
+                'created': result.created,
+                'errors': result.errors,
+            }, fh)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # Importación
+    def run(self, rows, source='', resume=False):
+        """Importar un iterable de filas (diccionarios)"""
+        result = self.load_checkpoint(source) if resume else ImportResult()
+        rows = iter(rows)
+        for _ in islice(rows, result.rows_done):
+            pass
+
+        report = writer = None
+        if self.error_report_path:
+            append = resume and result.rows_done and os.path.exists(self.error_report_path)
+            report = open(self.error_report_path, 'a' if append else 'w', newline='', encoding='utf-8')
+            writer = csv.writer(report)
+            if not append:
+                writer.writerow(ERROR_REPORT_COLUMNS)
+
+        pool = None
+        if self.workers and self.workers > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_hash_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'backend_profile.settings'),),
+            )
+        try:
+            while True:
+                start = result.rows_done
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+                created, errors = self.import_chunk(chunk, start, pool)
+                result.rows_done += len(chunk)
+                result.created += created
+                result.errors += len(errors)
+                if writer:
+                    writer.writerows(errors)
+                    report.flush()
+                elif self.max_error_rows is None:
+                    result.error_rows.extend(errors)
+                else:
+                    room = self.max_error_rows - len(result.error_rows)
+                    result.error_rows.extend(errors[:max(room, 0)])
+                self.save_checkpoint(source, result)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if report is not None:
+                report.close()
+        return result
+
+    def import_chunk(self, chunk, start, pool=None):
+        """Validar, hashear e insertar un bloque. Retorna (creados, errores)"""
+        errors = []
+        pending = []
+        seen = set()
+        for offset, row in enumerate(chunk):
+            row_number = start + offset + 1
+            row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            username = row.get('username', '')
+            try:
+                user, profile = self.build_instances(row)
+            except ValidationError as e:
+                errors.append([row_number, username, '; '.join(e.messages)])
+                continue
+            if username in seen:
+                errors.append([row_number, username, 'Usuario duplicado en el archivo'])
+                continue
+            seen.add(username)
+            pending.append((row_number, row.get('password') or None, user, profile))
+
+        existing = set(
+            User.objects.filter(username__in=seen).values_list('username', flat=True)
+        )
+        if existing:
+            for row_number, _, user, _ in pending:
+                if user.username in existing:
+                    errors.append([row_number, user.username, 'El usuario ya existe'])
+            pending = [item for item in pending if item[2].username not in existing]
+
+        errors.sort(key=lambda error: error[0])
+        if not pending:
+            return 0, errors
+
+        passwords = [item[1] for item in pending]
+        if pool is not None:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashes = list(pool.map(make_password, passwords, chunksize=chunksize))
+        else:
+            hashes = [make_password(password) for password in passwords]
+        for (_, _, user, _), password_hash in zip(pending, hashes):
+            user.password = password_hash
+
+        try:
+            with transaction.atomic():
+                self.insert(pending)
+            return len(pending), errors
+        except IntegrityError:
+            # Otro proceso insertó alguno de los usuarios: reintentar fila por fila
+            created = 0
+            for item in pending:
+                try:
+                    with transaction.atomic():
+                        self.insert([item])
+                    created += 1
+                except IntegrityError as e:
+                    errors.append([item[0], item[2].username, str(e)])
+            return created, errors
+
+    def insert(self, pending):
+        """bulk_create de usuarios y perfiles (no dispara post_save)"""
+        users = User.objects.bulk_create([item[2] for item in pending])
+        profiles = []
+        for user, (_, _, _, profile) in zip(users, pending):
+            profile.user = user
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles)
+
+    def build_instances(self, row):
+        """Construir y validar (sin consultas) las instancias de una fila"""
+        user = User(**{column: row.get(column, '') for column in USER_COLUMNS if column != 'password'})
+        profile_data = {column: row[column] for column in PROFILE_COLUMNS if row.get(column)}
+        if 'esta_verificado' in profile_data:
+            profile_data['esta_verificado'] = _parse_bool(profile_data['esta_verificado'])
+        profile = Profile(**profile_data)
+
+        errors = {}
+        try:
+            user.clean_fields(exclude=['password', 'last_login', 'date_joined'])
+        except ValidationError as e:
+            errors.update(e.message_dict)
+        try:
+            profile.clean_fields(exclude=['user', 'foto'])
+        except ValidationError as e:
+            errors.update(e.message_dict)
+        if errors:
+            raise ValidationError(
+                [f'{name}: {message}' for name, messages in errors.items() for message in messages]
+            )
+        return user, profile
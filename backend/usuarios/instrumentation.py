@@ -0,0 +1,289 @@
+"""
+Instrumentación por petición: consultas SQL, tiempos por fase y Server-Timing.
+
+``install()`` agrega un execute wrapper a cada conexión (también a las que
+se abran después). El wrapper anota cada consulta en el ``QueryLog`` activo
+del contexto; sin un registro activo solo consulta un ContextVar.
+
+Como el registro vive en un ContextVar, incluye las consultas hechas en los
+pools de ``usuarios.executors`` y en ``sync_to_async``, que copian el
+contexto de la petición. Los registros se anidan: una consulta cuenta en el
+registro activo y en los que lo contienen.
+
+Uso::
+
+    install()
+    with record_queries() as log:
+        ...
+    log.count, log.duration
+
+``RequestInstrumentationMiddleware`` (``settings.REQUEST_INSTRUMENTATION``)
+registra cada petición, mide las fases marcadas con ``phase()`` (auth,
+serialize, render; view es el resto), agrega la cabecera ``Server-Timing``
+y escribe en el log las peticiones que superan el presupuesto de consultas
+o de latencia, con las consultas agrupadas por huella. Desactivado, el
+middleware no se instala y ``phase()`` solo consulta un ContextVar.
+
+``Server-Timing`` revela cuántas consultas hace cada endpoint y cuánto tarda
+la base de datos: solo se envía con ``DEBUG`` o a las IPs de
+``SERVER_TIMING_ALLOWED_IPS`` (por defecto loopback). El SQL de cada consulta
+solo se guarda si hay un presupuesto que vigilar, y como mucho
+``MAX_CAPTURED_QUERIES`` por petición.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUEST_INSTRUMENTATION = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+    # Clientes que reciben Server-Timing (además de todos con DEBUG); None = cualquiera
+    'SERVER_TIMING_ALLOWED_IPS': ['127.0.0.1', '::1'],
+    # Presupuestos por petición; None = sin límite
+    'MAX_QUERIES': 20,
+    'MAX_DURATION_MS': 500,
+    # Huellas SQL incluidas en el log de una petición fuera de presupuesto
+    'LOGGED_FINGERPRINTS': 5,
+    # SQL guardado por petición para esas huellas (las demás solo se cuentan)
+    'MAX_CAPTURED_QUERIES': 200,
+}
+
+# Fases marcadas con phase(); el tiempo restante de la petición es "view"
+PHASES = ['auth', 'serialize', 'render']
+
+_current_log = contextvars.ContextVar('usuarios_query_log', default=None)
+_current_timings = contextvars.ContextVar('usuarios_request_timings', default=None)
+_installed = False
+
+string_literal_re = re.compile(r"'(?:[^']|'')*'")
+number_re = re.compile(r'\b\d+\b')
+in_list_re = re.compile(r'\bIN \((?:\?, )*\?\)')
+whitespace_re = re.compile(r'\s+')
+
+
+class QueryLog:
+    """
+    Consultas de una petición: cantidad, tiempo total y (opcional) el SQL de
+    las primeras ``max_captured``
+    """
+
+    def __init__(self, capture_sql=False, parent=None, max_captured=None):
+        self.capture_sql = capture_sql
+        self.max_captured = max_captured
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        # Las sub-peticiones de un batch registran desde varios hilos
+        self._lock = threading.Lock()
+
+    def record(self, sql, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            if self.capture_sql and (self.max_captured is None or len(self.queries) < self.max_captured):
+                self.queries.append((sql, duration))
+        if self.parent is not None:
+            self.parent.record(sql, duration)
+
+
+class RequestTimings:
+    """Duración acumulada de cada fase de una petición"""
+
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, duration):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + duration
+
+
+def query_wrapper(execute, sql, params, many, context):
+    log = _current_log.get()
+    if log is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.record(sql, time.perf_counter() - started)
+
+
+def add_wrapper(connection):
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+
+def on_connection_created(sender, connection, **kwargs):
+    add_wrapper(connection)
+
+
+def install():
+    """Instrumentar las conexiones (idempotente)"""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    connection_created.connect(on_connection_created, dispatch_uid='usuarios_query_log')
+    # Los wrappers se guardan por objeto conexión (uno por hilo): cubrir el actual
+    for connection in connections.all(initialized_only=True):
+        add_wrapper(connection)
+
+
+@contextmanager
+def record_queries(capture_sql=False):
+    """Registrar las consultas ejecutadas dentro del bloque"""
+    log = QueryLog(capture_sql, parent=_current_log.get())
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Sumar la duración del bloque a la fase ``name`` de la petición en curso"""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def fingerprint(sql):
+    """SQL sin valores literales, para agrupar consultas repetidas (p. ej. N+1)"""
+    sql = string_literal_re.sub('?', sql.replace('%s', '?'))
+    sql = in_list_re.sub('IN (...)', number_re.sub('?', sql))
+    return whitespace_re.sub(' ', sql).strip()
+
+
+def summarize_queries(queries, limit):
+    """[(huella, cantidad, duración)] de las huellas que más tiempo suman"""
+    groups = {}
+    for sql, duration in queries:
+        key = fingerprint(sql)
+        count, total = groups.get(key, (0, 0.0))
+        groups[key] = (count + 1, total + duration)
+    ranked = sorted(groups.items(), key=lambda item: item[1][1], reverse=True)
+    return [(key, count, total) for key, (count, total) in ranked[:limit]]
+
+
+def get_instrumentation_config():
+    return {**DEFAULT_REQUEST_INSTRUMENTATION, **getattr(settings, 'REQUEST_INSTRUMENTATION', {})}
+
+
+def server_timing(timings, log, total):
+    """Valor de la cabecera Server-Timing (duraciones en ms)"""
+    phases = dict(timings.phases)
+    phases['view'] = max(total - sum(phases.get(name, 0.0) for name in PHASES), 0.0)
+    metrics = [
+        f'{name};dur={phases[name] * 1000:.1f}'
+        for name in ['auth', 'view', 'serialize', 'render'] if name in phases
+    ]
+    # db se solapa con las demás fases
+    metrics.append(f'db;dur={log.duration * 1000:.1f};desc="{log.count} queries"')
+    metrics.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(metrics)
+
+
+class RequestInstrumentationMiddleware:
+    """Consultas y tiempos por petición; Server-Timing y log de presupuestos"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.config = get_instrumentation_config()
+        if not self.config['ENABLED']:
+            raise MiddlewareNotUsed()
+        install()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(state)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(state)
+        return self.finish(request, response, state)
+
+    def start(self):
+        # El SQL solo hace falta para el log de las peticiones fuera de presupuesto
+        log = QueryLog(
+            capture_sql=self.has_budget(),
+            parent=_current_log.get(),
+            max_captured=self.config['MAX_CAPTURED_QUERIES'],
+        )
+        timings = RequestTimings()
+        tokens = (_current_log.set(log), _current_timings.set(timings))
+        return {'log': log, 'timings': timings, 'tokens': tokens, 'started': time.perf_counter()}
+
+    def stop(self, state):
+        state['total'] = time.perf_counter() - state['started']
+        log_token, timings_token = state['tokens']
+        _current_log.reset(log_token)
+        _current_timings.reset(timings_token)
+
+    def finish(self, request, response, state):
+        log, timings, total = state['log'], state['timings'], state['total']
+        if self.sends_server_timing(request):
+            response.headers['Server-Timing'] = server_timing(timings, log, total)
+
+        max_queries = self.config['MAX_QUERIES']
+        max_duration = self.config['MAX_DURATION_MS']
+        over_queries = max_queries is not None and log.count > max_queries
+        over_duration = max_duration is not None and total * 1000 > max_duration
+        if over_queries or over_duration:
+            self.log_over_budget(request, response, log, total)
+        return response
+
+    def has_budget(self):
+        return self.config['MAX_QUERIES'] is not None or self.config['MAX_DURATION_MS'] is not None
+
+    def sends_server_timing(self, request):
+        """Server-Timing solo con DEBUG o para las IPs permitidas"""
+        if not self.config['SERVER_TIMING']:
+            return False
+        allowed_ips = self.config['SERVER_TIMING_ALLOWED_IPS']
+        return settings.DEBUG or allowed_ips is None or request.META.get('REMOTE_ADDR') in allowed_ips
+
+    def log_over_budget(self, request, response, log, total):
+        lines = [
+            f'{request.method} {request.path} {response.status_code}: '
+            f'{log.count} consultas ({log.duration * 1000:.1f} ms), {total * 1000:.1f} ms en total '
+            f'(presupuesto: {self.config["MAX_QUERIES"]} consultas, {self.config["MAX_DURATION_MS"]} ms)'
+        ]
+        for key, count, duration in summarize_queries(log.queries, self.config['LOGGED_FINGERPRINTS']):
+            lines.append(f'  {count}x {duration * 1000:.1f} ms  {key}')
+        logger.warning('\n'.join(lines))
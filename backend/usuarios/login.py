@@ -0,0 +1,212 @@
+"""
+Autenticación de logins con control de admisión.
+
+El hash PBKDF2 de ``authenticate()`` ocupa un hilo durante decenas de
+milisegundos, así que una ráfaga de logins (o un ataque de credential
+stuffing) no debe poder agotar los workers del servidor:
+
+- Antes de calcular ningún hash se rechazan los pares usuario/IP con
+  demasiados fallos recientes (429).
+- Las vistas sync calculan el hash en su propio hilo con como máximo
+  ``EXECUTORS['hashing']['SYNC_MAX_CONCURRENT']`` hashes simultáneos por
+  proceso (menos que los hilos de gunicorn); las async lo envían al pool
+  acotado ``hashing`` (``WORKERS`` + ``MAX_QUEUE``). En ambos casos, sin
+  capacidad libre se responde 503 sin esperar.
+
+Con ``REJECT_UNKNOWN_USERS`` los usernames inexistentes se rechazan sin
+calcular el hash. Está desactivado por defecto: esa respuesta es más rápida
+que la de un password incorrecto y permite enumerar usuarios por tiempo;
+sin la opción, ``ModelBackend`` calcula un hash de relleno.
+
+La espera en cola y el tiempo de hash se publican como
+``usuarios_executor_queue_wait_seconds{pool="hashing"}`` y
+``usuarios_executor_run_seconds{pool="hashing"}``.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+
+from .executors import ExecutorSaturated, run_admitted, run_blocking
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOGIN_ADMISSION = {
+    # Fallos permitidos por par usuario/IP dentro de FAILURE_WINDOW segundos
+    'MAX_FAILURES': 5,
+    'FAILURE_WINDOW': 300,
+    'MAX_TRACKED': 10000,
+    # Rechazar usernames inexistentes sin calcular el hash. Responde más
+    # rápido que un password incorrecto y expone qué usuarios existen por
+    # tiempo de respuesta: activar solo si eso no importa.
+    'REJECT_UNKNOWN_USERS': False,
+    # Retry-After (segundos) cuando el pool de hashing está saturado
+    'RETRY_AFTER': 1,
+}
+
+
+class LoginRejected(Exception):
+    """Login rechazado antes de autenticar; ``status`` es el código HTTP"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+class FailedLoginTracker:
+    """
+    Contador de fallos por ``(username, ip)`` en ventanas fijas.
+    Acotado a ``max_entries`` pares (se descartan los más antiguos).
+    """
+
+    def __init__(self, max_failures=5, window=300, max_entries=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def retry_after(self, username, ip):
+        """Segundos hasta que el par pueda reintentar, o 0 si no está bloqueado"""
+        key = (username.lower(), ip)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return 0
+            failures, started_at = item
+            remaining = started_at + self.window - now
+            if remaining <= 0:
+                del self._data[key]
+                return 0
+            if failures < self.max_failures:
+                return 0
+            return math.ceil(remaining)
+
+    def record_failure(self, username, ip):
+        key = (username.lower(), ip)
+        now = time.monotonic()
+        with self._lock:
+            failures, started_at = self._data.get(key, (0, now))
+            if started_at + self.window <= now:
+                failures, started_at = 0, now
+            self._data[key] = (failures + 1, started_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def reset(self, username, ip):
+        with self._lock:
+            self._data.pop((username.lower(), ip), None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_tracker = None
+
+
+def get_login_config():
+    return {**DEFAULT_LOGIN_ADMISSION, **getattr(settings, 'LOGIN_ADMISSION', {})}
+
+
+def get_failed_login_tracker():
+    global _tracker
+    if _tracker is None:
+        config = get_login_config()
+        _tracker = FailedLoginTracker(
+            max_failures=config['MAX_FAILURES'],
+            window=config['FAILURE_WINDOW'],
+            max_entries=config['MAX_TRACKED'],
+        )
+    return _tracker
+
+
+def get_client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def precheck_login(username, ip):
+    """
+    Comprobaciones baratas previas al hash.
+    Retorna False si el login debe fallar sin autenticar.
+    """
+    config = get_login_config()
+    retry_after = get_failed_login_tracker().retry_after(username, ip)
+    if retry_after:
+        raise LoginRejected(
+            'Demasiados intentos fallidos. Intente más tarde.',
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            retry_after
+        )
+    if config['REJECT_UNKNOWN_USERS']:
+        User = get_user_model()
+        if not User._default_manager.filter(**{User.USERNAME_FIELD: username}).exists():
+            return False
+    return True
+
+
+def record_result(username, ip, user):
+    tracker = get_failed_login_tracker()
+    if user is None:
+        tracker.record_failure(username, ip)
+    else:
+        tracker.reset(username, ip)
+
+
+def saturated_error():
+    logger.warning('Pool de hashing saturado: login rechazado')
+    return LoginRejected(
+        'Servidor ocupado. Intente nuevamente.',
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+        get_login_config()['RETRY_AFTER']
+    )
+
+
+def check_credentials(request, username, password):
+    """
+    Autenticar en el hilo actual con la admisión del pool ``hashing``.
+    Retorna el usuario o None; lanza LoginRejected si el login no se admite.
+    """
+    ip = get_client_ip(request)
+    user = None
+    if precheck_login(username, ip):
+        try:
+            user = run_admitted('hashing', authenticate, request, username=username, password=password)
+        except ExecutorSaturated:
+            raise saturated_error()
+    record_result(username, ip, user)
+    return user
+
+
+async def acheck_credentials(request, username, password):
+    """Versión async de ``check_credentials`` (el hash no bloquea el event loop)"""
+    ip = get_client_ip(request)
+    user = None
+    # La consulta previa no ocupa un hilo del pool de hashing
+    if await sync_to_async(precheck_login)(username, ip):
+        try:
+            user = await run_blocking('hashing', authenticate, request, username=username, password=password)
+        except ExecutorSaturated:
+            raise saturated_error()
+    record_result(username, ip, user)
+    return user
+
+
+@receiver(setting_changed)
+def reset_tracker(setting, **kwargs):
+    global _tracker
+    if setting == 'LOGIN_ADMISSION':
+        _tracker = None
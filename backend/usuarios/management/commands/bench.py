@@ -0,0 +1,431 @@
+"""
+Benchmark de extremo a extremo de la API contra un servidor local.
+
+1. Crea una base de datos SQLite temporal (migrada) con ``--users`` usuarios.
+2. Levanta el proyecto en un subproceso: WSGI con gunicorn y la
+   configuración de producción (``gunicorn.conf.py``) o ASGI con uvicorn,
+   si está instalado.
+3. Ejecuta cada escenario con ``--concurrency`` clientes en paralelo hasta
+   completar ``--requests`` peticiones.
+4. Imprime (o guarda en ``--output``) un JSON con throughput, latencias
+   p50/p95/p99 y consultas SQL por petición, para comparar entre commits.
+
+El servidor cuenta las consultas de cada petición (``usuarios.instrumentation``)
+y las devuelve en la cabecera ``X-Bench-Queries``.
+
+Uso: python manage.py bench --users 500 --concurrency 8 --requests 400 --output bench.json
+"""
+import http.client
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from usuarios.instrumentation import install, record_queries
+from usuarios.seeding import seed_profiles
+
+
+BENCH_PASSWORD = 'bench-password-2024'
+QUERIES_HEADER = 'X-Bench-Queries'
+SCENARIOS = ['login', 'perfil', 'perfil_put', 'perfil_foto', 'token_refresh']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def current_commit():
+    """Commit de git del código medido, si está disponible"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def sample_photo():
+    """PNG de 400x400 generado en memoria"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 400), (200, 120, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def multipart(field, filename, content, content_type):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class WSGIQueryCounter:
+    """Aplicación WSGI que agrega la cantidad de consultas a la respuesta"""
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        with record_queries() as log:
+            def counting_start_response(status, headers, exc_info=None):
+                return start_response(status, [*headers, (QUERIES_HEADER, str(log.count))], exc_info)
+
+            return self.application(environ, counting_start_response)
+
+
+class ASGIQueryCounter:
+    """Aplicación ASGI que agrega la cantidad de consultas a la respuesta"""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        with record_queries() as log:
+            async def counting_send(message):
+                if message['type'] == 'http.response.start':
+                    header = (QUERIES_HEADER.lower().encode(), str(log.count).encode())
+                    message = {**message, 'headers': [*message.get('headers', []), header]}
+                await send(message)
+
+            await self.application(scope, receive, counting_send)
+
+
+def run_gunicorn(application, bind):
+    """Servir ``application`` con gunicorn y ``gunicorn.conf.py`` (workers, hilos, reciclado)"""
+    from gunicorn.app.base import Application
+
+    class Server(Application):
+        # Sin leer la línea de comandos, que es la de manage.py
+        def load_config(self):
+            self.load_config_from_file(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+            self.cfg.set('bind', [bind])
+
+        def load(self):
+            return application
+
+    Server().run()
+
+
+class Client:
+    """
+    Cliente HTTP de un hilo con una conexión keep-alive, como un navegador o
+    un proxy delante de la API. Si el servidor cerró la conexión mientras
+    estaba inactiva (``keepalive`` de gunicorn, reciclado de workers) se
+    reintenta una vez con una conexión nueva.
+    """
+
+    def __init__(self, port, user):
+        self.port = port
+        self.user = user
+        self.access = user['access']
+        self.refresh = user['refresh']
+        self.connection = None
+
+    def request(self, method, path, body=None, content_type='application/json', authenticated=True):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        headers = {}
+        if body is not None:
+            headers['Content-Type'] = content_type
+        if authenticated:
+            headers['Authorization'] = f'Bearer {self.access}'
+
+        reused = self.connection is not None
+        try:
+            response, content = self.send(method, path, body, headers)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            self.close()
+            if not reused:
+                raise
+            response, content = self.send(method, path, body, headers)
+        return response.status, response.getheader(QUERIES_HEADER), content
+
+    def send(self, method, path, body, headers):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except BaseException:
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response, content
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_login(client, photo):
+    return client.request('POST', '/usuarios/api/login/', {
+        'username': client.user['username'],
+        'password': BENCH_PASSWORD,
+    }, authenticated=False)
+
+
+def run_perfil(client, photo):
+    return client.request('GET', '/usuarios/api/perfil/')
+
+
+def run_perfil_put(client, photo):
+    return client.request('PUT', '/usuarios/api/usuario/perfil/', {
+        'user': {
+            'first_name': 'Bench',
+            'last_name': client.user['username'],
+            'email': f'{client.user["username"]}@example.com',
+        },
+        'telefono': str(time.monotonic_ns() % 10 ** 10),
+    })
+
+
+def run_perfil_foto(client, photo):
+    body, content_type = multipart('foto', 'bench.png', photo, 'image/png')
+    return client.request('PATCH', '/usuarios/api/perfil/foto/', body, content_type)
+
+
+def run_token_refresh(client, photo):
+    status, queries, content = client.request(
+        'POST', '/usuarios/api/token/refresh/', {'refresh': client.refresh}
+    )
+    if status == 200:
+        # El refresh rota: el siguiente usa el token nuevo
+        client.refresh = json.loads(content)['refresh']
+    return status, queries, content
+
+
+RUNNERS = {
+    'login': run_login,
+    'perfil': run_perfil,
+    'perfil_put': run_perfil_put,
+    'perfil_foto': run_perfil_foto,
+    'token_refresh': run_token_refresh,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de los endpoints contra un servidor local; resultado en JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Usuarios a crear en la base temporal')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por escenario')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Escenarios separados por coma')
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--output', help='Archivo JSON de salida (por defecto stdout)')
+        # Uso interno: proceso servidor
+        parser.add_argument('--serve', action='store_true', help='(interno) servir la API')
+        parser.add_argument('--database', help='(interno) base de datos SQLite a servir')
+        parser.add_argument('--port', type=int)
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self.serve(options)
+
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(RUNNERS)
+        if unknown:
+            raise CommandError(f'Escenarios desconocidos: {", ".join(sorted(unknown))}')
+        if connection.vendor != 'sqlite':
+            raise CommandError('El benchmark usa una base SQLite temporal')
+        if options['server'] == 'asgi':
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('--server asgi requiere uvicorn')
+        else:
+            try:
+                import gunicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('--server wsgi requiere gunicorn')
+        if options['users'] < options['concurrency']:
+            raise CommandError('--users debe ser mayor o igual que --concurrency')
+
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, 'bench.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = database
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seeded_at = time.perf_counter()
+                users = self.seed(options['users'], options['concurrency'])
+                self.stderr.write(f'{options["users"]} usuarios en {time.perf_counter() - seeded_at:.1f} s')
+                connection.close()
+                results = self.run_server(database, directory, users, scenarios, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
+
+    def seed(self, count, clients):
+        """Crear los usuarios con sus perfiles; retorna credenciales para ``clients``"""
+        seed_profiles(count, BENCH_PASSWORD, prefix='bench', seed=0)
+
+        credentials = []
+        for user in User.objects.filter(username__startswith='bench').order_by('id')[:clients]:
+            refresh = RefreshToken.for_user(user)
+            credentials.append({
+                'username': user.username,
+                'access': str(refresh.access_token),
+                'refresh': str(refresh),
+            })
+        return credentials
+
+    def run_server(self, database, directory, users, scenarios, options):
+        port = free_port()
+        log_path = os.path.join(directory, 'server.log')
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench', '--serve',
+            '--server', options['server'], '--database', database, '--port', str(port),
+        ]
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            self.wait_for_server(server, port, log_path)
+            results = {
+                'commit': current_commit(),
+                'server': options['server'],
+                'users': options['users'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'scenarios': {},
+            }
+            photo = sample_photo()
+            for name in scenarios:
+                results['scenarios'][name] = self.run_scenario(name, port, users, photo, options)
+                self.stderr.write(f'{name}: {results["scenarios"][name]["throughput"]} req/s')
+            return results
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+    def wait_for_server(self, server, port, log_path, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                with open(log_path) as log:
+                    raise CommandError(f'El servidor terminó al iniciar:\n{log.read()[-2000:]}')
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError('El servidor no respondió a tiempo')
+
+    def run_scenario(self, name, port, users, photo, options):
+        runner = RUNNERS[name]
+        total = options['requests']
+        samples = []
+        statuses = {}
+        lock = threading.Lock()
+        issued = iter(range(total))
+
+        def worker(user):
+            client = Client(port, user)
+            try:
+                while True:
+                    with lock:
+                        if next(issued, None) is None:
+                            return
+                    started = time.perf_counter()
+                    try:
+                        status, queries, _ = runner(client, photo)
+                    except (http.client.HTTPException, OSError):
+                        status, queries = 'connection_error', None
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        samples.append((elapsed, int(queries) if queries is not None else None))
+                        statuses[str(status)] = statuses.get(str(status), 0) + 1
+            finally:
+                client.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users[:options['concurrency']]]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, _ in samples]
+        queries = [count for _, count in samples if count is not None]
+        ok = sum(count for status, count in statuses.items() if status.startswith('2'))
+        return {
+            'requests': len(samples),
+            'errors': len(samples) - ok,
+            'status': statuses,
+            'throughput': round(len(samples) / elapsed, 2),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.50), 2),
+                'p95': round(percentile(latencies, 0.95), 2),
+                'p99': round(percentile(latencies, 0.99), 2),
+                'max': round(max(latencies), 2),
+            },
+            'queries_per_request': {
+                'mean': round(sum(queries) / len(queries), 2) if queries else None,
+                'max': max(queries) if queries else None,
+            },
+        }
+
+    def serve(self, options):
+        """Proceso servidor: la API sobre ``--database`` con conteo de consultas"""
+        # Igual que los workers del test runner: apuntar la conexión a la base temporal
+        settings.DATABASES['default']['NAME'] = options['database']
+        connection.settings_dict['NAME'] = options['database']
+        connection.close()
+        # DEBUG guardaría cada consulta en connection.queries
+        settings.DEBUG = False
+        # Las fotos subidas y las métricas quedan junto a la base temporal
+        directory = os.path.dirname(options['database'])
+        settings.MEDIA_ROOT = os.path.join(directory, 'media')
+        settings.METRICS = {**getattr(settings, 'METRICS', {}), 'DIRECTORY': os.path.join(directory, 'metrics')}
+        install()
+
+        if options['server'] == 'asgi':
+            import uvicorn
+            from django.core.asgi import get_asgi_application
+
+            uvicorn.run(
+                ASGIQueryCounter(get_asgi_application()),
+                host='127.0.0.1', port=options['port'], log_level='warning'
+            )
+        else:
+            from django.core.wsgi import get_wsgi_application
+
+            run_gunicorn(WSGIQueryCounter(get_wsgi_application()), f'127.0.0.1:{options["port"]}')
@@ -0,0 +1,56 @@
+"""
+Comparar la búsqueda FTS5 con la búsqueda LIKE del admin.
+
+Uso: python manage.py bench_profile_search carlos moreno 300 --iterations 50
+"""
+import time
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from usuarios import search
+from usuarios.admin import ProfileAdmin
+from usuarios.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Mide la búsqueda de perfiles FTS5 frente a LIKE %%term%%'
+
+    def add_arguments(self, parser):
+        parser.add_argument('terms', nargs='+', help='Términos a buscar')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=100, help='Filas leídas por consulta')
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError('El índice FTS5 no existe. Ejecute migrate o rebuild_profile_search.')
+
+        iterations = options['iterations']
+        limit = options['limit']
+        self.stdout.write(f'Perfiles: {Profile.objects.count()} | iteraciones: {iterations}')
+        self.stdout.write(f'{"término":<20} {"LIKE ms":>10} {"FTS ms":>10} {"LIKE n":>8} {"FTS n":>8}')
+
+        for term in options['terms']:
+            like_qs = Profile.objects.select_related('user').filter(self.like_filter(term))
+            fts_qs = Profile.objects.select_related('user').filter(
+                id__in=search.matching_profile_ids(search.build_match_query(term))
+            )
+            like_ms, like_n = self.measure(like_qs, iterations, limit)
+            fts_ms, fts_n = self.measure(fts_qs, iterations, limit)
+            self.stdout.write(f'{term:<20} {like_ms:>10.2f} {fts_ms:>10.2f} {like_n:>8} {fts_n:>8}')
+
+    def like_filter(self, term):
+        """Mismo filtro que genera el admin con search_fields"""
+        return reduce(or_, (
+            Q(**{f'{field}__icontains': term}) for field in ProfileAdmin.search_fields
+        ))
+
+    def measure(self, queryset, iterations, limit):
+        count = queryset.count()
+        started = time.perf_counter()
+        for _ in range(iterations):
+            list(queryset[:limit])
+        elapsed = (time.perf_counter() - started) * 1000 / iterations
+        return elapsed, count
@@ -0,0 +1,71 @@
+"""
+Comparar la serialización de perfiles con DRF frente al lector compilado.
+
+Verifica primero que ambos caminos producen los mismos bytes para cada
+selección medida y luego mide el tiempo por página.
+
+Uso: python manage.py bench_profile_serializer --rows 100 --iterations 50
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from usuarios.models import Profile
+from usuarios.readers import get_profile_reader
+from usuarios.renderers import FastJSONRenderer
+from usuarios.serializers import FieldSelection, ProfileDirectorySerializer, serialize_profiles
+
+
+# Selecciones medidas: (nombre, query params)
+SELECTIONS = [
+    ('completo', {}),
+    ('sin user', {'exclude': 'user'}),
+    ('fields', {'fields': 'id,user,tipo_usuario,foto_url'}),
+    ('fields+expand', {'fields': 'id,user,tipo_usuario,foto_url', 'expand': 'user'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Mide serializer + JSONRenderer frente a lector compilado + FastJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Perfiles por página')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        iterations = options['iterations']
+        if not Profile.objects.exists():
+            raise CommandError('No hay perfiles. Ejecute import_profiles primero.')
+
+        self.stdout.write(f'Perfiles por página: {rows} | iteraciones: {iterations}')
+        self.stdout.write(f'{"selección":<16} {"DRF ms":>10} {"lector ms":>10} {"x":>6}')
+
+        drf_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        for name, params in SELECTIONS:
+            selection = FieldSelection.parse(params, ProfileDirectorySerializer)
+            reader = get_profile_reader(ProfileDirectorySerializer, selection)
+
+            def drf_page():
+                profiles = Profile.objects.select_related('user').order_by('-created_at', '-id')[:rows]
+                return drf_renderer.render(serialize_profiles(profiles, selection, ProfileDirectorySerializer))
+
+            def reader_page():
+                queryset = Profile.objects.order_by('-created_at', '-id').values(*reader.columns)[:rows]
+                return fast_renderer.render([reader(row) for row in queryset])
+
+            expected = drf_page()
+            if reader_page() != expected:
+                raise CommandError(f'{name}: el lector no produce la misma salida que el serializer')
+
+            drf_ms = self.measure(drf_page, iterations)
+            reader_ms = self.measure(reader_page, iterations)
+            self.stdout.write(f'{name:<16} {drf_ms:>10.2f} {reader_ms:>10.2f} {drf_ms / reader_ms:>6.1f}')
+
+    def measure(self, function, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        return (time.perf_counter() - started) * 1000 / iterations
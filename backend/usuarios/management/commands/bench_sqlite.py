@@ -0,0 +1,174 @@
+"""
+Medir lecturas y escrituras concurrentes de perfiles en SQLite con la
+configuración por defecto frente a la de ``settings.SQLITE_PRAGMAS``.
+
+Trabaja sobre una copia de la base de datos (``VACUUM INTO``), así que no
+modifica la real. Cada hilo simula peticiones: lecturas del perfil con su
+usuario y, con probabilidad ``--write-ratio``, una actualización dentro de
+una transacción como la de ``update_profile`` (lectura y luego escritura).
+
+- ``default``: journal en modo DELETE, conexión nueva por petición y
+  ``BEGIN`` diferido (igual que antes del perfil de producción).
+- ``tuned``: pragmas de settings, conexión persistente por hilo y
+  ``BEGIN IMMEDIATE``.
+
+Uso: python manage.py bench_sqlite --threads 8 --seconds 5 --write-ratio 0.2
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from usuarios.models import Profile
+
+
+READ_SQL = (
+    'SELECT p.*, u.username, u.email, u.first_name, u.last_name '
+    'FROM usuarios_profile p JOIN auth_user u ON u.id = p.user_id WHERE p.id = ?'
+)
+SELECT_FOR_UPDATE_SQL = 'SELECT updated_at FROM usuarios_profile WHERE id = ?'
+UPDATE_SQL = 'UPDATE usuarios_profile SET telefono = ?, updated_at = datetime(\'now\') WHERE id = ?'
+
+PROFILES = {
+    'default': {
+        # busy_timeout = timeout por defecto de sqlite3.connect (5 s)
+        'pragmas': {'journal_mode': 'DELETE', 'busy_timeout': 5000},
+        'persistent': False,
+        'begin': 'BEGIN',
+    },
+    'tuned': {
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'persistent': True,
+        'begin': 'BEGIN IMMEDIATE',
+    },
+}
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, profile, ids, write_ratio, deadline):
+        super().__init__()
+        self.path = path
+        self.profile = profile
+        self.ids = ids
+        self.write_ratio = write_ratio
+        self.deadline = deadline
+        self.random = random.Random()
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.latencies = []
+        self._connection = None
+
+    def connect(self):
+        if self._connection is not None:
+            return self._connection
+        # timeout=0: la espera la controla el pragma busy_timeout
+        conn = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+        for name, value in self.profile['pragmas'].items():
+            conn.execute(f'PRAGMA {name}={value}')
+        if self.profile['persistent']:
+            self._connection = conn
+        return conn
+
+    def request(self):
+        conn = self.connect()
+        try:
+            pk = self.random.choice(self.ids)
+            if self.random.random() < self.write_ratio:
+                conn.execute(self.profile['begin'])
+                try:
+                    conn.execute(SELECT_FOR_UPDATE_SQL, (pk,)).fetchone()
+                    conn.execute(UPDATE_SQL, (str(self.random.randrange(10 ** 9)), pk))
+                    conn.execute('COMMIT')
+                except sqlite3.Error:
+                    conn.execute('ROLLBACK')
+                    raise
+                self.writes += 1
+            else:
+                conn.execute(READ_SQL, (pk,)).fetchone()
+                self.reads += 1
+        finally:
+            if not self.profile['persistent']:
+                conn.close()
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            started = time.perf_counter()
+            try:
+                self.request()
+            except sqlite3.OperationalError:
+                # "database is locked": la petición habría respondido 500
+                self.errors += 1
+            self.latencies.append(time.perf_counter() - started)
+        if self._connection is not None:
+            self._connection.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Compara lectura/escritura concurrente en SQLite con y sin el perfil de producción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Solo aplica a la base de datos SQLite')
+        ids = list(Profile.objects.values_list('id', flat=True))
+        if not ids:
+            raise CommandError('No hay perfiles. Ejecute import_profiles primero.')
+
+        self.stdout.write(
+            f'Perfiles: {len(ids)} | hilos: {options["threads"]} | '
+            f'escrituras: {options["write_ratio"]:.0%} | {options["seconds"]} s por perfil'
+        )
+        self.stdout.write(
+            f'{"perfil":<10} {"ops/s":>10} {"lecturas":>10} {"escrituras":>10} '
+            f'{"errores":>8} {"p50 ms":>8} {"p99 ms":>8}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, profile in PROFILES.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                with connection.cursor() as cursor:
+                    cursor.execute('VACUUM INTO %s', [path])
+                # journal_mode se guarda en el archivo: fijarlo antes de los hilos
+                conn = sqlite3.connect(path)
+                conn.execute(f'PRAGMA journal_mode={profile["pragmas"].get("journal_mode", "DELETE")}')
+                conn.close()
+                self.run_profile(name, path, profile, ids, options)
+
+    def run_profile(self, name, path, profile, ids, options):
+        deadline = time.perf_counter() + options['seconds']
+        workers = [
+            Worker(path, profile, ids, options['write_ratio'], deadline)
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        reads = sum(worker.reads for worker in workers)
+        writes = sum(worker.writes for worker in workers)
+        errors = sum(worker.errors for worker in workers)
+        latencies = [value for worker in workers for value in worker.latencies]
+        self.stdout.write(
+            f'{name:<10} {(reads + writes) / elapsed:>10.0f} {reads:>10} {writes:>10} {errors:>8} '
+            f'{percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}'
+        )
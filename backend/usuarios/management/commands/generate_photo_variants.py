@@ -0,0 +1,35 @@
+"""
+Generar los derivados de las fotos de perfil existentes.
+
+Uso: python manage.py generate_photo_variants [--all]
+"""
+from django.core.management.base import BaseCommand
+
+from usuarios.images import generate_variants
+from usuarios.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Genera las versiones reducidas (WebP/JPEG) de las fotos de perfil'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerar también los perfiles que ya tienen derivados'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Profile.objects.exclude(foto='').exclude(foto__isnull=True)
+        if not options['all']:
+            queryset = queryset.filter(foto_variants={})
+
+        done = failed = 0
+        for profile_id, foto in queryset.values_list('id', 'foto').iterator():
+            try:
+                generate_variants(profile_id, foto)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'{foto}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Derivados generados: {done} | errores: {failed}'))
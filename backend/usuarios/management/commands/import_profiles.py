@@ -0,0 +1,69 @@
+"""
+Importar usuarios y perfiles desde un archivo CSV o XLSX.
+
+Uso: python manage.py import_profiles usuarios.csv --chunk-size 2000 --resume
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.importers import ProfileImporter, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Importa usuarios y perfiles en bloque desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo CSV o XLSX a importar')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Filas por bloque de bulk_create (default: 1000)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Procesos para hashear contraseñas (default: núcleos de CPU; 1 = sin pool)'
+        )
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help='Archivo de progreso (default: <path>.checkpoint.json)'
+        )
+        parser.add_argument(
+            '--errors', default=None,
+            help='Reporte CSV de filas rechazadas (default: <path>.errores.csv)'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Reanudar desde el último bloque confirmado'
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        if not os.path.exists(path):
+            raise CommandError(f'No existe el archivo {path}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que 0')
+
+        importer = ProfileImporter(
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+            checkpoint_path=options['checkpoint'] or f'{path}.checkpoint.json',
+            error_report_path=options['errors'] or f'{path}.errores.csv',
+        )
+        stat = os.stat(path)
+        source = f'{path}:{stat.st_size}:{int(stat.st_mtime)}'
+
+        started = time.perf_counter()
+        with open(path, 'rb') as fh:
+            try:
+                result = importer.run(iter_rows(fh, path), source=source, resume=options['resume'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Filas procesadas: {result.rows_done} | creados: {result.created} | '
+            f'errores: {result.errors} | {elapsed:.1f}s'
+        ))
+        if result.errors:
+            self.stdout.write(f'Reporte de errores: {importer.error_report_path}')
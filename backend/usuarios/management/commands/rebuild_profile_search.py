@@ -0,0 +1,24 @@
+"""
+Reconstruir el índice FTS5 de búsqueda de perfiles.
+
+Uso: python manage.py rebuild_profile_search
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from usuarios import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice FTS5 usado por la búsqueda de perfiles'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('La búsqueda FTS5 solo está disponible con SQLite')
+
+        with transaction.atomic():
+            # Recrear triggers por si fueron eliminados manualmente
+            search.create_index()
+            total = search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {total} perfiles'))
@@ -0,0 +1,44 @@
+"""
+Recalcular los contadores de filas (``usuarios.counts``) y recrear sus triggers.
+
+Uso: python manage.py recount_rows [--check]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from usuarios import counts
+
+
+class Command(BaseCommand):
+    help = 'Compara los contadores de filas con COUNT(*) y los repara'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Solo informar; termina con error si hay diferencias o faltan triggers'
+        )
+
+    def handle(self, *args, **options):
+        if not counts.counts_available():
+            raise CommandError('Los contadores de filas solo existen en SQLite (migración 0007)')
+
+        with transaction.atomic():
+            missing = counts.missing_triggers()
+            drifted = counts.drifted_tables()
+            for name in missing:
+                self.stdout.write(f'Falta el trigger {name}')
+            for table, stored, actual in drifted:
+                self.stdout.write(f'{table}: contador {stored}, filas {actual}')
+
+            if options['check']:
+                if missing or drifted:
+                    raise CommandError('Contadores de filas desactualizados')
+                self.stdout.write(self.style.SUCCESS('Contadores de filas al día'))
+                return
+
+            counts.recount()
+            counts.create_triggers()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Contadores recalculados: {len(drifted)} corregidos, {len(missing)} triggers recreados'
+        ))
@@ -0,0 +1,130 @@
+"""
+Generar usuarios y perfiles sintéticos.
+
+Uso:
+    python manage.py seed_profiles --users 1000000 --chunk-size 10000
+    python manage.py seed_profiles --users 5000 --distributions '{"foto": 0.8, "tipo_usuario": {"instructor": 1}}'
+    python manage.py seed_profiles --users 0 --demo-user
+"""
+import json
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from usuarios.models import Profile
+from usuarios.seeding import DEFAULT_DISTRIBUTIONS, seed_profiles
+
+
+# Usuario de prueba del frontend (antes create_test_user.py)
+DEMO_USER = {
+    'username': 'carlosandresmoreno',
+    'password': '90122856_Hanz',
+    'email': 'carlos.moreno@example.com',
+    'first_name': 'Carlos',
+    'last_name': 'Moreno',
+}
+
+DEMO_PROFILE = {
+    'telefono': '3001234567',
+    'documento': '12345678',
+    'tipo_usuario': 'instructor',
+    'tipo_naturaleza': 'natural',
+    'biografia': 'Instructor con amplia experiencia en desarrollo frontend y backend. Especializado en React, Node.js y Python.',
+    'linkedin': 'https://www.linkedin.com/in/carlos-moreno/',
+    'twitter': 'https://twitter.com/carlosmoreno',
+    'github': 'https://github.com/carlosmoreno',
+    'sitio_web': 'https://carlosmoreno.dev',
+    'esta_verificado': False,
+}
+
+
+class Command(BaseCommand):
+    help = 'Genera usuarios y perfiles sintéticos en bloque'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, required=True, help='Usuarios a crear')
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Filas por bloque de bulk_create (default: 5000)'
+        )
+        parser.add_argument(
+            '--password', default='seed-password-2024',
+            help='Contraseña de todos los usuarios generados (se hashea una vez)'
+        )
+        parser.add_argument('--prefix', default='seed', help='Prefijo de los usernames (default: seed)')
+        parser.add_argument('--seed', type=int, default=None, help='Semilla aleatoria (resultados reproducibles)')
+        parser.add_argument(
+            '--distributions', default=None,
+            help='JSON (o ruta a un archivo JSON) que reemplaza claves de DEFAULT_DISTRIBUTIONS'
+        )
+        parser.add_argument(
+            '--demo-user', action='store_true',
+            help=f'Crear o actualizar el usuario de prueba {DEMO_USER["username"]}'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 0:
+            raise CommandError('--users no puede ser negativo')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size debe ser mayor que 0')
+        distributions = self.load_distributions(options['distributions'])
+
+        if options['demo_user']:
+            self.create_demo_user()
+
+        if not options['users']:
+            return
+
+        def progress(created, elapsed):
+            self.stdout.write(f'{created}/{options["users"]} | {created / elapsed:,.0f} filas/s')
+
+        try:
+            result = seed_profiles(
+                options['users'],
+                options['password'],
+                distributions=distributions,
+                prefix=options['prefix'],
+                chunk_size=options['chunk_size'],
+                seed=options['seed'],
+                progress=progress if options['verbosity'] > 0 else None,
+            )
+        except IntegrityError as e:
+            raise CommandError(f'Usernames repetidos con el prefijo {options["prefix"]!r}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Usuarios creados: {result.created} | {result.elapsed:.1f}s | '
+            f'{result.rows_per_second:,.0f} usuarios/s (usuario + perfil)'
+        ))
+
+    def load_distributions(self, value):
+        if not value:
+            return None
+        try:
+            if os.path.exists(value):
+                with open(value, encoding='utf-8') as fh:
+                    distributions = json.load(fh)
+            else:
+                distributions = json.loads(value)
+        except ValueError as e:
+            raise CommandError(f'--distributions no es un JSON válido: {e}')
+        unknown = set(distributions) - set(DEFAULT_DISTRIBUTIONS)
+        if unknown:
+            raise CommandError(f'Distribuciones desconocidas: {", ".join(sorted(unknown))}')
+        for name in ('tipo_usuario', 'tipo_naturaleza'):
+            if name in distributions:
+                choices = dict(Profile._meta.get_field(name).choices)
+                invalid = set(distributions[name]) - set(choices)
+                if invalid:
+                    raise CommandError(f'{name}: opciones inválidas {", ".join(sorted(invalid))}')
+        return distributions
+
+    def create_demo_user(self):
+        user = User.objects.filter(username=DEMO_USER['username']).first()
+        if user is None:
+            user = User.objects.create_user(**DEMO_USER)
+        Profile.objects.update_or_create(user=user, defaults=DEMO_PROFILE)
+        self.stdout.write(
+            f'Usuario de prueba: {DEMO_USER["username"]} / {DEMO_USER["password"]}'
+        )
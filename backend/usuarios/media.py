@@ -0,0 +1,219 @@
+"""
+Servir los archivos de ``MEDIA_ROOT`` (fotos de perfil y sus derivados).
+
+``settings.MEDIA_SERVING['BACKEND']`` decide quién envía los bytes:
+
+- ``'x-accel-redirect'`` (nginx): la respuesta solo lleva la cabecera
+  ``X-Accel-Redirect: <ACCEL_PREFIX><ruta>`` y nginx sirve el archivo desde
+  una location ``internal``, con Range y sendfile propios::
+
+      location /protected-media/ {
+          internal;
+          alias /ruta/a/backend/media/;
+      }
+
+- ``'x-sendfile'`` (Apache mod_xsendfile, lighttpd): ``X-Sendfile`` con la
+  ruta absoluta del archivo.
+- ``None``: ``FileResponse`` desde Django. Con gunicorn el cuerpo se envía
+  con ``sendfile()`` (``wsgi.file_wrapper``), también para los rangos:
+  ``SendfileRange`` expone el descriptor ya posicionado y gunicorn solo
+  envía los bytes de Content-Length. Otros ``wsgi.file_wrapper`` pueden
+  enviar el archivo hasta el final si ven ``fileno()``, así que con
+  cualquier otro servidor (y con ASGI) el rango se lee con ``FileRange``,
+  que solo tiene ``read()``.
+
+En todos los casos se responden 304 (If-Modified-Since / If-None-Match)
+sin tocar el archivo. Los nombres bajo ``IMMUTABLE_PREFIXES`` son únicos
+(``upload_profile_image`` usa un uuid y los derivados salen de ese nombre):
+un archivo nunca cambia de contenido, así que se cachea como ``immutable``.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+
+DEFAULT_MEDIA_SERVING = {
+    # None | 'x-accel-redirect' | 'x-sendfile'
+    'BACKEND': None,
+    # Location internal de nginx que apunta a MEDIA_ROOT
+    'ACCEL_PREFIX': '/protected-media/',
+    # max-age de los archivos con nombre único (segundos)
+    'MAX_AGE': 365 * 24 * 60 * 60,
+    'IMMUTABLE_PREFIXES': ['perfiles/'],
+}
+
+range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class FileRange:
+    """Vista de solo lectura de ``length`` bytes de un archivo ya posicionado"""
+
+    def __init__(self, fh, length):
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+class SendfileRange(FileRange):
+    """
+    ``FileRange`` con ``fileno()``: gunicorn hace sendfile desde la posición
+    actual y lo acota con Content-Length
+    """
+
+    def fileno(self):
+        return self.fh.fileno()
+
+
+def get_media_serving_config():
+    return {**DEFAULT_MEDIA_SERVING, **getattr(settings, 'MEDIA_SERVING', {})}
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def cache_control(path, config):
+    if path.startswith(tuple(config['IMMUTABLE_PREFIXES'])):
+        return f'public, max-age={config["MAX_AGE"]}, immutable'
+    # Otros archivos pueden reemplazarse con el mismo nombre: revalidar
+    return 'public, no-cache'
+
+
+def parse_range(header, size):
+    """
+    ``(inicio, fin)`` inclusive de un Range de un solo intervalo, o None si
+    no aplica (sin cabecera, varios intervalos o unidad desconocida).
+    """
+    match = range_re.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not size:
+        # Un archivo vacío no tiene ningún byte que devolver
+        raise RangeNotSatisfiable()
+    if not start:
+        # bytes=-N: los últimos N bytes
+        length = int(end)
+        if not length:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """Sin If-Range, o con el validador actual: se puede responder el rango"""
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def supports_ranged_sendfile(request):
+    """El ``wsgi.file_wrapper`` de gunicorn respeta Content-Length al usar sendfile"""
+    file_wrapper = request.META.get('wsgi.file_wrapper')
+    return getattr(file_wrapper, '__module__', '').startswith('gunicorn.')
+
+
+def media_response(request, path):
+    """Respuesta para ``MEDIA_ROOT/path`` según ``settings.MEDIA_SERVING``"""
+    config = get_media_serving_config()
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        # Rutas fuera de MEDIA_ROOT incluidas: 404, no 400
+        raise Http404('Archivo no encontrado')
+    if not os.path.isfile(full_path):
+        raise Http404('Archivo no encontrado')
+
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    validators = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': cache_control(path, config),
+    }
+    if is_not_modified(request, etag, last_modified):
+        return with_headers(HttpResponseNotModified(), validators)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if config['BACKEND'] == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = config['ACCEL_PREFIX'] + quote(path)
+        return with_headers(response, validators)
+    if config['BACKEND'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return with_headers(response, validators)
+
+    return file_response(request, full_path, stat.st_size, content_type, validators, etag, last_modified)
+
+
+def file_response(request, full_path, size, content_type, validators, etag, last_modified):
+    """FileResponse completa o de un rango (206)"""
+    try:
+        byte_range = None
+        if request.method == 'GET' and if_range_matches(request, etag, last_modified):
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fh = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(fh, content_type=content_type)
+    else:
+        start, end = byte_range
+        fh.seek(start)
+        range_class = SendfileRange if supports_ranged_sendfile(request) else FileRange
+        response = FileResponse(range_class(fh, end - start + 1), content_type=content_type, status=206)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return with_headers(response, validators)
+
+
+def with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,525 @@
+"""
+Métricas de ejecución en formato de texto de Prometheus.
+
+Cada proceso acumula sus valores (float64) en un archivo mapeado en memoria
+propio, ``metrics_<pid>.db`` dentro de ``settings.METRICS['DIRECTORY']``.
+Solo el proceso dueño escribe en su archivo, así que no hay locks entre
+procesos; dentro del proceso un único lock protege cada actualización
+(unos microsegundos). El endpoint de métricas lee y suma los archivos de
+todos los workers sin tocar la base de datos.
+
+- Los contadores e histogramas de procesos terminados se siguen sumando
+  (no retroceden cuando gunicorn recicla un worker).
+- Los gauges solo cuentan los procesos vivos. Si un proceso nuevo recibe el
+  pid de uno terminado, continúa sus contadores pero sus gauges vuelven a 0.
+- Sin ``DIRECTORY`` los valores viven en memoria anónima y el endpoint
+  solo ve el proceso que atiende la petición.
+
+El directorio debe vaciarse al arrancar el servidor; ``gunicorn.conf.py``
+lo hace en ``on_starting``::
+
+    def on_starting(server):
+        from usuarios.metrics import clear_directory
+        clear_directory()
+
+Formato de un archivo: 8 bytes con los bytes usados y luego entradas
+``[longitud][clave JSON][relleno][valor float64]`` alineadas a 8 bytes. La
+longitud usada se escribe después de la entrada, así un lector nunca ve
+entradas a medias.
+"""
+import bisect
+import glob
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .instrumentation import install, record_queries
+
+
+DEFAULT_METRICS = {
+    # Directorio compartido por los workers; None = solo memoria del proceso
+    'DIRECTORY': None,
+    # IPs que pueden leer el endpoint; None = cualquiera
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+INITIAL_SIZE = 64 * 1024
+USED = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+
+file_name_re = re.compile(r'metrics_(\d+)\.db$')
+
+
+def get_metrics_config():
+    return {**DEFAULT_METRICS, **getattr(settings, 'METRICS', {})}
+
+
+def entry_size(key_length):
+    """Bytes de una entrada: longitud + clave + relleno hasta 8, valor"""
+    return (KEY_LENGTH.size + key_length + 7) // 8 * 8 + VALUE.size
+
+
+def read_entries(data):
+    """[(clave, valor)] de los bytes de un archivo de valores"""
+    if len(data) < USED.size:
+        return []
+    used = min(USED.unpack_from(data, 0)[0], len(data))
+    entries = []
+    position = USED.size
+    while position < used:
+        (length,) = KEY_LENGTH.unpack_from(data, position)
+        key = data[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length]
+        size = entry_size(length)
+        (value,) = VALUE.unpack_from(data, position + size - VALUE.size)
+        entries.append((key.decode('utf-8'), value))
+        position += size
+    return entries
+
+
+def encode_key(key):
+    sample, labels = key
+    return json.dumps([sample, list(labels)], separators=(',', ':'))
+
+
+def decode_key(raw):
+    sample, labels = json.loads(raw)
+    return sample, tuple(labels)
+
+
+class ValueStore:
+    """Valores por clave ``(muestra, etiquetas)`` en un mmap de este proceso"""
+
+    def __init__(self, path=None, reset_samples=()):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        if path is None:
+            self._map = mmap.mmap(-1, INITIAL_SIZE)
+        else:
+            with open(path, 'a+b') as fh:
+                if os.fstat(fh.fileno()).st_size < INITIAL_SIZE:
+                    fh.truncate(INITIAL_SIZE)
+            # El mmap mantiene su propio descriptor
+            with open(path, 'r+b') as fh:
+                self._map = mmap.mmap(fh.fileno(), 0)
+        self._used = USED.unpack_from(self._map, 0)[0]
+        if not self._used:
+            self._used = USED.size
+            USED.pack_into(self._map, 0, self._used)
+        # Archivo de un proceso anterior con el mismo pid: continuar sus
+        # contadores; los gauges (``reset_samples``) eran de ese proceso
+        position = USED.size
+        for raw, _ in read_entries(self._map):
+            size = entry_size(len(raw.encode('utf-8')))
+            key = decode_key(raw)
+            self._positions[key] = position + size - VALUE.size
+            if key[0] in reset_samples:
+                VALUE.pack_into(self._map, self._positions[key], 0.0)
+            position += size
+
+    def _allocate(self, key):
+        raw = encode_key(key).encode('utf-8')
+        size = entry_size(len(raw))
+        if self._used + size > len(self._map):
+            self._grow(max(len(self._map) * 2, self._used + size))
+        KEY_LENGTH.pack_into(self._map, self._used, len(raw))
+        self._map[self._used + KEY_LENGTH.size:self._used + KEY_LENGTH.size + len(raw)] = raw
+        position = self._used + size - VALUE.size
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        USED.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def _grow(self, size):
+        if self.path is not None:
+            self._map.resize(size)
+            return
+        # La memoria anónima no se puede redimensionar en Linux: copiar
+        grown = mmap.mmap(-1, size)
+        grown[:self._used] = self._map[:self._used]
+        self._map.close()
+        self._map = grown
+
+    def add(self, updates):
+        """Sumar ``[(clave, cantidad)]`` bajo un solo lock"""
+        with self._lock:
+            for key, amount in updates:
+                position = self._positions.get(key)
+                if position is None:
+                    position = self._allocate(key)
+                (value,) = VALUE.unpack_from(self._map, position)
+                VALUE.pack_into(self._map, position, value + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._allocate(key)
+            VALUE.pack_into(self._map, position, value)
+
+    def read(self):
+        with self._lock:
+            return read_entries(self._map[:self._used])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Archivo de valores de este proceso (se crea en el primer uso)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                directory = get_metrics_config()['DIRECTORY']
+                path = None
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f'metrics_{os.getpid()}.db')
+                gauges = {metric.name for metric in registry if metric.type == 'gauge'}
+                _store = ValueStore(path, reset_samples=gauges)
+    return _store
+
+
+def reset_store():
+    global _store
+    _store = None
+
+
+# Los workers de gunicorn nacen con fork del master: cada uno necesita su archivo
+os.register_at_fork(after_in_child=reset_store)
+
+
+@receiver(setting_changed)
+def reset_metrics(setting, **kwargs):
+    if setting == 'METRICS':
+        reset_store()
+
+
+def clear_directory():
+    """Eliminar los archivos de una ejecución anterior (al arrancar el servidor)"""
+    directory = get_metrics_config()['DIRECTORY']
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+            os.remove(path)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect_entries():
+    """[(clave, valor, proceso vivo)] de todos los procesos"""
+    directory = get_metrics_config()['DIRECTORY']
+    if not directory:
+        return [(decode_key(raw), value, True) for raw, value in get_store().read()]
+
+    get_store()  # el archivo propio existe aunque aún no tenga valores
+    entries = []
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        match = file_name_re.search(path)
+        if match is None:
+            continue
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            continue
+        alive = pid_alive(int(match.group(1)))
+        entries.extend((decode_key(raw), value, alive) for raw, value in read_entries(data))
+    return entries
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+registry = []
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.append(self)
+
+    def label_values(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        return [self.name]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        get_store().add([((self.name, self.label_values(labels)), amount)])
+
+
+class Gauge(Metric):
+    """Gauge sumado entre los procesos vivos"""
+
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        get_store().add([((self.name, self.label_values(labels)), amount)])
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        get_store().set((self.name, self.label_values(labels)), value)
+
+
+class Histogram(Metric):
+    """Histograma; cada proceso guarda cada bucket sin acumular"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = list(buckets)
+        self.bucket_labels = [format_value(bound) for bound in self.buckets] + ['+Inf']
+
+    def observe(self, value, **labels):
+        values = self.label_values(labels)
+        le = self.bucket_labels[bisect.bisect_left(self.buckets, value)]
+        get_store().add([
+            ((f'{self.name}_bucket', values + (le,)), 1),
+            ((f'{self.name}_sum', values), value),
+            ((f'{self.name}_count', values), 1),
+        ])
+
+    def samples(self):
+        return [f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count']
+
+
+http_requests = Counter(
+    'usuarios_http_requests_total', 'Peticiones atendidas por ruta',
+    ['route', 'method', 'status'],
+)
+http_request_duration = Histogram(
+    'usuarios_http_request_duration_seconds', 'Latencia de las peticiones por ruta',
+    ['route', 'method'], LATENCY_BUCKETS,
+)
+http_request_queries = Histogram(
+    'usuarios_http_request_queries', 'Consultas SQL por petición',
+    ['route', 'method'], QUERY_BUCKETS,
+)
+cache_requests = Counter(
+    'usuarios_cache_requests_total', 'Lecturas de las cachés en memoria',
+    ['cache', 'result'],
+)
+upload_bytes = Counter(
+    'usuarios_upload_bytes_total', 'Bytes de fotos recibidos',
+    ['kind'],
+)
+executor_submitted = Counter(
+    'usuarios_executor_submitted_total', 'Trabajos encolados por pool',
+    ['pool'],
+)
+executor_rejected = Counter(
+    'usuarios_executor_rejected_total', 'Trabajos rechazados por pool saturado',
+    ['pool'],
+)
+executor_pending = Gauge(
+    'usuarios_executor_pending', 'Trabajos en cola o en ejecución por pool',
+    ['pool'],
+)
+executor_workers = Gauge(
+    'usuarios_executor_workers', 'Hilos por pool',
+    ['pool'],
+)
+executor_capacity = Gauge(
+    'usuarios_executor_capacity', 'Trabajos admitidos por pool (WORKERS + MAX_QUEUE)',
+    ['pool'],
+)
+executor_queue_wait = Histogram(
+    'usuarios_executor_queue_wait_seconds', 'Espera en cola antes de ejecutar',
+    ['pool'], WAIT_BUCKETS,
+)
+executor_run_time = Histogram(
+    'usuarios_executor_run_seconds', 'Tiempo de ejecución de los trabajos',
+    ['pool'], LATENCY_BUCKETS,
+)
+compression_responses = Counter(
+    'usuarios_compression_responses_total', 'Respuestas comprimidas por codificación',
+    ['encoding'],
+)
+compression_skipped = Counter(
+    'usuarios_compression_skipped_total', 'Respuestas enviadas sin comprimir por motivo',
+    ['reason'],
+)
+compression_bytes_in = Counter(
+    'usuarios_compression_bytes_in_total', 'Bytes antes de comprimir',
+    ['encoding'],
+)
+compression_bytes_out = Counter(
+    'usuarios_compression_bytes_out_total', 'Bytes comprimidos enviados',
+    ['encoding'],
+)
+compression_cpu_seconds = Counter(
+    'usuarios_compression_cpu_seconds_total', 'CPU usada al comprimir',
+    ['encoding'],
+)
+write_behind_pending = Gauge(
+    'usuarios_write_behind_pending', 'Timestamps en memoria pendientes de escribir',
+)
+write_behind_flushed = Counter(
+    'usuarios_write_behind_flushed_total', 'Timestamps escritos por el buffer write-behind',
+)
+
+
+def aggregate():
+    """Valores sumados entre procesos, por clave"""
+    families = {}
+    for metric in registry:
+        for sample in metric.samples():
+            families[sample] = metric
+
+    totals = {}
+    for key, value, alive in collect_entries():
+        metric = families.get(key[0])
+        if metric is None or (metric.type == 'gauge' and not alive):
+            continue
+        totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def render_histogram(metric, totals):
+    lines = []
+    series = sorted({key[1] for key in totals if key[0] == f'{metric.name}_count'})
+    bucket_names = metric.labelnames + ('le',)
+    for values in series:
+        cumulative = 0.0
+        for le in metric.bucket_labels:
+            cumulative += totals.get((f'{metric.name}_bucket', values + (le,)), 0.0)
+            lines.append(
+                f'{metric.name}_bucket{format_labels(bucket_names, values + (le,))} {format_value(cumulative)}'
+            )
+        labels = format_labels(metric.labelnames, values)
+        lines.append(f'{metric.name}_sum{labels} {format_value(totals[(f"{metric.name}_sum", values)])}')
+        lines.append(f'{metric.name}_count{labels} {format_value(totals[(f"{metric.name}_count", values)])}')
+    return lines
+
+
+def render_cache_hit_ratio(totals):
+    caches = {}
+    for (sample, values), value in totals.items():
+        if sample == cache_requests.name:
+            cache, result = values
+            hits, total = caches.get(cache, (0.0, 0.0))
+            caches[cache] = (hits + (value if result == 'hit' else 0.0), total + value)
+    lines = [
+        '# HELP usuarios_cache_hit_ratio Aciertos / lecturas de cada caché desde el arranque',
+        '# TYPE usuarios_cache_hit_ratio gauge',
+    ]
+    for cache, (hits, total) in sorted(caches.items()):
+        if total:
+            lines.append(f'usuarios_cache_hit_ratio{format_labels(["cache"], [cache])} {format_value(hits / total)}')
+    return lines
+
+
+def render_metrics():
+    """Texto de exposición de Prometheus con los valores de todos los workers"""
+    totals = aggregate()
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        if metric.type == 'histogram':
+            lines.extend(render_histogram(metric, totals))
+            continue
+        for (sample, values), value in sorted(totals.items()):
+            if sample == metric.name:
+                lines.append(f'{metric.name}{format_labels(metric.labelnames, values)} {format_value(value)}')
+    lines.extend(render_cache_hit_ratio(totals))
+    return '\n'.join(lines) + '\n'
+
+
+def route_name(request):
+    """Nombre de la ruta resuelta (no la URL: acota la cardinalidad)"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class MetricsMiddleware:
+    """Cantidad, latencia y consultas SQL de cada petición por ruta"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        install()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with record_queries() as log:
+            response = self.get_response(request)
+        self.record(request, response, log, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with record_queries() as log:
+            response = await self.get_response(request)
+        self.record(request, response, log, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, log, duration):
+        route = route_name(request)
+        method = request.method if request.method in METHODS else 'other'
+        http_requests.inc(route=route, method=method, status=response.status_code)
+        http_request_duration.observe(duration, route=route, method=method)
+        http_request_queries.observe(log.count, route=route, method=method)
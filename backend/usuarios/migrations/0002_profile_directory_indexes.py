@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='profile',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Perfil', 'verbose_name_plural': 'Perfiles'},
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['-created_at', '-id'], name='perfil_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['tipo_usuario', '-created_at', '-id'], name='perfil_tipo_usuario_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['tipo_naturaleza', '-created_at', '-id'], name='perfil_tipo_nat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['esta_verificado', '-created_at', '-id'], name='perfil_verificado_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:20
+
+from django.db import migrations
+
+
+# SQL copiado de usuarios.search al crear la migración: las migraciones no
+# deben depender del código vivo de la app. Los triggers no se crean aquí;
+# los mantienen los receptores pre/post_migrate de usuarios.search.
+CREATE_FTS_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS usuarios_profile_fts USING fts5(
+        username, first_name, last_name, email, telefono,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+POPULATE_FTS_TABLE = """
+    INSERT INTO usuarios_profile_fts (rowid, username, first_name, last_name, email, telefono)
+    SELECT p.id, u.username, u.first_name, u.last_name, u.email, COALESCE(p.telefono, '')
+    FROM usuarios_profile p JOIN auth_user u ON u.id = p.user_id
+"""
+
+DROP_FTS_INDEX = [
+    'DROP TRIGGER IF EXISTS usuarios_profile_fts_user_au',
+    'DROP TRIGGER IF EXISTS usuarios_profile_fts_profile_au',
+    'DROP TRIGGER IF EXISTS usuarios_profile_fts_profile_ad',
+    'DROP TRIGGER IF EXISTS usuarios_profile_fts_profile_ai',
+    'DROP TABLE IF EXISTS usuarios_profile_fts',
+]
+
+
+def create_fts_index(apps, schema_editor):
+    """Crear y poblar el índice FTS5 (solo SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS_TABLE)
+    schema_editor.execute(POPULATE_FTS_TABLE)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_FTS_INDEX:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0002_profile_directory_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_profile_search_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='foto_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Versiones reducidas de la foto de perfil'),
+        ),
+    ]
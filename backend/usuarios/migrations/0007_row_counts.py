@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+# SQL copiado de usuarios.counts al crear la migración: las migraciones no
+# deben depender del código vivo de la app. Los triggers no se crean aquí;
+# los mantienen los receptores pre/post_migrate de usuarios.counts.
+COUNT_ROWS = [
+    "INSERT OR REPLACE INTO usuarios_rowcount (table_name, row_count) "
+    "SELECT 'auth_user', count(*) FROM auth_user",
+    "INSERT OR REPLACE INTO usuarios_rowcount (table_name, row_count) "
+    "SELECT 'usuarios_profile', count(*) FROM usuarios_profile",
+]
+
+DROP_COUNT_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS usuarios_rowcount_auth_user_ai',
+    'DROP TRIGGER IF EXISTS usuarios_rowcount_auth_user_ad',
+    'DROP TRIGGER IF EXISTS usuarios_rowcount_usuarios_profile_ai',
+    'DROP TRIGGER IF EXISTS usuarios_rowcount_usuarios_profile_ad',
+]
+
+
+def create_row_counts(apps, schema_editor):
+    """Contar las filas actuales (solo SQLite)"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in COUNT_ROWS:
+        schema_editor.execute(sql)
+
+
+def drop_row_counts(apps, schema_editor):
+    """Los triggers escriben en usuarios_rowcount: eliminarlos antes que la tabla"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_COUNT_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_revoked_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowCount',
+            fields=[
+                ('table_name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('row_count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Conteo de filas',
+                'verbose_name_plural': 'Conteos de filas',
+            },
+        ),
+        migrations.RunPython(create_row_counts, drop_row_counts),
+    ]
@@ -2,7 +2,9 @@
 Modelos para la gestión de usuarios y perfiles.
 """
 from django.contrib.auth.models import User
+from django.core.files import File
 from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.core.validators import URLValidator
 import uuid
 import os
@@ -82,6 +84,14 @@ class Profile(models.Model):
         help_text='Foto de perfil del usuario'
     )
     
+    # Derivados generados en segundo plano: {"64": {"webp": "perfiles/...", ...}}
+    foto_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Versiones reducidas de la foto de perfil'
+    )
+    
     # Enlaces sociales y web
     linkedin = models.URLField(
         blank=True, 
@@ -120,7 +130,15 @@ class Profile(models.Model):
     class Meta:
         verbose_name = 'Perfil'
         verbose_name_plural = 'Perfiles'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Orden por defecto y paginación keyset del directorio
+            models.Index(fields=['-created_at', '-id'], name='perfil_created_idx'),
+            # Filtros del directorio combinados con el orden
+            models.Index(fields=['tipo_usuario', '-created_at', '-id'], name='perfil_tipo_usuario_idx'),
+            models.Index(fields=['tipo_naturaleza', '-created_at', '-id'], name='perfil_tipo_nat_idx'),
+            models.Index(fields=['esta_verificado', '-created_at', '-id'], name='perfil_verificado_idx'),
+        ]
     
     def __str__(self):
         return f'Perfil de {self.user.get_full_name() or self.user.username}'
@@ -137,8 +155,54 @@ class Profile(models.Model):
             return self.foto.url
         return None
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guardar los valores cargados para detectar campos modificados"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._current_values()
+        return instance
+    
+    def _current_values(self, fields=None):
+        """Valores actuales de los campos cargados en la instancia"""
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue  # Campo diferido sin tocar
+            if fields is not None and field.name not in fields and field.attname not in fields:
+                continue
+            value = self.__dict__[field.attname]
+            if isinstance(value, FieldFile) and value._committed:
+                value = value.name
+            values[field.attname] = value
+        return values
+    
+    def get_dirty_fields(self):
+        """
+        Retorna los nombres de los campos modificados desde la carga,
+        o None si la instancia no viene de la base de datos.
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        dirty = []
+        for attname, value in self._current_values().items():
+            if attname == self._meta.pk.attname:
+                continue
+            # Archivos recién asignados siempre cuentan como modificados
+            if isinstance(value, File) or attname not in loaded or loaded[attname] != value:
+                dirty.append(attname)
+        return dirty
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if hasattr(self, '_loaded_values'):
+            self._loaded_values.update(self._current_values(fields))
+    
     def save(self, *args, **kwargs):
-        """Override save para limpiar URLs vacías"""
+        """
+        Override save para limpiar URLs vacías y escribir solo los campos
+        modificados. Si nada cambió no se emite ningún UPDATE.
+        """
         # Limpiar campos URL vacíos
         if self.linkedin == '':
             self.linkedin = None
@@ -148,14 +212,99 @@ class Profile(models.Model):
             self.github = None
         if self.sitio_web == '':
             self.sitio_web = None
+        
+        if kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                kwargs['update_fields'] = dirty + ['updated_at']
             
         super().save(*args, **kwargs)
+        
+        if kwargs.get('update_fields') is None:
+            self._loaded_values = self._current_values()
+        elif hasattr(self, '_loaded_values'):
+            self._loaded_values.update(self._current_values(kwargs['update_fields']))
+
+
+class PhotoUploadSession(models.Model):
+    """
+    Subida reanudable de foto de perfil en curso.
+    Los bytes recibidos viven en un archivo temporal; su tamaño es el offset.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='photo_uploads'
+    )
+    
+    size = models.PositiveIntegerField(help_text='Tamaño total declarado en bytes')
+    
+    content_type = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='Tipo detectado por magic bytes en el primer bloque'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Subida de foto'
+        verbose_name_plural = 'Subidas de fotos'
+    
+    def __str__(self):
+        return f'Subida {self.pk} de {self.user_id}'
+
+
+class RevokedToken(models.Model):
+    """
+    ``jti`` de un refresh token revocado (rotado).
+    Solo interesa hasta que el token expira; ver ``usuarios.revocation``.
+    """
+    jti = models.CharField(max_length=64, primary_key=True)
+    
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text='Expiración del token; después se puede eliminar'
+    )
+    
+    class Meta:
+        verbose_name = 'Token revocado'
+        verbose_name_plural = 'Tokens revocados'
+    
+    def __str__(self):
+        return self.jti
+
+
+class RowCount(models.Model):
+    """
+    Cantidad de filas de una tabla grande, mantenida por triggers.
+    Evita COUNT(*) en la paginación del admin; ver ``usuarios.counts``.
+    """
+    table_name = models.CharField(max_length=64, primary_key=True)
+    
+    row_count = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Conteo de filas'
+        verbose_name_plural = 'Conteos de filas'
+    
+    def __str__(self):
+        return f'{self.table_name}: {self.row_count}'
 
 
 # Signal para crear perfil automáticamente
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from .cache import invalidate_profile, invalidate_user_snapshot
+
+PROFILE_RELATION = Profile._meta.get_field('user').remote_field
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Crear perfil automáticamente cuando se crea un usuario"""
@@ -164,6 +313,24 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    """Guardar perfil cuando se guarda el usuario"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+    """
+    Guardar perfil cuando se guarda el usuario.
+    Solo si el perfil ya está cargado: si no, no puede tener cambios pendientes.
+    """
+    profile = PROFILE_RELATION.get_cached_value(instance, default=None)
+    if profile is not None:
+        profile.save()
+    transaction.on_commit(lambda: invalidate_profile(instance.pk))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Invalidar las instantáneas de autenticación del usuario"""
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.pk))
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Invalidar el perfil cacheado cuando cambia el perfil"""
+    transaction.on_commit(lambda: invalidate_profile(instance.user_id))
+    transaction.on_commit(lambda: invalidate_user_snapshot(instance.user_id))
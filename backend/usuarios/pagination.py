@@ -0,0 +1,165 @@
+"""
+Paginación por cursor (keyset) para listados de perfiles y paginator sin
+COUNT(*) para el admin.
+"""
+from base64 import b64decode, b64encode
+from datetime import datetime
+from urllib import parse
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counts import get_row_count
+
+
+class ProfileKeysetPagination(BasePagination):
+    """
+    Paginación keyset sobre ``(created_at, id)`` en orden descendente.
+
+    Cada página filtra por la posición del último registro visto en lugar de
+    usar OFFSET, y no ejecuta COUNT(*): el costo de una página es el mismo
+    en la página 1 que en la 10.000 siempre que exista el índice compuesto.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Cursor inválido'
+    # Columnas que deben estar en las filas si se pagina un queryset de values()
+    position_fields = ['created_at', 'id']
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+            if position is not None:
+                created_at, pk = position
+                queryset = queryset.filter(created_at__gte=created_at).filter(
+                    Q(created_at__gt=created_at) | Q(id__gt=pk)
+                )
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+            if position is not None:
+                created_at, pk = position
+                # created_at <= c permite usar el índice como rango; el OR solo
+                # se evalúa sobre los empates
+                queryset = queryset.filter(created_at__lte=created_at).filter(
+                    Q(created_at__lt=created_at) | Q(id__lt=pk)
+                )
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        """Retorna ((created_at, id) o None, reverse)"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            created_at = datetime.fromisoformat(tokens['p'][0])
+            pk = int(tokens['i'][0])
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at.tzinfo is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), reverse
+
+    def get_position(self, item):
+        """(created_at, id) de una instancia o de una fila de ``values()``"""
+        if isinstance(item, dict):
+            return item['created_at'], item['id']
+        return item.created_at, item.pk
+
+    def encode_cursor(self, item, reverse):
+        created_at, pk = self.get_position(item)
+        tokens = {'p': created_at.isoformat(), 'i': pk}
+        if reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator del admin con un costo de conteo constante.
+
+    - Sin filtros ni búsqueda: el contador de ``usuarios.counts``.
+    - Con filtros: COUNT acotado a ``max_count`` filas; si hay más, las
+      páginas siguientes no se enlazan (se llega a ellas con ``?p=``).
+    """
+    max_count = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if not queryset.query.where:
+            rows = get_row_count(queryset.model)
+            if rows is not None:
+                return rows
+        return queryset.order_by()[:self.max_count].count()
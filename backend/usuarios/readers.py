@@ -0,0 +1,152 @@
+"""
+Lectura rápida de perfiles: de una fila de ``values()`` a un dict.
+
+``ProfileSerializer.to_representation`` recorre los campos de DRF uno por uno
+(get_attribute, comprobación de None, to_representation) para cada perfil.
+Para los listados de solo lectura se compila una vez, por selección de
+campos, una función plana que arma el dict directamente desde la fila.
+Produce el mismo resultado que el serializer; un campo que no se sepa
+convertir falla al compilar y no en silencio.
+
+Uso::
+
+    reader = get_profile_reader(ProfileDirectorySerializer, selection)
+    rows = queryset.values(*reader.columns)
+    data = [reader(row) for row in rows]
+
+``values(*reader.columns)`` ya pide solo las columnas de la selección (y une
+``auth_user`` solo si se piden campos del usuario), así que los listados no
+recortan el queryset con ``only()``/``defer()``.
+"""
+from functools import lru_cache
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .images import variant_urls
+from .models import Profile
+
+
+FOTO_STORAGE = Profile._meta.get_field('foto').storage
+
+
+def datetime_representation(value):
+    """Igual que ``serializers.DateTimeField`` con el formato ISO 8601"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def file_url(name):
+    """Igual que ``serializers.ImageField`` sin request (URL relativa)"""
+    return FOTO_STORAGE.url(name) if name else None
+
+
+def foto_variants_representation(name, variants):
+    """Igual que ``ProfileSerializer.get_foto_variants`` sin request"""
+    return variant_urls(variants) if name else {}
+
+
+# Campos calculados: (expresión, columnas que necesita)
+METHOD_FIELDS = {
+    'foto_url': ("_file_url(row['foto'])", ['foto']),
+    'foto_variants': ("_variants(row['foto'], row['foto_variants'])", ['foto', 'foto_variants']),
+}
+
+# Funciones disponibles para el código generado
+NAMESPACE = {
+    '_datetime': datetime_representation,
+    '_file_url': file_url,
+    '_variants': foto_variants_representation,
+}
+
+
+def field_expression(field, column):
+    """Expresión Python que representa ``field`` leyendo ``row[column]``"""
+    value = f'row[{column!r}]'
+    if field.source != field.field_name:
+        raise TypeError(f'{field.field_name}: source distinto del nombre no soportado')
+    if isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if not isinstance(output_format, str) or output_format.lower() != ISO_8601:
+            raise TypeError(f'{field.field_name}: formato de fecha no soportado')
+        if hasattr(field, 'timezone'):
+            raise TypeError(f'{field.field_name}: zona horaria propia no soportada')
+        return f'_datetime({value})'
+    if isinstance(field, serializers.ImageField):
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            raise TypeError(f'{field.field_name}: solo se soporta use_url')
+        return f'_file_url({value})'
+    if isinstance(field, serializers.ChoiceField):
+        # choice_strings_to_values es la identidad para choices de texto
+        return value
+    if isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField)):
+        # Los valores ya vienen con el tipo de Python de la columna
+        return value
+    raise TypeError(f'{field.field_name}: {type(field).__name__} no soportado')
+
+
+def compile_reader(name, items):
+    """Generar ``def read(row): return {...}`` a partir de (clave, expresión)"""
+    body = ',\n'.join(f'        {key!r}: {expression}' for key, expression in items)
+    source = f'def {name}(row):\n    return {{\n{body}\n    }}\n'
+    namespace = dict(NAMESPACE)
+    exec(compile(source, f'<reader {name}>', 'exec'), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+def build_profile_reader(serializer_class, fields, expand_user):
+    serializer = serializer_class()
+    items = []
+    columns = []
+
+    def need(*names):
+        for column in names:
+            if column not in columns:
+                columns.append(column)
+
+    for name in fields:
+        field = serializer.fields[name]
+        if name == 'user':
+            if not expand_user:
+                need('user_id')
+                items.append((name, "row['user_id']"))
+                continue
+            user_items = []
+            for user_name, user_field in field.fields.items():
+                column = f'user__{user_name}'
+                need(column)
+                user_items.append(f'{user_name!r}: {field_expression(user_field, column)}')
+            items.append((name, '{' + ', '.join(user_items) + '}'))
+        elif name in METHOD_FIELDS:
+            expression, needed = METHOD_FIELDS[name]
+            need(*needed)
+            items.append((name, expression))
+        elif isinstance(field, serializers.SerializerMethodField):
+            raise TypeError(f'{name}: SerializerMethodField sin lector')
+        else:
+            need(name)
+            items.append((name, field_expression(field, name)))
+
+    reader = compile_reader(f'read_{serializer_class.__name__}', items)
+    # Columnas de values() que necesita el lector
+    reader.columns = columns
+    return reader
+
+
+@lru_cache(maxsize=256)
+def _get_profile_reader(serializer_class, fields, expand_user):
+    return build_profile_reader(serializer_class, fields, expand_user)
+
+
+def get_profile_reader(serializer_class, selection):
+    """Lector compilado (y cacheado) para una selección de campos"""
+    return _get_profile_reader(serializer_class, selection.fields, selection.expand_user)
@@ -0,0 +1,51 @@
+"""
+Renderer JSON rápido basado en orjson (opcional).
+
+Produce los mismos bytes que ``rest_framework.renderers.JSONRenderer`` con la
+configuración del proyecto (UNICODE_JSON, COMPACT_JSON, STRICT_JSON): los
+tipos que orjson no formatea igual (fechas, decimales, lazy strings) pasan
+por el encoder de DRF. Diferencias conocidas, ausentes en los payloads de
+esta API: floats en notación exponencial y NaN (null en lugar de error).
+Si orjson no está instalado, o la petición pide indentación, se usa el
+renderer de DRF tal cual.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import phase
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer que delega en orjson cuando es posible"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('render'):
+            return self.render_json(data, accepted_media_type, renderer_context)
+
+    def render_json(self, data, accepted_media_type, renderer_context):
+        if orjson is None or not self.can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        try:
+            # Las fechas pasan por el encoder de DRF ('Z' en lugar de '+00:00')
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except (TypeError, orjson.JSONEncodeError):
+            # Claves o valores que orjson no admite: mismo resultado (o error) que DRF
+            return super().render(data, accepted_media_type, renderer_context)
+        # Igual que DRF: U+2028/U+2029 escapados para poder incrustar en <script>
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        """orjson solo produce la salida compacta UTF-8 sin indentación"""
+        if not (api_settings.COMPACT_JSON and api_settings.UNICODE_JSON and api_settings.STRICT_JSON):
+            return False
+        if self.encoder_class is not JSONEncoder:
+            return False
+        return self.get_indent(accepted_media_type or '', renderer_context or {}) is None
@@ -0,0 +1,178 @@
+"""
+Revocación de refresh tokens (ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION).
+
+Cada refresh rota el token: el ``jti`` anterior se inserta en la tabla
+``RevokedToken`` con la expiración del token. La tabla solo guarda tokens
+que todavía podrían ser válidos; pasado ``REFRESH_TOKEN_LIFETIME`` la firma
+ya los rechaza y las filas se eliminan por rango sobre ``expires_at``.
+
+Delante de la tabla hay un filtro de Bloom en memoria: la comprobación
+"no revocado" (el caso común) se responde sin tocar disco y solo los
+posibles positivos se confirman en la base de datos. El filtro de cada
+proceso solo conoce sus propias revocaciones y las que había al cargarlo,
+pero la rotación no depende de él: el INSERT por clave primaria del ``jti``
+falla si otro proceso ya lo revocó.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import IntegrityError, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken
+
+
+DEFAULT_TOKEN_REVOCATION = {
+    'CAPACITY': 100000,  # revocaciones vivas esperadas
+    'ERROR_RATE': 0.001,  # falsos positivos (consultas innecesarias a la BD)
+    'PRUNE_INTERVAL': timedelta(hours=1),
+}
+
+
+class TokenRevoked(Exception):
+    """El refresh token ya fue usado (rotado) o revocado"""
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un bytearray; hashes derivados de blake2b"""
+
+    def __init__(self, capacity, error_rate):
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(bits, 8)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        # Doble hashing (Kirsch-Mitzenmacher): h1 + i*h2
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationStore:
+    """Tabla de ``jti`` revocados con un filtro de Bloom por proceso"""
+
+    def __init__(self, capacity=100000, error_rate=0.001, prune_interval=timedelta(hours=1)):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.prune_interval = prune_interval.total_seconds()
+        self._bloom = None
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def _load(self):
+        """Construir el filtro con las revocaciones vigentes de la tabla"""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        jtis = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', flat=True)
+        for jti in jtis.iterator(chunk_size=2000):
+            bloom.add(jti)
+        return bloom
+
+    def get_bloom(self):
+        with self._lock:
+            if self._bloom is None:
+                self._bloom = self._load()
+            return self._bloom
+
+    def is_revoked(self, jti):
+        """Comprobar si un ``jti`` está revocado; sin consulta si el filtro lo descarta"""
+        if jti not in self.get_bloom():
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        """
+        Revocar un ``jti``. Lanza TokenRevoked si ya estaba revocado, de modo
+        que dos refresh concurrentes con el mismo token no pueden rotar ambos.
+        """
+        if self.is_revoked(jti):
+            raise TokenRevoked(jti)
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            raise TokenRevoked(jti)
+        bloom = self.get_bloom()
+        with self._lock:
+            bloom.add(jti)
+        self.prune_if_due()
+
+    def prune_if_due(self):
+        if time.monotonic() - self._pruned_at >= self.prune_interval:
+            self.prune()
+
+    def prune(self):
+        """Eliminar las revocaciones de tokens ya expirados y reconstruir el filtro"""
+        self._pruned_at = time.monotonic()
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        bloom = self._load()
+        with self._lock:
+            self._bloom = bloom
+        return deleted
+
+
+_store = None
+
+
+def get_revocation_store():
+    """Retornar el almacén configurado en ``settings.TOKEN_REVOCATION``"""
+    global _store
+    if _store is None:
+        config = {**DEFAULT_TOKEN_REVOCATION, **getattr(settings, 'TOKEN_REVOCATION', {})}
+        _store = RevocationStore(
+            capacity=config['CAPACITY'],
+            error_rate=config['ERROR_RATE'],
+            prune_interval=config['PRUNE_INTERVAL'],
+        )
+    return _store
+
+
+def token_expiration(token):
+    """Fecha de expiración (``exp``) de un token de simplejwt"""
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+def rotate_refresh_token(raw_token):
+    """
+    Validar un refresh token y rotarlo según SIMPLE_JWT.
+    Retorna el RefreshToken nuevo (o el mismo si no hay rotación).
+    Lanza TokenError si es inválido/expirado y TokenRevoked si ya se usó.
+    """
+    refresh = RefreshToken(raw_token)
+    jti = refresh[api_settings.JTI_CLAIM]
+    store = get_revocation_store()
+
+    if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+        # El INSERT del jti es la comprobación: falla si ya estaba revocado
+        store.revoke(jti, token_expiration(refresh))
+    elif store.is_revoked(jti):
+        raise TokenRevoked(jti)
+
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+    return refresh
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'TOKEN_REVOCATION':
+        _store = None
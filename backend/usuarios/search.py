@@ -0,0 +1,202 @@
+"""
+Búsqueda de perfiles con un índice FTS5 de SQLite.
+
+La tabla virtual ``usuarios_profile_fts`` (una fila por perfil, ``rowid`` =
+``Profile.id``) se crea en la migración 0003 y se mantiene sincronizada con
+``auth_user`` y ``usuarios_profile`` mediante triggers, de modo que también
+cubre las escrituras que no disparan señales (``bulk_create``,
+``QuerySet.update``).
+
+SQLite elimina los triggers de una tabla al reconstruirla (AddField,
+AlterField) y no puede renombrar la tabla temporal mientras otro trigger la
+referencia. Por eso las migraciones no crean los triggers: ``suspend_index``
+(``pre_migrate``) los elimina antes de aplicar migraciones y
+``restore_index`` (``post_migrate``) los recrea y reindexa. El check
+``usuarios.W001`` avisa si faltan.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'usuarios_profile_fts'
+
+FTS_COLUMNS = ['username', 'first_name', 'last_name', 'email', 'telefono']
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        username, first_name, last_name, email, telefono,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_profile_ai AFTER INSERT ON usuarios_profile BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, username, first_name, last_name, email, telefono)
+        SELECT NEW.id, u.username, u.first_name, u.last_name, u.email, COALESCE(NEW.telefono, '')
+        FROM auth_user u WHERE u.id = NEW.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_profile_ad AFTER DELETE ON usuarios_profile BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_profile_au
+    AFTER UPDATE OF telefono, user_id ON usuarios_profile BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+        INSERT INTO {FTS_TABLE} (rowid, username, first_name, last_name, email, telefono)
+        SELECT NEW.id, u.username, u.first_name, u.last_name, u.email, COALESCE(NEW.telefono, '')
+        FROM auth_user u WHERE u.id = NEW.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_user_au
+    AFTER UPDATE OF username, first_name, last_name, email ON auth_user BEGIN
+        DELETE FROM {FTS_TABLE}
+        WHERE rowid IN (SELECT id FROM usuarios_profile WHERE user_id = NEW.id);
+        INSERT INTO {FTS_TABLE} (rowid, username, first_name, last_name, email, telefono)
+        SELECT p.id, NEW.username, NEW.first_name, NEW.last_name, NEW.email, COALESCE(p.telefono, '')
+        FROM usuarios_profile p WHERE p.user_id = NEW.id;
+    END
+    """,
+]
+
+TRIGGER_NAMES = [
+    f'{FTS_TABLE}_profile_ai',
+    f'{FTS_TABLE}_profile_ad',
+    f'{FTS_TABLE}_profile_au',
+    f'{FTS_TABLE}_user_au',
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_user_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_profile_au',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_profile_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_profile_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POPULATE_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, username, first_name, last_name, email, telefono)
+    SELECT p.id, u.username, u.first_name, u.last_name, u.email, COALESCE(p.telefono, '')
+    FROM usuarios_profile p JOIN auth_user u ON u.id = p.user_id
+"""
+
+# Máximo de resultados del endpoint de búsqueda
+MAX_SEARCH_RESULTS = 100
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available(using=connection):
+    """Indica si la base de datos tiene el índice FTS5 de perfiles"""
+    if using.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in using.introspection.table_names()
+
+
+def build_match_query(term):
+    """
+    Convertir un término libre en una consulta MATCH segura:
+    cada palabra se cita y se busca por prefijo (``"carl"* "mor"*``).
+    """
+    tokens = _TOKEN_RE.findall(term or '')
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def matching_profile_ids(match):
+    """Subconsulta con los ids de perfil que coinciden (para ``id__in``)"""
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+
+
+def matching_user_ids(match):
+    """Subconsulta con los ids de usuario cuyos perfiles coinciden"""
+    return RawSQL(
+        f'SELECT p.user_id FROM usuarios_profile p '
+        f'JOIN {FTS_TABLE} f ON f.rowid = p.id WHERE {FTS_TABLE} MATCH %s',
+        [match]
+    )
+
+
+def ranked_profile_ids(term, limit=20):
+    """Ids de perfil ordenados por relevancia (bm25)"""
+    match = build_match_query(term)
+    if not match:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_index(using=connection):
+    """Crear la tabla FTS5 y sus triggers"""
+    with using.cursor() as cursor:
+        for sql in CREATE_SQL:
+            cursor.execute(sql)
+
+
+def drop_index(using=connection):
+    """Eliminar la tabla FTS5 y sus triggers"""
+    with using.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def drop_triggers(using=connection):
+    """Eliminar solo los triggers (la tabla FTS5 conserva su contenido)"""
+    with using.cursor() as cursor:
+        for sql in DROP_SQL[:-1]:
+            cursor.execute(sql)
+
+
+def missing_triggers(using=connection):
+    """Nombres de los triggers del índice que no existen en la base de datos"""
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN (%s, %s)",
+            ['usuarios_profile', 'auth_user']
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGER_NAMES if name not in existing]
+
+
+def suspend_index(sender, using=DEFAULT_DB_ALIAS, plan=None, **kwargs):
+    """Receptor de ``pre_migrate``: eliminar los triggers si hay migraciones por aplicar"""
+    using = connections[using]
+    if plan and using.vendor == 'sqlite':
+        drop_triggers(using)
+
+
+def restore_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Receptor de ``post_migrate``: recrear los triggers que falten y reindexar,
+    porque las escrituras hechas sin triggers no llegaron al índice.
+    """
+    using = connections[using]
+    if fts_available(using) and missing_triggers(using):
+        create_index(using)
+        rebuild_index(using)
+
+
+def index_profiles_after(profile_id, using=connection):
+    """Indexar los perfiles con id mayor que ``profile_id`` (cargas con triggers suspendidos)"""
+    with using.cursor() as cursor:
+        cursor.execute(POPULATE_SQL + ' WHERE p.id > %s', [profile_id])
+        return cursor.rowcount
+
+
+def rebuild_index(using=connection):
+    """Reconstruir el contenido del índice desde auth_user/usuarios_profile"""
+    with using.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(POPULATE_SQL)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
@@ -0,0 +1,213 @@
+"""
+Generación de usuarios y perfiles sintéticos para pruebas de volumen.
+
+- La contraseña se hashea una sola vez y el hash se reutiliza en todas las
+  filas (el hash PBKDF2 por fila dominaría el tiempo total).
+- Las filas se insertan con ``bulk_create`` por bloques dentro de una sola
+  transacción, sin señales ``post_save`` (el perfil se crea explícitamente).
+- En SQLite los triggers del índice FTS5 y de los contadores de filas se
+  suspenden durante la carga; los perfiles nuevos se indexan con una sola
+  consulta y los contadores se ajustan al final.
+
+Las distribuciones (tipo de usuario, naturaleza, bios, URLs, fotos) se
+configuran con un diccionario; ver ``DEFAULT_DISTRIBUTIONS``.
+"""
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from . import counts, search
+from .models import Profile
+
+
+DEFAULT_DISTRIBUTIONS = {
+    # Pesos relativos de cada opción
+    'tipo_usuario': {'estudiante': 80, 'instructor': 18, 'admin': 2},
+    'tipo_naturaleza': {'natural': 92, 'juridica': 8},
+    # Probabilidad de que el campo tenga valor
+    'biografia': 0.6,
+    'linkedin': 0.45,
+    'twitter': 0.25,
+    'github': 0.3,
+    'sitio_web': 0.1,
+    'foto': 0.35,
+    'telefono': 0.8,
+    'documento': 0.9,
+    'esta_verificado': 0.2,
+    # date_joined repartido en los últimos N días
+    'joined_days': 730,
+}
+
+FIRST_NAMES = [
+    'Carlos', 'Andrés', 'Juan', 'Luis', 'Jorge', 'Diego', 'Santiago', 'Mateo', 'Sebastián', 'Felipe',
+    'Camilo', 'Alejandro', 'Daniel', 'David', 'Miguel', 'Nicolás', 'Julián', 'Óscar', 'Ricardo', 'Esteban',
+    'María', 'Laura', 'Ana', 'Valentina', 'Daniela', 'Camila', 'Sofía', 'Paula', 'Natalia', 'Gabriela',
+    'Juliana', 'Carolina', 'Andrea', 'Catalina', 'Isabella', 'Luisa', 'Manuela', 'Mariana', 'Diana', 'Lucía',
+]
+
+LAST_NAMES = [
+    'García', 'Rodríguez', 'Martínez', 'López', 'González', 'Hernández', 'Pérez', 'Sánchez', 'Ramírez', 'Torres',
+    'Moreno', 'Gómez', 'Díaz', 'Vargas', 'Rojas', 'Castro', 'Jiménez', 'Ruiz', 'Álvarez', 'Romero',
+    'Suárez', 'Ortiz', 'Muñoz', 'Restrepo', 'Ospina', 'Cárdenas', 'Mejía', 'Quintero', 'Zapata', 'Herrera',
+]
+
+BIO_ROLES = [
+    'Desarrollador frontend', 'Desarrolladora backend', 'Ingeniero de datos', 'Diseñadora UX',
+    'Estudiante de ingeniería de sistemas', 'Instructor de programación', 'Analista de software',
+    'Arquitecta de soluciones', 'Administrador de bases de datos', 'Científica de datos',
+]
+
+BIO_TOPICS = [
+    'React', 'Django', 'Python', 'Node.js', 'TypeScript', 'SQL', 'Docker', 'Kubernetes', 'AWS',
+    'machine learning', 'accesibilidad web', 'APIs REST', 'pruebas automatizadas', 'diseño de interfaces',
+]
+
+BIO_CLOSINGS = [
+    'Me gusta compartir lo que aprendo.',
+    'Actualmente aprendiendo sobre arquitectura de software.',
+    'Mentor en comunidades de programación.',
+    'Apasionado por el código limpio y las buenas prácticas.',
+    'Buscando nuevos retos profesionales.',
+    '',
+]
+
+EMAIL_DOMAINS = ['example.com', 'example.org', 'correo.example.co', 'mail.example.net']
+
+
+@dataclass
+class SeedResult:
+    created: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def slug(value):
+    """Texto ASCII en minúsculas para usernames y URLs"""
+    replacements = str.maketrans('áéíóúñÁÉÍÓÚÑ', 'aeiounAEIOUN')
+    return value.translate(replacements).lower()
+
+
+class ProfileGenerator:
+    """Genera pares (User, Profile) sin guardar según las distribuciones"""
+
+    def __init__(self, distributions=None, password_hash='', prefix='seed', seed=None):
+        self.config = {**DEFAULT_DISTRIBUTIONS, **(distributions or {})}
+        self.password_hash = password_hash
+        self.prefix = prefix
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.tipos_usuario = list(self.config['tipo_usuario'])
+        self.tipos_usuario_weights = list(self.config['tipo_usuario'].values())
+        self.tipos_naturaleza = list(self.config['tipo_naturaleza'])
+        self.tipos_naturaleza_weights = list(self.config['tipo_naturaleza'].values())
+
+    def chance(self, name):
+        return self.random.random() < self.config[name]
+
+    def biografia(self):
+        rnd = self.random
+        topics = ', '.join(rnd.sample(BIO_TOPICS, rnd.randint(1, 4)))
+        bio = f'{rnd.choice(BIO_ROLES)} con {rnd.randint(1, 15)} años de experiencia en {topics}. {rnd.choice(BIO_CLOSINGS)}'
+        return bio.strip()[:500]
+
+    def build(self, index):
+        rnd = self.random
+        first_name = rnd.choice(FIRST_NAMES)
+        last_name = f'{rnd.choice(LAST_NAMES)} {rnd.choice(LAST_NAMES)}'
+        handle = f'{slug(first_name)}.{slug(last_name.split()[0])}{index}'
+        user = User(
+            username=f'{self.prefix}{index}',
+            password=self.password_hash,
+            email=f'{handle}@{rnd.choice(EMAIL_DOMAINS)}',
+            first_name=first_name,
+            last_name=last_name,
+            date_joined=self.now - timedelta(seconds=rnd.randrange(self.config['joined_days'] * 86400 + 1)),
+        )
+        profile = Profile(
+            telefono=f'3{rnd.randrange(10 ** 9):09d}' if self.chance('telefono') else None,
+            documento=str(rnd.randrange(10 ** 7, 10 ** 10)) if self.chance('documento') else None,
+            tipo_usuario=rnd.choices(self.tipos_usuario, self.tipos_usuario_weights)[0],
+            tipo_naturaleza=rnd.choices(self.tipos_naturaleza, self.tipos_naturaleza_weights)[0],
+            biografia=self.biografia() if self.chance('biografia') else None,
+            linkedin=f'https://www.linkedin.com/in/{handle.replace(".", "-")}/' if self.chance('linkedin') else None,
+            twitter=f'https://twitter.com/{handle.replace(".", "_")}' if self.chance('twitter') else None,
+            github=f'https://github.com/{handle.replace(".", "-")}' if self.chance('github') else None,
+            sitio_web=f'https://{handle.replace(".", "")}.example.dev' if self.chance('sitio_web') else None,
+            # Solo la referencia: el archivo no se crea
+            foto=f'perfiles/seed/{index}.jpg' if self.chance('foto') else None,
+            esta_verificado=self.chance('esta_verificado'),
+        )
+        return user, profile
+
+
+def insert_chunk(pairs):
+    """bulk_create de usuarios y perfiles (no dispara post_save)"""
+    users = User.objects.bulk_create([user for user, _ in pairs])
+    profiles = []
+    for user, (_, profile) in zip(users, pairs):
+        profile.user = user
+        profiles.append(profile)
+    Profile.objects.bulk_create(profiles)
+
+
+def next_index(prefix):
+    """
+    Primer sufijo libre para ``prefix``: el mayor sufijo numérico existente
+    más uno. Contar los usernames no sirve si se borró alguno (el siguiente
+    lote repetiría un username existente).
+    """
+    last = (
+        User.objects
+        .filter(username__startswith=prefix, username__regex=rf'^{re.escape(prefix)}[0-9]+$')
+        .aggregate(last=Max(Cast(Substr('username', len(prefix) + 1), IntegerField())))['last']
+    )
+    return 0 if last is None else last + 1
+
+
+def seed_profiles(count, password, distributions=None, prefix='seed', chunk_size=5000, seed=None, progress=None):
+    """
+    Crear ``count`` usuarios con perfil en una transacción.
+    ``progress(created, elapsed)`` se llama después de cada bloque.
+    """
+    result = SeedResult()
+    started = time.perf_counter()
+    generator = ProfileGenerator(distributions, make_password(password), prefix, seed)
+    start = next_index(prefix)
+    use_fts = connection.vendor == 'sqlite' and search.fts_available()
+    use_counts = counts.get_row_count(Profile) is not None
+
+    with transaction.atomic():
+        if use_fts:
+            # Un trigger por fila es más lento que indexar todo con un INSERT ... SELECT
+            last_id = Profile.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            search.drop_triggers()
+        if use_counts:
+            counts.drop_triggers()
+        for offset in range(0, count, chunk_size):
+            size = min(chunk_size, count - offset)
+            insert_chunk([generator.build(start + offset + i) for i in range(size)])
+            result.created += size
+            if progress:
+                progress(result.created, time.perf_counter() - started)
+        if use_fts:
+            search.index_profiles_after(last_id)
+            search.create_index()
+        if use_counts:
+            for table in counts.COUNTED_TABLES:
+                counts.add_rows(table, result.created)
+            counts.create_triggers()
+
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -1,9 +1,15 @@
 """
 Serializers para la API de usuarios y perfiles.
 """
+from functools import lru_cache
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .batch import MAX_BATCH_REQUESTS
+from .images import variant_urls
+from .instrumentation import phase
 from .models import Profile
+from .uploads import ALLOWED_PHOTO_TYPES, MAX_PHOTO_SIZE
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,6 +26,7 @@ class ProfileSerializer(serializers.ModelSerializer):
     
     user = UserSerializer(read_only=True)
     foto_url = serializers.SerializerMethodField()
+    foto_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Profile
@@ -33,6 +40,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'biografia',
             'foto',
             'foto_url',
+            'foto_variants',
             'linkedin',
             'twitter',
             'github',
@@ -41,7 +49,7 @@ class ProfileSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'foto_url']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'foto_url', 'foto_variants']
     
     def get_foto_url(self, obj):
         """Obtener URL completa de la foto"""
@@ -51,10 +59,114 @@ class ProfileSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.foto.url)
             return obj.foto.url
         return None
+    
+    def get_foto_variants(self, obj):
+        """Mapa tamaño -> formato -> URL de los derivados de la foto"""
+        if not obj.foto:
+            return {}
+        urls = variant_urls(obj.foto_variants)
+        request = self.context.get('request')
+        if request:
+            for formats in urls.values():
+                for fmt, url in formats.items():
+                    formats[fmt] = request.build_absolute_uri(url)
+        return urls
+
+
+class ProfileDirectorySerializer(ProfileSerializer):
+    """Serializer para el directorio de perfiles (sin datos de contacto privados)"""
+    
+    class Meta(ProfileSerializer.Meta):
+        fields = [
+            'id',
+            'user',
+            'tipo_usuario',
+            'tipo_naturaleza',
+            'biografia',
+            'foto',
+            'foto_url',
+            'foto_variants',
+            'linkedin',
+            'twitter',
+            'github',
+            'sitio_web',
+            'esta_verificado',
+            'created_at',
+            'updated_at'
+        ]
+
+
+class FieldSelection:
+    """
+    Campos pedidos con ``?fields=`` / ``?exclude=`` / ``?expand=user``.
+    Con ``?fields=`` el usuario se devuelve como id salvo ``?expand=user``;
+    sin ``?fields=`` se mantiene anidado (compatibilidad).
+    """
+    
+    def __init__(self, fields, expand_user=True):
+        self.fields = tuple(fields)
+        self.expand_user = expand_user
+    
+    @classmethod
+    def parse(cls, query_params, serializer_class):
+        """Leer la selección de los query params; ValidationError si hay campos desconocidos"""
+        def split(name):
+            return [value.strip() for value in query_params.get(name, '').split(',') if value.strip()]
+        
+        available = serializer_class.Meta.fields
+        fields, exclude, expand = split('fields'), split('exclude'), split('expand')
+        errors = {}
+        unknown = sorted(set(fields + exclude) - set(available))
+        if unknown:
+            errors['fields'] = [f'Campos desconocidos: {", ".join(unknown)}']
+        if set(expand) - {'user'}:
+            errors['expand'] = ['Solo se puede expandir user']
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        selected = [name for name in available if (not fields or name in fields) and name not in exclude]
+        return cls(selected, expand_user='user' in expand or not fields)
+    
+    def select(self, payload):
+        """Recortar un payload completo (p. ej. el de la caché) a la selección"""
+        data = {name: payload[name] for name in self.fields}
+        if 'user' in data and not self.expand_user:
+            data['user'] = payload['user']['id']
+        return data
+
+
+@lru_cache(maxsize=256)
+def get_profile_serializer(serializer_class, fields, expand_user):
+    """
+    Instancia de serializer, sin request, con los campos de la selección ya
+    construidos. Se reutiliza entre peticiones: usar solo ``to_representation``
+    y convertir las URLs a absolutas después.
+    """
+    serializer = serializer_class()
+    for name in list(serializer.fields):
+        if name not in fields:
+            del serializer.fields[name]
+    if 'user' in serializer.fields and not expand_user:
+        serializer.fields['user'] = serializers.PrimaryKeyRelatedField(read_only=True)
+    # Construir también los campos anidados antes de compartir la instancia entre hilos
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.Serializer):
+            field.fields
+    return serializer
+
+
+def serialize_profiles(profiles, selection, serializer_class=ProfileSerializer):
+    """Serializar perfiles con el serializer cacheado de la selección"""
+    serializer = get_profile_serializer(serializer_class, selection.fields, selection.expand_user)
+    with phase('serialize'):
+        return [serializer.to_representation(profile) for profile in profiles]
 
 
 class ProfileUpdateSerializer(serializers.Serializer):
-    """Serializer para actualizar perfil completo (usuario + profile)"""
+    """
+    Serializer para actualizar perfil (usuario + profile).
+    Con ``partial=True`` (PATCH) solo se validan los campos enviados.
+    """
     
     user = serializers.DictField()
     telefono = serializers.CharField(max_length=15, required=False, allow_blank=True)
@@ -78,7 +190,9 @@ class ProfileUpdateSerializer(serializers.Serializer):
         """Validar datos del usuario"""
         required_fields = ['first_name', 'last_name']
         for field in required_fields:
-            if field not in value or not value[field].strip():
+            if self.partial and field not in value:
+                continue
+            if field not in value or not str(value[field]).strip():
                 raise serializers.ValidationError(f'{field} is required')
         return value
     
@@ -89,13 +203,22 @@ class ProfileUpdateSerializer(serializers.Serializer):
         return bool(value)
     
     def update_profile(self, user, validated_data):
-        """Actualizar perfil y usuario"""
+        """
+        Actualizar perfil y usuario.
+        Deja en ``changed_fields`` los campos escritos: {'user': [...], 'profile': [...]}
+        """
         # Actualizar datos del usuario
         user_data = validated_data.pop('user', {})
+        changed_fields = []
         if user_data:
+            user_fields = {f.name for f in User._meta.concrete_fields}
             for field, value in user_data.items():
+                if field in user_fields and getattr(user, field) != value:
+                    changed_fields.append(field)
                 setattr(user, field, value)
-            user.save()
+            # Solo escribir las columnas que cambiaron
+            if changed_fields:
+                user.save(update_fields=changed_fields)
         
         # Actualizar perfil
         profile = user.profile
@@ -112,7 +235,13 @@ class ProfileUpdateSerializer(serializers.Serializer):
             
             setattr(profile, field, value)
         
-        profile.save()
+        # Profile.save() solo actualiza los campos modificados
+        self.changed_fields = {'user': changed_fields, 'profile': profile.get_dirty_fields() or []}
+        if changed_fields and not self.changed_fields['profile']:
+            # Solo cambió el usuario: avanzar updated_at igual (ETag, Last-Modified, delta)
+            profile.save(update_fields=['updated_at'])
+        else:
+            profile.save()
         return profile
 
 
@@ -124,17 +253,40 @@ class PhotoUploadSerializer(serializers.Serializer):
     def validate_foto(self, value):
         """Validar archivo de imagen"""
         # Validar tamaño (máximo 5MB)
-        if value.size > 5 * 1024 * 1024:
+        if value.size > MAX_PHOTO_SIZE:
             raise serializers.ValidationError("La imagen es muy grande. Máximo 5MB permitido.")
         
         # Validar tipo de archivo
-        allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif']
-        if value.content_type not in allowed_types:
+        if value.content_type not in ALLOWED_PHOTO_TYPES:
             raise serializers.ValidationError("Tipo de archivo no permitido. Use JPG, PNG o GIF.")
         
         return value
 
 
+class BatchRequestSerializer(serializers.Serializer):
+    """Sub-petición de un batch"""
+    
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField(max_length=2000)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+    body = serializers.JSONField(required=False)
+    
+    def validate_path(self, value):
+        if not value.startswith('/'):
+            raise serializers.ValidationError('La ruta debe ser absoluta')
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Cuerpo de /usuarios/api/batch/"""
+    
+    requests = serializers.ListField(
+        child=BatchRequestSerializer(),
+        allow_empty=False,
+        max_length=MAX_BATCH_REQUESTS
+    )
+
+
 class LoginResponseSerializer(serializers.Serializer):
     """Serializer para respuesta de login"""
     
@@ -1,3 +1,1766 @@
-from django.test import TestCase
+"""
+Tests de la app usuarios.
 
-# Create your tests here.
+Los pools de hilos, los derivados de fotos y el buffer write-behind se
+configuran para ejecutar en el mismo hilo: la transacción de cada test no es
+visible desde otros hilos. Las escrituras que invalidan cachés se hacen
+dentro de ``captureOnCommitCallbacks(execute=True)`` porque la invalidación
+corre en ``transaction.on_commit``.
+"""
+import io
+import logging
+import os
+from datetime import datetime, timedelta
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import zlib
+from importlib.util import find_spec
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import (
+    LocMemLRUBackend,
+    UserSnapshotCache,
+    get_profile_cache,
+    get_user_snapshot_cache,
+)
+from . import async_views, counts, executors, images, media, metrics, search, views
+from .admin import MAX_ERROR_ROWS_SHOWN
+from .authentication import CachedJWTAuthentication
+from .checks import check_row_counts, check_search_triggers
+from .compression import CompressionMiddleware, choose_encoding
+from .executors import get_executor, run_admitted
+from .importers import ProfileImporter
+from .instrumentation import QueryLog, RequestInstrumentationMiddleware
+from .login import check_credentials, get_failed_login_tracker
+from .management.commands.bench import percentile
+from .models import PhotoUploadSession, Profile, RevokedToken
+from .readers import get_profile_reader
+from .renderers import FastJSONRenderer
+from .revocation import BloomFilter, get_revocation_store
+from .seeding import next_index, seed_profiles
+from .serializers import (
+    FieldSelection,
+    ProfileDirectorySerializer,
+    ProfileSerializer,
+    serialize_profiles,
+)
+from .views import absolutize_profile_urls
+from .writebehind import WriteBehindBuffer
+
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='usuarios-tests-')
+
+PASSWORD = 'clave-de-prueba-2024'
+
+TEST_SETTINGS = {
+    'MEDIA_ROOT': MEDIA_ROOT,
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    # 0 hilos = en el hilo del test
+    'EXECUTORS': {
+        'hashing': {'WORKERS': 0},
+        'images': {'WORKERS': 0},
+        'batch': {'WORKERS': 0},
+    },
+    'PROFILE_PHOTO_VARIANTS': {'SIZES': [64, 256], 'FORMATS': ['webp', 'jpeg']},
+    'WRITE_BEHIND': {'FLUSH_INTERVAL': 0},
+    'METRICS': {'DIRECTORY': None, 'ALLOWED_IPS': None},
+    'PHOTO_UPLOADS': {'TEMP_DIR': f'{MEDIA_ROOT}/tmp_uploads'},
+}
+
+PROFILE_URL = '/usuarios/api/perfil/'
+UPDATE_URL = '/usuarios/api/usuario/perfil/'
+LOGIN_URL = '/usuarios/api/login/'
+REFRESH_URL = '/usuarios/api/token/refresh/'
+PHOTO_URL = '/usuarios/api/perfil/foto/'
+DIRECTORY_URL = '/usuarios/api/perfiles/'
+SEARCH_URL = '/usuarios/api/perfiles/buscar/'
+UPLOADS_URL = '/usuarios/api/perfil/foto/uploads/'
+BATCH_URL = '/usuarios/api/batch/'
+
+
+def setUpModule():
+    # Las respuestas 4xx esperadas no se registran como advertencias
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+
+def tearDownModule():
+    logging.getLogger('django.request').setLevel(logging.NOTSET)
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def image_bytes(fmt='PNG', size=(320, 240)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def image_upload(name='foto.png', fmt='PNG', content_type='image/png'):
+    return SimpleUploadedFile(name, image_bytes(fmt), content_type=content_type)
+
+
+@override_settings(**TEST_SETTINGS)
+class UsuariosTestCase(TestCase):
+    """Base: cachés del proceso vacías y helpers de usuarios/clientes"""
+
+    def setUp(self):
+        get_profile_cache().clear()
+        get_user_snapshot_cache().clear()
+        get_failed_login_tracker().clear()
+
+    def create_user(self, username='ana', **fields):
+        fields = {
+            'first_name': 'Ana',
+            'last_name': 'Pérez',
+            'email': f'{username}@example.com',
+            **fields,
+        }
+        return User.objects.create_user(username, password=PASSWORD, **fields)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def save_committed(self, instance, **kwargs):
+        """Guardar ejecutando los callbacks on_commit (invalidaciones)"""
+        with self.captureOnCommitCallbacks(execute=True):
+            instance.save(**kwargs)
+
+
+class ProfileCacheTests(UsuariosTestCase):
+    """Caché read-through de get_profile"""
+
+    def test_second_read_is_served_from_memory(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        first = client.get(PROFILE_URL)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = client.get(PROFILE_URL)
+        self.assertEqual(second.json(), first.json())
+
+    def test_profile_save_invalidates_cached_payload(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        self.assertIsNone(client.get(PROFILE_URL).json()['telefono'])
+
+        profile = Profile.objects.get(user=user)
+        profile.telefono = '3001234567'
+        self.save_committed(profile)
+
+        self.assertEqual(client.get(PROFILE_URL).json()['telefono'], '3001234567')
+
+    def test_user_save_invalidates_cached_payload(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        client.get(PROFILE_URL)
+
+        user = User.objects.get(pk=user.pk)
+        user.first_name = 'Carla'
+        self.save_committed(user)
+
+        self.assertEqual(client.get(PROFILE_URL).json()['user']['first_name'], 'Carla')
+
+    def test_profile_delete_invalidates_cached_payload(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        profile_id = client.get(PROFILE_URL).json()['id']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.get(user=user).delete()
+
+        # Se crea un perfil nuevo en lugar de servir el eliminado
+        self.assertNotEqual(client.get(PROFILE_URL).json()['id'], profile_id)
+
+    def invalidate_concurrently(self, cache, user_id):
+        """Invalidar desde otro hilo (p. ej. el on_commit de una escritura)"""
+        thread = threading.Thread(target=cache.invalidate, args=(user_id,))
+        thread.start()
+        # La invalidación espera a que termine la reconstrucción en curso
+        thread.join(0.05)
+        return thread
+
+    def test_invalidation_while_building_is_not_stored(self):
+        cache = get_profile_cache()
+        threads = []
+
+        def builder():
+            threads.append(self.invalidate_concurrently(cache, 42))
+            return {'data': 'viejo'}
+
+        self.assertEqual(cache.get_or_build(42, builder), {'data': 'viejo'})
+        threads[0].join()
+        self.assertIsNone(cache.get(42))
+        self.assertEqual(cache.get_or_build(42, lambda: {'data': 'nuevo'}), {'data': 'nuevo'})
+        self.assertEqual(cache.get(42), {'data': 'nuevo'})
+
+    def test_invalidation_between_check_and_store_is_not_lost(self):
+        cache = get_profile_cache()
+        threads = []
+        original_set = cache.backend.set
+
+        def set_after_invalidation(key, value, timeout):
+            # La invalidación llega después de comparar la época y antes de guardar
+            threads.append(self.invalidate_concurrently(cache, 42))
+            original_set(key, value, timeout)
+
+        with mock.patch.object(cache.backend, 'set', side_effect=set_after_invalidation):
+            cache.get_or_build(42, lambda: {'data': 'viejo'})
+        threads[0].join()
+
+        self.assertIsNone(cache.get(42))
+
+    def test_cached_payload_is_not_rebuilt(self):
+        cache = get_profile_cache()
+        calls = []
+        cache.get_or_build(7, lambda: calls.append(1) or {'n': 1})
+        cache.get_or_build(7, lambda: calls.append(1) or {'n': 2})
+        self.assertEqual(calls, [1])
+
+
+class LocMemLRUBackendTests(TestCase):
+    """Backend LRU en memoria"""
+
+    def test_evicts_least_recently_used(self):
+        backend = LocMemLRUBackend(MAX_ENTRIES=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        backend.get('a')
+        backend.set('c', 3, 60)
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+
+    def test_entries_expire_after_timeout(self):
+        backend = LocMemLRUBackend()
+        with mock.patch('usuarios.cache.time.monotonic', return_value=100.0):
+            backend.set('a', 1, 10)
+        with mock.patch('usuarios.cache.time.monotonic', return_value=109.0):
+            self.assertEqual(backend.get('a'), 1)
+        with mock.patch('usuarios.cache.time.monotonic', return_value=110.0):
+            self.assertIsNone(backend.get('a'))
+
+
+class UserSnapshotTests(UsuariosTestCase):
+    """Instantáneas de identidad en CachedJWTAuthentication"""
+
+    def test_authenticated_requests_reuse_the_snapshot(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        client.get(PROFILE_URL)
+        get_profile_cache().clear()
+        # Solo la lectura del perfil: la identidad sale de la instantánea
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(PROFILE_URL).status_code, 200)
+
+    def test_deactivation_revokes_in_the_writing_process(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        self.assertEqual(client.get(PROFILE_URL).status_code, 200)
+
+        user.is_active = False
+        self.save_committed(user)
+
+        self.assertEqual(client.get(PROFILE_URL).status_code, 401)
+
+    def test_other_processes_revoke_after_timeout(self):
+        cache = UserSnapshotCache(timeout=60)
+        with mock.patch('usuarios.cache.time.monotonic', return_value=1000.0):
+            cache.set(1, 'jti', 'instantanea')
+        with mock.patch('usuarios.cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(cache.get(1, 'jti'), 'instantanea')
+        with mock.patch('usuarios.cache.time.monotonic', return_value=1060.0):
+            self.assertIsNone(cache.get(1, 'jti'))
+
+    def test_load_racing_with_invalidation_is_not_stored(self):
+        cache = UserSnapshotCache()
+        epoch = cache.epoch(1)
+        # La invalidación on_commit llega mientras se cargaba el usuario
+        cache.invalidate(1)
+        cache.set(1, 'jti', 'vieja', epoch)
+        self.assertIsNone(cache.get(1, 'jti'))
+
+        cache.set(1, 'jti', 'nueva', cache.epoch(1))
+        self.assertEqual(cache.get(1, 'jti'), 'nueva')
+
+    def test_update_writes_over_current_rows(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        client.get(PROFILE_URL)
+        # Otro worker cambia las filas: la instantánea de este proceso queda vieja
+        User.objects.filter(pk=user.pk).update(first_name='Otro')
+        Profile.objects.filter(user=user).update(telefono='3009999999')
+
+        response = client.patch(UPDATE_URL, {'user': {'first_name': 'Ana'}}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.select_related('user').get(user=user)
+        self.assertEqual(profile.user.first_name, 'Ana')
+        self.assertEqual(profile.telefono, '3009999999')
+
+    def test_photo_upload_replaces_current_photo(self):
+        user = self.create_user()
+        client = self.client_for(user)
+        client.get(PROFILE_URL)
+        # Foto subida desde otro worker después de cachear la instantánea
+        name = default_storage.save('fotos_perfil/otra.png', ContentFile(image_bytes()))
+        Profile.objects.filter(user=user).update(foto=name)
+
+        response = client.patch(PHOTO_URL, {'foto': image_upload()}, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(default_storage.exists(name))
+        self.assertNotEqual(Profile.objects.get(user=user).foto.name, name)
+
+
+class DirtyFieldTests(UsuariosTestCase):
+    """Profile.save() escribe solo las columnas modificadas"""
+
+    def update_sql(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('UPDATE "usuarios_profile"')]
+
+    def test_unchanged_profile_issues_no_update(self):
+        profile = Profile.objects.get(user=self.create_user())
+        with self.assertNumQueries(0):
+            profile.save()
+        self.assertEqual(profile.get_dirty_fields(), [])
+
+    def test_update_writes_changed_columns_and_updated_at(self):
+        profile = Profile.objects.get(user=self.create_user())
+        profile.telefono = '3001234567'
+        self.assertEqual(profile.get_dirty_fields(), ['telefono'])
+
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+
+        [sql] = self.update_sql(queries.captured_queries)
+        set_clause = sql.split(' WHERE ')[0]
+        self.assertIn('"telefono"', set_clause)
+        self.assertIn('"updated_at"', set_clause)
+        self.assertNotIn('"biografia"', set_clause)
+        self.assertNotIn('"documento"', set_clause)
+
+    def test_saved_values_become_the_new_baseline(self):
+        profile = Profile.objects.get(user=self.create_user())
+        profile.telefono = '3001234567'
+        profile.save()
+        self.assertEqual(profile.get_dirty_fields(), [])
+        profile.telefono = '3001234567'
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_user_save_does_not_rewrite_loaded_profile(self):
+        user = User.objects.select_related('profile').get(pk=self.create_user().pk)
+        user.first_name = 'Carla'
+        with CaptureQueriesContext(connection) as queries:
+            user.save(update_fields=['first_name'])
+        self.assertEqual(self.update_sql(queries.captured_queries), [])
+
+
+def import_rows(count, start=0, **extra):
+    return [
+        {'username': f'imp{index}', 'password': PASSWORD, 'email': f'imp{index}@example.com',
+         'telefono': str(3000000000 + index), **extra}
+        for index in range(start, start + count)
+    ]
+
+
+def csv_bytes(rows):
+    columns = list(rows[0])
+    lines = [','.join(columns)] + [','.join(row.get(column, '') for column in columns) for row in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class ProfileImportTests(UsuariosTestCase):
+    """Importación masiva por bloques"""
+
+    def test_imports_users_and_profiles_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = ProfileImporter(chunk_size=10, workers=1).run(import_rows(25))
+
+        self.assertEqual((result.rows_done, result.created, result.errors), (25, 25, 0))
+        profile = Profile.objects.select_related('user').get(user__username='imp7')
+        self.assertEqual(profile.telefono, '3000000007')
+        self.assertTrue(profile.user.check_password(PASSWORD))
+        # bulk_create por bloque, no un INSERT por fila
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "auth_user"')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_empty_columns_are_stored_as_null(self):
+        ProfileImporter(workers=1).run(import_rows(1, linkedin='', github='https://github.com/imp0'))
+        profile = Profile.objects.get(user__username='imp0')
+        self.assertIsNone(profile.linkedin)
+        self.assertEqual(profile.github, 'https://github.com/imp0')
+
+    def test_rejected_rows_are_reported(self):
+        self.create_user('imp1')
+        rows = import_rows(3) + [{'username': 'imp0'}, {'username': 'mal', 'email': 'no-es-email'}]
+
+        result = ProfileImporter(workers=1).run(rows)
+
+        self.assertEqual((result.created, result.errors), (2, 3))
+        self.assertEqual([row[:2] for row in result.error_rows], [[2, 'imp1'], [4, 'imp0'], [5, 'mal']])
+
+    def test_error_rows_are_capped(self):
+        rows = [{'username': f'mal{index}', 'email': 'no-es-email'} for index in range(10)]
+
+        result = ProfileImporter(chunk_size=4, workers=1, max_error_rows=3).run(rows)
+
+        self.assertEqual(result.errors, 10)
+        self.assertEqual([row[0] for row in result.error_rows], [1, 2, 3])
+
+    def test_resume_skips_committed_chunks(self):
+        checkpoint = os.path.join(MEDIA_ROOT, 'import.checkpoint.json')
+        importer = ProfileImporter(chunk_size=5, workers=1, checkpoint_path=checkpoint)
+        rows = import_rows(12)
+        importer.run(rows[:5], source='usuarios.csv')
+
+        result = importer.run(rows, source='usuarios.csv', resume=True)
+
+        self.assertEqual((result.rows_done, result.created, result.errors), (12, 12, 0))
+        self.assertEqual(User.objects.filter(username__startswith='imp').count(), 12)
+
+    def test_management_command_writes_error_report(self):
+        path = os.path.join(MEDIA_ROOT, 'usuarios.csv')
+        with open(path, 'wb') as fh:
+            fh.write(csv_bytes(import_rows(3) + [{**import_rows(1)[0], 'email': 'no-es-email'}]))
+
+        call_command('import_profiles', path, '--workers', '1', stdout=io.StringIO())
+
+        self.assertEqual(User.objects.filter(username__startswith='imp').count(), 3)
+        with open(f'{path}.errores.csv', encoding='utf-8') as fh:
+            self.assertEqual(len(fh.read().splitlines()), 2)
+
+    def test_admin_import_runs_in_process_and_caps_errors(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', PASSWORD)
+        self.client.force_login(admin_user)
+        rows = [{'username': f'mal{index}', 'email': 'no-es-email'} for index in range(MAX_ERROR_ROWS_SHOWN + 5)]
+        archivo = SimpleUploadedFile('usuarios.csv', csv_bytes(import_rows(2) + rows), content_type='text/csv')
+
+        with mock.patch('usuarios.importers.ProcessPoolExecutor') as pool:
+            response = self.client.post(
+                reverse('admin:usuarios_profile_import'),
+                {'archivo': archivo, 'chunk_size': 50},
+            )
+
+        pool.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['error_rows']), MAX_ERROR_ROWS_SHOWN)
+        self.assertEqual(response.context['error_count'], MAX_ERROR_ROWS_SHOWN + 5)
+        self.assertTrue(response.context['error_rows_truncated'])
+        self.assertTrue(User.objects.filter(username='imp1').exists())
+
+
+class ProfileDirectoryTests(UsuariosTestCase):
+    """Directorio con paginación keyset"""
+
+    def setUp(self):
+        super().setUp()
+        self.viewer = self.create_user('viewer')
+        self.client = self.client_for(self.viewer)
+        for index in range(6):
+            self.create_user(f'dir{index}')
+        # Empates en created_at: el orden lo decide el id
+        Profile.objects.update(created_at=Profile.objects.latest('created_at').created_at)
+
+    def get_page(self, url=DIRECTORY_URL, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, page):
+        return [row['id'] for row in page['results']]
+
+    def test_pages_walk_all_rows_in_descending_order(self):
+        expected = list(Profile.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen = []
+        page = self.get_page(page_size=3)
+        self.assertIsNone(page['previous'])
+        while True:
+            seen += self.ids(page)
+            if page['next'] is None:
+                break
+            page = self.get_page(page['next'])
+        self.assertEqual(seen, expected)
+
+    def test_cursor_is_stable_across_inserts(self):
+        first = self.get_page(page_size=3)
+        self.create_user('nuevo')
+
+        second = self.get_page(first['next'])
+
+        expected = list(Profile.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        # El perfil nuevo va antes del cursor: ni se repite ni desplaza filas
+        self.assertEqual(self.ids(second), [pk for pk in expected if pk < min(self.ids(first))][:3])
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.get_page(page_size=3)
+        second = self.get_page(first['next'])
+
+        self.assertEqual(self.ids(self.get_page(second['previous'])), self.ids(first))
+
+    def test_pages_do_not_count_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(page_size=3)
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+    def test_filters_and_invalid_parameters(self):
+        Profile.objects.filter(user__username='dir2').update(tipo_usuario='admin')
+        page = self.get_page(tipo_usuario='admin')
+        self.assertEqual([row['user']['username'] for row in page['results']], ['dir2'])
+
+        self.assertEqual(self.client.get(DIRECTORY_URL, {'tipo_usuario': 'otro'}).status_code, 400)
+        self.assertEqual(self.client.get(DIRECTORY_URL, {'cursor': 'no-es-base64'}).status_code, 404)
+
+
+class ProfileSearchTests(UsuariosTestCase):
+    """Índice FTS5 y sus triggers"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user('carlos', first_name='Carlos', last_name='Muñoz')
+        self.create_user('maria', first_name='María', last_name='Gómez')
+        self.client = self.client_for(self.user)
+
+    def search(self, term):
+        response = self.client.get(SEARCH_URL, {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['user']['username'] for row in response.json()['data']]
+
+    def test_prefix_search_ignores_diacritics(self):
+        self.assertEqual(self.search('mun'), ['carlos'])
+        self.assertEqual(self.search('maria gom'), ['maria'])
+
+    def test_writes_without_signals_update_the_index(self):
+        User.objects.filter(username='maria').update(last_name='Ramírez')
+        Profile.objects.filter(user=self.user).update(telefono='3105550000')
+
+        self.assertEqual(self.search('ramirez'), ['maria'])
+        self.assertEqual(self.search('gomez'), [])
+        self.assertEqual(self.search('3105550000'), ['carlos'])
+
+    def test_missing_query_is_rejected(self):
+        self.assertEqual(self.client.get(SEARCH_URL, {'q': ' '}).status_code, 400)
+
+    def test_migrate_hooks_suspend_and_restore_triggers(self):
+        search.suspend_index(sender=None, plan=[('migracion', False)])
+        self.assertEqual(search.missing_triggers(), search.TRIGGER_NAMES)
+        # Escritura mientras "se migra": no llega al índice
+        User.objects.filter(username='maria').update(last_name='Ramírez')
+        self.assertEqual(self.search('ramirez'), [])
+
+        search.restore_index(sender=None)
+
+        self.assertEqual(search.missing_triggers(), [])
+        self.assertEqual(self.search('ramirez'), ['maria'])
+
+    def test_hooks_do_nothing_without_pending_migrations(self):
+        search.suspend_index(sender=None, plan=[])
+        self.assertEqual(search.missing_triggers(), [])
+
+    def test_check_warns_when_triggers_are_missing(self):
+        self.assertEqual(check_search_triggers(None, databases=['default']), [])
+        search.drop_triggers()
+
+        [warning] = check_search_triggers(None, databases=['default'])
+
+        self.assertEqual(warning.id, 'usuarios.W001')
+
+
+class PhotoVariantTests(UsuariosTestCase):
+    """Derivados reducidos de la foto de perfil"""
+
+    def upload_photo(self, client, upload=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(PHOTO_URL, {'foto': upload or image_upload()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        return Profile.objects.get(user__username='ana')
+
+    def test_upload_generates_every_size_and_format(self):
+        profile = self.upload_photo(self.client_for(self.create_user()))
+
+        self.assertEqual(sorted(profile.foto_variants), ['256', '64'])
+        for size, formats in profile.foto_variants.items():
+            self.assertEqual(sorted(formats), ['jpeg', 'webp'])
+            with default_storage.open(formats['webp']) as fh, Image.open(fh) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertLessEqual(max(image.size), int(size))
+
+    def test_variants_drop_exif_and_flatten_alpha_for_jpeg(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientación: rotar 90°
+        Image.new('RGBA', (320, 160), (0, 0, 0, 0)).save(buffer, 'PNG', exif=exif)
+        upload = SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+
+        profile = self.upload_photo(self.client_for(self.create_user()), upload)
+
+        with default_storage.open(profile.foto_variants['256']['jpeg']) as fh, Image.open(fh) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertEqual(image.size, (128, 256))
+            self.assertFalse(image.getexif())
+
+    def test_replacing_the_photo_deletes_old_variants(self):
+        client = self.client_for(self.create_user())
+        old = self.upload_photo(client)
+        old_names = [name for formats in old.foto_variants.values() for name in formats.values()]
+
+        new = self.upload_photo(client)
+
+        self.assertFalse(any(default_storage.exists(name) for name in old_names))
+        self.assertFalse(default_storage.exists(old.foto.name))
+        self.assertTrue(default_storage.exists(new.foto_variants['64']['webp']))
+
+    def test_regenerating_with_new_settings_changes_the_urls(self):
+        profile = self.upload_photo(self.client_for(self.create_user()))
+        old = profile.foto_variants
+
+        call_command('generate_photo_variants', '--all', stdout=io.StringIO())
+        self.assertEqual(Profile.objects.get(pk=profile.pk).foto_variants, old)
+
+        with self.settings(PROFILE_PHOTO_VARIANTS={**TEST_SETTINGS['PROFILE_PHOTO_VARIANTS'], 'QUALITY': 40}):
+            call_command('generate_photo_variants', '--all', stdout=io.StringIO())
+        new = Profile.objects.get(pk=profile.pk).foto_variants
+
+        # Otros bytes, otro nombre: la URL immutable anterior no cambia de contenido
+        self.assertNotEqual(new['256']['jpeg'], old['256']['jpeg'])
+        self.assertFalse(default_storage.exists(old['256']['jpeg']))
+        self.assertTrue(default_storage.exists(new['256']['jpeg']))
+
+    @override_settings(EXECUTORS={'images': {'WORKERS': 2}})
+    def test_variants_are_submitted_to_the_images_pool(self):
+        client = self.client_for(self.create_user())
+        with mock.patch.object(executors, 'submit') as submit:
+            profile = self.upload_photo(client)
+
+        # executors.submit copia el contexto de la petición al hilo del pool
+        submit.assert_called_once_with('images', images._run_job, profile.pk, profile.foto.name)
+        self.assertEqual(profile.foto_variants, {})
+
+    def test_profile_payload_exposes_variant_urls(self):
+        client = self.client_for(self.create_user())
+        self.upload_photo(client)
+
+        data = client.get(PROFILE_URL).json()
+
+        self.assertTrue(data['foto_variants']['64']['webp'].endswith('.webp'))
+
+
+class ResumableUploadTests(UsuariosTestCase):
+    """Subidas de fotos por bloques"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+        self.content = image_bytes()
+
+    def start(self, size=None):
+        response = self.client.post(UPLOADS_URL, {'size': size or len(self.content)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return f"{UPLOADS_URL}{response.json()['data']['upload_id']}/"
+
+    def send(self, url, chunk, offset):
+        return self.client.generic(
+            'PATCH', url, chunk, content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunks_resume_from_the_reported_offset(self):
+        url = self.start()
+        first = self.send(url, self.content[:100], 0)
+        self.assertEqual(first['Upload-Offset'], '100')
+
+        # El cliente se reconecta y pregunta desde dónde seguir
+        status = self.client.get(url)
+        self.assertEqual(status.json()['data']['offset'], 100)
+
+        response = self.send(url, self.content[100:], 100)
+        self.assertEqual(response.json()['data']['offset'], len(self.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.get(user=self.user)
+        with default_storage.open(profile.foto.name) as fh:
+            self.assertEqual(fh.read(), self.content)
+        self.assertFalse(PhotoUploadSession.objects.exists())
+
+    def test_offset_mismatch_returns_current_offset(self):
+        url = self.start()
+        self.send(url, self.content[:100], 0)
+
+        response = self.send(url, self.content[50:150], 50)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '100')
+
+    def test_limits_and_file_type(self):
+        self.assertEqual(self.client.post(UPLOADS_URL, {'size': 6 * 1024 * 1024}, format='json').status_code, 413)
+
+        url = self.start()
+        self.assertEqual(self.send(url, self.content + b'extra', 0).status_code, 413)
+        self.assertEqual(self.send(url, b'%PDF-1.7 no es imagen', 0).status_code, 415)
+        self.assertEqual(self.client.get(url).json()['data']['offset'], 0)
+
+    def test_incomplete_upload_cannot_be_finalized(self):
+        url = self.start()
+        self.send(url, self.content[:100], 0)
+        self.assertEqual(self.client.post(f'{url}finalize/').status_code, 409)
+
+    def test_sessions_belong_to_their_user(self):
+        url = self.start()
+        other = self.client_for(self.create_user('otro'))
+        self.assertEqual(other.get(url).status_code, 404)
+
+    def test_active_sessions_per_user_are_capped(self):
+        with self.settings(PHOTO_UPLOADS={**TEST_SETTINGS['PHOTO_UPLOADS'], 'MAX_ACTIVE_PER_USER': 2}):
+            first = self.start()
+            self.start()
+            response = self.client.post(UPLOADS_URL, {'size': 100}, format='json')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(PhotoUploadSession.objects.filter(user=self.user).count(), 2)
+
+            # Cancelar una subida libera el cupo
+            self.assertEqual(self.client.delete(first).status_code, 204)
+            self.start()
+
+    def test_expired_sessions_do_not_count(self):
+        with self.settings(PHOTO_UPLOADS={**TEST_SETTINGS['PHOTO_UPLOADS'], 'MAX_ACTIVE_PER_USER': 1}):
+            self.start()
+            PhotoUploadSession.objects.update(created_at=timezone.now() - timedelta(days=2))
+            self.start()
+        self.assertEqual(PhotoUploadSession.objects.count(), 1)
+
+
+class AsyncViewTests(UsuariosTestCase):
+    """Las vistas async responden igual que las sync"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.auth = f'Bearer {RefreshToken.for_user(self.user).access_token}'
+
+    def call_both(self, method, path, view_name, data=None, **headers):
+        """Respuesta (status, cuerpo) de la vista sync y de la async para el mismo request"""
+        if self.auth:
+            headers.setdefault('Authorization', self.auth)
+        results = []
+        for factory, call in (
+            (RequestFactory(), getattr(views, view_name)),
+            (AsyncRequestFactory(), async_to_sync(getattr(async_views, view_name))),
+        ):
+            body = {} if data is None else {'data': json.dumps(data), 'content_type': 'application/json'}
+            response = call(getattr(factory, method)(path, **body, headers=headers))
+            if hasattr(response, 'render'):
+                response.render()
+            results.append((response.status_code, json.loads(response.content) if response.content else None))
+            get_profile_cache().clear()
+        return results
+
+    def test_get_profile_matches(self):
+        sync, native = self.call_both('get', f'{PROFILE_URL}?fields=id,telefono,user', 'get_profile')
+        self.assertEqual(sync[0], 200)
+        self.assertEqual(native, sync)
+
+    def test_missing_or_invalid_token_matches(self):
+        self.auth = None
+        sync, native = self.call_both('get', PROFILE_URL, 'get_profile')
+        self.assertEqual(sync[0], 401)
+        self.assertEqual(native, sync)
+
+        sync, native = self.call_both('get', PROFILE_URL, 'get_profile', Authorization='Bearer x')
+        self.assertEqual(sync[0], 401)
+        self.assertEqual(native, sync)
+
+    def test_invalid_selection_matches(self):
+        sync, native = self.call_both('get', f'{PROFILE_URL}?fields=no_existe', 'get_profile')
+        self.assertEqual(sync[0], 400)
+        self.assertEqual(native, sync)
+
+    def test_login_matches(self):
+        self.auth = None
+        sync, native = self.call_both('post', LOGIN_URL, 'login_view', {'username': 'ana', 'password': 'mal'})
+        self.assertEqual(sync[0], 401)
+        self.assertEqual(native, sync)
+
+        sync, native = self.call_both('post', LOGIN_URL, 'login_view', {'username': 'ana', 'password': PASSWORD})
+        self.assertEqual((sync[0], native[0]), (200, 200))
+        self.assertEqual(sorted(native[1]), sorted(sync[1]))
+
+    def test_update_matches(self):
+        sync, native = self.call_both(
+            'patch', UPDATE_URL, 'update_profile', {'biografia': 'Hola'}
+        )
+        self.assertEqual(sync[0], 200)
+        # updated_at avanza entre las dos escrituras
+        for result in (sync, native):
+            result[1]['data'].pop('updated_at')
+        self.assertEqual(native, sync)
+        self.assertEqual(Profile.objects.get(user=self.user).biografia, 'Hola')
+
+    def test_user_info_and_status_match(self):
+        for path, view_name in (('/usuarios/api/user/info/', 'user_info'), ('/usuarios/api/status/', 'api_status')):
+            sync, native = self.call_both('get', path, view_name)
+            self.assertEqual(sync[0], 200)
+            self.assertEqual(native, sync)
+
+
+class ConditionalRequestTests(UsuariosTestCase):
+    """ETag / Last-Modified en las lecturas y If-Match en las escrituras"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def test_matching_etag_returns_304_without_body(self):
+        first = self.client.get(PROFILE_URL)
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertIn('private', first['Cache-Control'])
+
+        response = self.client.get(PROFILE_URL, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+
+    def test_if_modified_since_returns_304(self):
+        first = self.client.get(PROFILE_URL)
+        response = self.client.get(PROFILE_URL, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_revalidation_on_cold_cache_skips_serialization(self):
+        etag = self.client.get(PROFILE_URL)['ETag']
+        get_profile_cache().clear()
+        # Solo la consulta de columnas de lookup_profile_validators
+        with self.assertNumQueries(1):
+            response = self.client.get(PROFILE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(PROFILE_URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(UPDATE_URL, {'biografia': 'Nueva'}, format='json')
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.get(PROFILE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['biografia'], 'Nueva')
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(PROFILE_URL)['ETag']
+        Profile.objects.filter(user=self.user).update(telefono='3001112233', updated_at=timezone.now())
+
+        response = self.client.patch(UPDATE_URL, {'biografia': 'Mía'}, format='json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(Profile.objects.get(user=self.user).biografia, None)
+
+    def test_current_if_match_is_accepted(self):
+        etag = self.client.get(PROFILE_URL)['ETag']
+        response = self.client.patch(UPDATE_URL, {'biografia': 'Mía'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # La forma débil que deja la compresión identifica los mismos datos
+        response = self.client.patch(
+            UPDATE_URL, {'biografia': 'Otra'}, format='json', HTTP_IF_MATCH=f'W/{response["ETag"]}'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_info_supports_etag(self):
+        etag = self.client.get('/usuarios/api/user/info/')['ETag']
+        response = self.client.get('/usuarios/api/user/info/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class LoginAdmissionTests(UsuariosTestCase):
+    """Control de admisión del login"""
+
+    def setUp(self):
+        super().setUp()
+        self.create_user()
+
+    def login(self, password=PASSWORD, username='ana'):
+        return self.client.post(LOGIN_URL, {'username': username, 'password': password}, format='json')
+
+    def test_repeated_failures_are_throttled(self):
+        for _ in range(5):
+            self.assertEqual(self.login('mal').status_code, 401)
+
+        response = self.login()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_success_resets_the_failure_count(self):
+        for _ in range(4):
+            self.login('mal')
+        self.assertEqual(self.login().status_code, 200)
+        for _ in range(4):
+            self.assertEqual(self.login('mal').status_code, 401)
+
+    @override_settings(EXECUTORS={'hashing': {'WORKERS': 1, 'MAX_QUEUE': 0}})
+    def test_saturated_hashing_returns_503(self):
+        admission = get_executor('hashing')._admission
+        # Otro worker está calculando un hash
+        admission.acquire()
+        try:
+            response = self.login()
+        finally:
+            admission.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(EXECUTORS={'hashing': {'WORKERS': 4, 'MAX_QUEUE': 16, 'SYNC_MAX_CONCURRENT': 1}})
+    def test_concurrent_sync_hash_beyond_the_limit_returns_503(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_authenticate(request, **credentials):
+            started.set()
+            release.wait(5)
+            return None
+
+        with mock.patch('usuarios.login.authenticate', side_effect=slow_authenticate):
+            first = threading.Thread(
+                target=check_credentials,
+                args=(RequestFactory().post(LOGIN_URL), 'ana', 'mal')
+            )
+            first.start()
+            try:
+                self.assertTrue(started.wait(5))
+                # La cola del pool solo se usa en ASGI
+                response = self.login()
+            finally:
+                release.set()
+                first.join()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.login().status_code, 200)
+
+    @override_settings(EXECUTORS={'hashing': {'WORKERS': 2, 'MAX_QUEUE': 0}})
+    def test_sync_hashing_runs_in_the_calling_thread(self):
+        run_count = ('usuarios_executor_run_seconds_count', ('hashing',))
+        before = metrics.aggregate().get(run_count, 0)
+
+        self.assertIs(run_admitted('hashing', threading.current_thread), threading.current_thread())
+        self.assertEqual(metrics.aggregate()[run_count], before + 1)
+
+    def test_unknown_users_still_pay_for_a_hash(self):
+        with mock.patch('usuarios.login.authenticate', return_value=None) as authenticate:
+            self.assertEqual(self.login(username='nadie').status_code, 401)
+        authenticate.assert_called_once()
+
+    @override_settings(LOGIN_ADMISSION={'REJECT_UNKNOWN_USERS': True})
+    def test_unknown_users_can_be_rejected_without_hashing(self):
+        with mock.patch('usuarios.login.authenticate') as authenticate:
+            self.assertEqual(self.login(username='nadie').status_code, 401)
+        authenticate.assert_not_called()
+
+
+@override_settings(TOKEN_REVOCATION={})
+class RefreshRotationTests(UsuariosTestCase):
+    """Rotación y revocación de refresh tokens"""
+
+    def setUp(self):
+        super().setUp()
+        user = self.create_user()
+        self.refresh = str(RefreshToken.for_user(user))
+        self.client = self.client_for(user)
+
+    def rotate(self, token):
+        return self.client.post(REFRESH_URL, {'refresh': token}, format='json')
+
+    def test_refresh_rotates_and_revokes_the_old_token(self):
+        response = self.rotate(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['refresh']
+        self.assertNotEqual(rotated, self.refresh)
+
+        reused = self.rotate(self.refresh)
+
+        self.assertEqual(reused.status_code, 401)
+        self.assertEqual(reused.json()['message'], 'Token revocado')
+        self.assertEqual(self.rotate(rotated).status_code, 200)
+
+    def test_invalid_token_is_rejected(self):
+        self.assertEqual(self.rotate('no-es-un-token').status_code, 401)
+        self.assertEqual(self.client.post(REFRESH_URL, {}, format='json').status_code, 400)
+
+    def test_unrevoked_tokens_are_checked_in_memory(self):
+        store = get_revocation_store()
+        store.get_bloom()
+        with self.assertNumQueries(0):
+            self.assertFalse(store.is_revoked('jti-nunca-revocado'))
+
+    def test_revocations_survive_a_new_process(self):
+        self.rotate(self.refresh)
+        jti = RefreshToken(self.refresh, verify=False)['jti']
+
+        # Un proceso nuevo carga el filtro desde la tabla
+        with self.settings(TOKEN_REVOCATION={'CAPACITY': 1000}):
+            self.assertTrue(get_revocation_store().is_revoked(jti))
+
+    def test_prune_deletes_expired_revocations(self):
+        store = get_revocation_store()
+        now = timezone.now()
+        store.revoke('vencido', now - timedelta(minutes=1))
+        store.revoke('vigente', now + timedelta(days=1))
+
+        self.assertEqual(store.prune(), 1)
+
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['vigente'])
+        self.assertFalse(store.is_revoked('vencido'))
+        self.assertTrue(store.is_revoked('vigente'))
+
+
+class BloomFilterTests(TestCase):
+    """Filtro de Bloom de revocaciones"""
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        added = [f'jti-{index}' for index in range(1000)]
+        for value in added:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in added))
+        false_positives = sum(f'otro-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class BatchTests(UsuariosTestCase):
+    """Varias peticiones de la API en una sola"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def batch(self, *requests):
+        response = self.client.post(BATCH_URL, {'requests': list(requests)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_subrequests_run_in_order_with_the_batch_user(self):
+        results = self.batch(
+            {'method': 'GET', 'path': PROFILE_URL},
+            {'method': 'PATCH', 'path': UPDATE_URL, 'body': {'biografia': 'Desde batch'}},
+            {'method': 'GET', 'path': '/usuarios/api/user/info/'},
+        )
+
+        self.assertEqual([result['status'] for result in results], [200, 200, 200])
+        self.assertEqual(results[0]['body']['user']['username'], 'ana')
+        self.assertIn('ETag', results[0]['headers'])
+        self.assertEqual(results[1]['body']['data']['biografia'], 'Desde batch')
+        self.assertEqual(results[2]['body']['data']['username'], 'ana')
+        self.assertEqual(Profile.objects.get(user=self.user).biografia, 'Desde batch')
+
+    def test_jwt_is_decoded_once_per_batch(self):
+        with mock.patch.object(
+            CachedJWTAuthentication, 'get_validated_token',
+            autospec=True, side_effect=CachedJWTAuthentication.get_validated_token,
+        ) as validate:
+            self.batch({'method': 'GET', 'path': PROFILE_URL}, {'method': 'GET', 'path': PROFILE_URL})
+        self.assertEqual(validate.call_count, 1)
+
+    def test_subrequest_headers_are_forwarded(self):
+        etag = self.client.get(PROFILE_URL)['ETag']
+        [result] = self.batch({'method': 'GET', 'path': PROFILE_URL, 'headers': {'If-None-Match': etag}})
+        self.assertEqual(result['status'], 304)
+
+    def test_token_endpoints_and_nested_batches_are_rejected(self):
+        results = self.batch(
+            {'method': 'POST', 'path': LOGIN_URL, 'body': {'username': 'ana', 'password': PASSWORD}},
+            {'method': 'POST', 'path': REFRESH_URL, 'body': {'refresh': str(RefreshToken.for_user(self.user))}},
+            {'method': 'POST', 'path': BATCH_URL, 'body': {'requests': []}},
+        )
+        self.assertEqual([result['status'] for result in results], [403, 403, 403])
+        self.assertNotIn('access', json.dumps(results))
+
+    def test_unknown_paths_return_404(self):
+        [result] = self.batch({'method': 'GET', 'path': '/usuarios/api/no-existe/'})
+        self.assertEqual(result['status'], 404)
+
+    def test_batch_requires_authentication(self):
+        response = APIClient().post(BATCH_URL, {'requests': [{'method': 'GET', 'path': PROFILE_URL}]}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class FieldSelectionTests(UsuariosTestCase):
+    """Selección de campos con ?fields=, ?exclude= y ?expand=user"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def get(self, url=PROFILE_URL, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_fields_returns_only_the_requested_keys(self):
+        data = self.get(fields='id,telefono,user')
+        self.assertEqual(set(data), {'id', 'telefono', 'user'})
+        self.assertEqual(data['user'], self.user.pk)
+
+    def test_expand_nests_the_user(self):
+        data = self.get(fields='id,user', expand='user')
+        self.assertEqual(data['user']['username'], 'ana')
+
+    def test_exclude_keeps_the_rest(self):
+        data = self.get(exclude='foto_variants,biografia')
+        self.assertNotIn('foto_variants', data)
+        self.assertNotIn('biografia', data)
+        # Sin ?fields= el usuario sigue anidado
+        self.assertEqual(data['user']['username'], 'ana')
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({'fields': 'id,clave'}, {'exclude': 'clave'}, {'expand': 'perfil'}):
+            response = self.client.get(PROFILE_URL, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+
+    def test_selection_applies_to_writes_and_listings(self):
+        response = self.client.patch(f'{UPDATE_URL}?fields=biografia', {'biografia': 'Corta'}, format='json')
+        self.assertEqual(response.json()['data'], {'biografia': 'Corta'})
+
+        page = self.get(DIRECTORY_URL, fields='id,tipo_usuario')
+        self.assertEqual(set(page['results'][0]), {'id', 'tipo_usuario'})
+
+
+class ReaderParityTests(UsuariosTestCase):
+    """Lector compilado + FastJSONRenderer == serializer + JSONRenderer"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(first_name='Ana María', last_name='Núñez "la" <b>')
+        self.profile = self.user.profile
+
+    def with_photo(self):
+        self.profile.foto = 'perfiles/ana.png'
+        self.profile.foto_variants = {
+            '64': {'jpeg': 'perfiles/variantes/ana_64.jpeg', 'webp': 'perfiles/variantes/ana_64.webp'},
+            '256': {'jpeg': 'perfiles/variantes/ana_256.jpeg', 'webp': 'perfiles/variantes/ana_256.webp'},
+        }
+        self.profile.linkedin = 'https://linkedin.com/in/ana'
+        self.profile.biografia = 'Línea 1\nLínea 2   ✓'
+        self.profile.save()
+
+    def assertSameBytes(self, selection, serializer_class=ProfileSerializer):
+        reader = get_profile_reader(serializer_class, selection)
+        row = Profile.objects.filter(pk=self.profile.pk).values(*reader.columns).get()
+        profile = Profile.objects.select_related('user').get(pk=self.profile.pk)
+        expected = JSONRenderer().render(serialize_profiles([profile], selection, serializer_class)[0])
+        self.assertEqual(FastJSONRenderer().render(reader(row)), expected)
+        return expected
+
+    def selection(self, serializer_class=ProfileSerializer, **params):
+        return FieldSelection.parse(params, serializer_class)
+
+    def test_full_payload_matches_the_serializer(self):
+        for with_photo in (False, True):
+            if with_photo:
+                self.with_photo()
+            reader = get_profile_reader(ProfileSerializer, self.selection())
+            row = Profile.objects.filter(pk=self.profile.pk).values(*reader.columns).get()
+            profile = Profile.objects.select_related('user').get(pk=self.profile.pk)
+            self.assertEqual(
+                FastJSONRenderer().render(reader(row)),
+                JSONRenderer().render(ProfileSerializer(profile).data),
+            )
+
+    def test_null_photo_and_urls(self):
+        data = json.loads(self.assertSameBytes(self.selection()))
+        self.assertIsNone(data['foto'])
+        self.assertIsNone(data['foto_url'])
+        self.assertEqual(data['foto_variants'], {})
+
+    def test_photo_with_variants(self):
+        self.with_photo()
+        data = json.loads(self.assertSameBytes(self.selection()))
+        self.assertTrue(data['foto_url'].endswith('ana.png'))
+        self.assertTrue(data['foto_variants']['64']['webp'].endswith('.webp'))
+
+    def test_fields_exclude_and_expand(self):
+        self.with_photo()
+        for params in (
+            {'fields': 'id,user,foto_url'},
+            {'fields': 'id,user', 'expand': 'user'},
+            {'fields': 'updated_at,created_at,foto'},
+            {'exclude': 'user,biografia'},
+            {'exclude': 'foto_variants', 'expand': 'user'},
+        ):
+            for serializer_class in (ProfileSerializer, ProfileDirectorySerializer):
+                with self.subTest(serializer=serializer_class.__name__, **params):
+                    self.assertSameBytes(self.selection(serializer_class, **params), serializer_class)
+
+    def test_unicode_and_line_separators(self):
+        self.profile.biografia = 'Ñandú \u2028 \u2029 </script> "comillas" \\ 😀'
+        self.profile.save()
+        rendered = self.assertSameBytes(self.selection(fields='biografia'))
+        self.assertNotIn('\u2028'.encode(), rendered)
+
+    def test_datetimes(self):
+        fields = {'fields': 'created_at,updated_at'}
+        for value in (
+            timezone.now().replace(microsecond=0),
+            timezone.now().replace(microsecond=123456),
+            timezone.now().replace(microsecond=500),
+        ):
+            with self.subTest(value=value):
+                Profile.objects.filter(pk=self.profile.pk).update(created_at=value, updated_at=value)
+                data = json.loads(self.assertSameBytes(self.selection(**fields)))
+                self.assertEqual(datetime.fromisoformat(data['updated_at']), value)
+        self.user.last_login = timezone.now()
+        self.user.save()
+        self.assertSameBytes(self.selection(fields='user', expand='user'))
+
+    def test_directory_endpoint_matches_the_serializer(self):
+        self.with_photo()
+        response = self.client_for(self.user).get(DIRECTORY_URL)
+        profile = Profile.objects.select_related('user').get(pk=self.profile.pk)
+        data = absolutize_profile_urls(
+            serialize_profiles([profile], self.selection(ProfileDirectorySerializer), ProfileDirectorySerializer)[0],
+            response.wsgi_request,
+        )
+        self.assertEqual(response.json()['results'], [json.loads(JSONRenderer().render(data))])
+
+
+class CompressionTests(UsuariosTestCase):
+    """Compresión negociada con Accept-Encoding"""
+
+    body = json.dumps({'data': ['perfil'] * 500}).encode()
+
+    def process(self, response, accept='gzip', path='/usuarios/api/perfiles/'):
+        request = RequestFactory().get(path, headers={'Accept-Encoding': accept})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def json_response(self, body=None, **headers):
+        return HttpResponse(body or self.body, content_type='application/json', headers=headers)
+
+    def test_gzip_round_trip_with_vary_and_length(self):
+        response = self.process(self.json_response())
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(zlib.decompress(response.content, 31), self.body)
+
+    def test_small_excluded_and_binary_responses_are_untouched(self):
+        cases = {
+            'small': (self.json_response(b'{"status": "success"}'), '/usuarios/api/perfil/'),
+            'excluded': (self.json_response(), LOGIN_URL),
+            'image': (HttpResponse(self.body, content_type='image/png'), '/media/foto.png'),
+            'no-transform': (self.json_response(**{'Cache-Control': 'no-transform'}), '/usuarios/api/perfil/'),
+        }
+        for name, (response, path) in cases.items():
+            with self.subTest(name):
+                original = response.content
+                response = self.process(response, path=path)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(response.content, original)
+
+    def test_etag_becomes_weak(self):
+        response = self.process(self.json_response(ETag='"abc"'))
+        self.assertEqual(response['ETag'], 'W/"abc"')
+
+    def test_identity_and_q_values(self):
+        response = self.process(self.json_response(), accept='gzip;q=0, identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(choose_encoding('*;q=0.5', ['gzip']), 'gzip')
+        self.assertEqual(choose_encoding('x-gzip', ['gzip']), 'gzip')
+        self.assertEqual(choose_encoding('br;q=1, gzip;q=0.8', ['gzip']), 'gzip')
+        self.assertIsNone(choose_encoding('', ['gzip']))
+
+    def test_streaming_response_is_compressed_in_chunks(self):
+        chunks = [b'usuario,%d\n' % i for i in range(5000)]
+        response = self.process(StreamingHttpResponse(iter(chunks), content_type='text/csv'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(zlib.decompress(b''.join(response.streaming_content), 31), b''.join(chunks))
+
+    def test_compression_is_counted_per_encoding(self):
+        keys = {
+            name: (f'usuarios_compression_{name}_total', ('gzip',))
+            for name in ('bytes_in', 'bytes_out', 'responses')
+        }
+        skipped = ('usuarios_compression_skipped_total', ('small',))
+        before = metrics.aggregate()
+
+        response = self.process(self.json_response())
+        self.process(self.json_response(b'{"status": "success"}'))
+
+        after = metrics.aggregate()
+        delta = {name: after[key] - before.get(key, 0) for name, key in keys.items()}
+        self.assertEqual(delta, {'bytes_in': len(self.body), 'bytes_out': len(response.content), 'responses': 1})
+        self.assertEqual(after[skipped] - before.get(skipped, 0), 1)
+        self.assertIn(('usuarios_compression_cpu_seconds_total', ('gzip',)), after)
+
+    def test_login_response_is_not_compressed(self):
+        self.create_user()
+        response = APIClient().post(
+            LOGIN_URL, {'username': 'ana', 'password': PASSWORD}, format='json', HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class SQLiteProfileTests(TestCase):
+    """Pragmas y BEGIN IMMEDIATE en cada conexión nueva"""
+
+    def pragma(self, conn, name):
+        with conn.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            conn = connections.create_connection('default')
+            conn.settings_dict = {**conn.settings_dict, 'NAME': os.path.join(directory, 'db.sqlite3')}
+            try:
+                self.assertEqual(self.pragma(conn, 'journal_mode'), 'wal')
+                self.assertEqual(self.pragma(conn, 'synchronous'), 1)  # NORMAL
+                self.assertEqual(self.pragma(conn, 'busy_timeout'), 5000)
+                self.assertEqual(self.pragma(conn, 'cache_size'), -64000)
+                self.assertEqual(self.pragma(conn, 'temp_store'), 2)  # MEMORY
+            finally:
+                conn.close()
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 600)
+
+
+class BenchPercentileTests(TestCase):
+    """Percentiles del informe de ``manage.py bench``"""
+
+    def test_empty_sample_has_no_percentile(self):
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_percentiles_are_sample_values(self):
+        values = [30, 10, 20]
+        self.assertEqual(percentile(values, 0), 10)
+        self.assertEqual(percentile(values, 0.5), 20)
+        self.assertEqual(percentile(values, 1), 30)
+        self.assertEqual(percentile([7], 0.99), 7)
+        # No ordena la lista del llamador
+        self.assertEqual(values, [30, 10, 20])
+
+    def test_percentiles_are_monotonic(self):
+        values = [index * 0.001 for index in range(1000)]
+        p50, p95, p99 = (percentile(values, fraction) for fraction in (0.5, 0.95, 0.99))
+        self.assertLess(p50, p95)
+        self.assertLess(p95, p99)
+        self.assertLessEqual(p99, max(values))
+
+
+@unittest.skipUnless(find_spec('gunicorn'), 'requiere gunicorn')
+class BenchSmokeTests(SimpleTestCase):
+    """``manage.py bench`` de punta a punta contra gunicorn, con pocos datos"""
+
+    def test_scenario_runs_against_gunicorn(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            subprocess.run(
+                [
+                    sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'bench',
+                    '--users', '2', '--concurrency', '1', '--requests', '3',
+                    '--scenarios', 'perfil', '--output', output,
+                ],
+                env={**os.environ, 'GUNICORN_WORKERS': '1'},
+                capture_output=True, check=True, timeout=120,
+            )
+            with open(output) as fh:
+                report = json.load(fh)
+
+        self.assertEqual(report['server'], 'wsgi')
+        perfil = report['scenarios']['perfil']
+        self.assertEqual(perfil['requests'], 3)
+        self.assertEqual(perfil['status'], {'200': 3})
+        self.assertIsNotNone(perfil['queries_per_request']['mean'])
+
+
+class SeedProfilesTests(UsuariosTestCase):
+    """Generación de perfiles sintéticos"""
+
+    def seed(self, count):
+        return seed_profiles(count, PASSWORD, seed=1, chunk_size=2)
+
+    def test_seeded_users_have_profiles_index_and_counts(self):
+        result = self.seed(5)
+
+        self.assertEqual(result.created, 5)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='seed').count(), 5)
+        self.assertTrue(User.objects.get(username='seed4').check_password(PASSWORD))
+        self.assertEqual(counts.get_row_count(Profile), Profile.objects.count())
+        user = User.objects.get(username='seed3')
+        self.assertIn(user.profile.pk, search.ranked_profile_ids('seed3'))
+
+    def test_next_index_uses_the_highest_numeric_suffix(self):
+        self.create_user('seedling')
+        self.create_user('seed_admin')
+        self.assertEqual(next_index('seed'), 0)
+
+        self.seed(3)
+        User.objects.filter(username='seed0').delete()
+
+        self.assertEqual(next_index('seed'), 3)
+        self.assertEqual(next_index('otro'), 0)
+
+    def test_reseeding_after_a_delete_does_not_collide(self):
+        self.seed(3)
+        User.objects.filter(username='seed1').delete()
+
+        self.seed(2)
+
+        self.assertEqual(
+            sorted(User.objects.filter(username__startswith='seed').values_list('username', flat=True)),
+            ['seed0', 'seed2', 'seed3', 'seed4'],
+        )
+        self.assertEqual(counts.get_row_count(User), User.objects.count())
+
+
+class RequestInstrumentationTests(UsuariosTestCase):
+    """Server-Timing y presupuestos de consultas por petición"""
+
+    def middleware(self, get_response=None, **config):
+        config = {'ENABLED': True, **config}
+        with self.settings(REQUEST_INSTRUMENTATION=config):
+            return RequestInstrumentationMiddleware(get_response or (lambda request: self.query(2)))
+
+    def query(self, count):
+        for _ in range(count):
+            User.objects.exists()
+        return HttpResponse('ok')
+
+    def test_server_timing_only_for_allowed_clients(self):
+        user = self.create_user()
+        client = self.client_for(user)
+
+        response = client.get(PROFILE_URL)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        response = client.get(PROFILE_URL, REMOTE_ADDR='203.0.113.5')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+        with self.settings(DEBUG=True):
+            response = client.get(PROFILE_URL, REMOTE_ADDR='203.0.113.5')
+        self.assertTrue(response.has_header('Server-Timing'))
+
+    def test_server_timing_is_not_exposed_to_cors(self):
+        response = self.client.get(PROFILE_URL, headers={'Origin': 'http://localhost:3000'})
+        exposed = response['Access-Control-Expose-Headers'].lower()
+        self.assertIn('etag', exposed)
+        self.assertNotIn('server-timing', exposed)
+
+    def test_sql_is_captured_only_with_a_budget(self):
+        for budget, captured in ((None, False), (20, True)):
+            with self.subTest(budget=budget):
+                middleware = self.middleware(MAX_QUERIES=budget, MAX_DURATION_MS=None)
+                self.assertEqual(middleware.start()['log'].capture_sql, captured)
+
+    def test_captured_sql_is_capped(self):
+        log = QueryLog(capture_sql=True, max_captured=2)
+        for index in range(5):
+            log.record(f'SELECT {index}', 0.001)
+        self.assertEqual(log.count, 5)
+        self.assertEqual(len(log.queries), 2)
+
+    def test_over_budget_requests_are_logged_with_fingerprints(self):
+        middleware = self.middleware(MAX_QUERIES=1, MAX_DURATION_MS=None)
+        with self.assertLogs('usuarios.instrumentation', 'WARNING') as logs:
+            middleware(RequestFactory().get('/usuarios/api/perfil/'))
+        self.assertIn('2 consultas', logs.output[0])
+        self.assertIn('2x', logs.output[0])
+
+
+class MetricsTests(UsuariosTestCase):
+    """Métricas de Prometheus compartidas entre workers"""
+
+    url = '/usuarios/api/metrics/'
+
+    def test_endpoint_defaults_to_loopback(self):
+        with self.settings(METRICS={}):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+
+    def test_requests_are_counted(self):
+        self.client.get(self.url)
+        body = self.client.get(self.url).content.decode()
+        self.assertIn('usuarios_http_requests_total{route="usuarios:metrics",method="GET",status="200"}', body)
+
+    def test_reused_pid_keeps_counters_and_resets_gauges(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics_1.db')
+            counter = ('usuarios_http_requests_total', ('perfil', 'GET', '200'))
+            gauge = (metrics.executor_pending.name, ('images',))
+            store = metrics.ValueStore(path)
+            store.add([(counter, 3), (gauge, 2)])
+
+            reused = metrics.ValueStore(path, reset_samples={metrics.executor_pending.name})
+            reused.add([(counter, 1)])
+
+            values = {metrics.decode_key(raw): value for raw, value in reused.read()}
+            self.assertEqual(values[counter], 4)
+            self.assertEqual(values[gauge], 0)
+
+
+class RowCountTests(UsuariosTestCase):
+    """Contadores de filas mantenidos por triggers"""
+
+    def assertCountsMatch(self):
+        self.assertEqual(counts.get_row_count(User), User.objects.count())
+        self.assertEqual(counts.get_row_count(Profile), Profile.objects.count())
+
+    def test_triggers_follow_inserts_bulk_creates_and_cascades(self):
+        self.create_user('ana')
+        User.objects.bulk_create([User(username=f'bulk{index}') for index in range(3)])
+        self.assertCountsMatch()
+
+        User.objects.filter(username='ana').delete()  # borra también el perfil
+        self.assertCountsMatch()
+
+    def test_migrate_hooks_suspend_and_restore_counts(self):
+        counts.suspend_counts(sender=None, plan=[('migracion', False)])
+        self.assertEqual(counts.missing_triggers(), counts.TRIGGER_NAMES)
+        # Escritura mientras "se migra": el contador no la ve
+        self.create_user('ana')
+        self.assertEqual(counts.drifted_tables()[0][0], 'auth_user')
+
+        counts.restore_counts(sender=None)
+
+        self.assertEqual(counts.missing_triggers(), [])
+        self.assertCountsMatch()
+
+    def test_hooks_do_nothing_without_pending_migrations(self):
+        counts.suspend_counts(sender=None, plan=[])
+        self.assertEqual(counts.missing_triggers(), [])
+
+    def test_check_warns_on_missing_triggers_and_drift(self):
+        self.assertEqual(check_row_counts(None, databases=['default']), [])
+
+        counts.add_rows('usuarios_profile', 5)
+        [warning] = check_row_counts(None, databases=['default'])
+        self.assertEqual(warning.id, 'usuarios.W002')
+        self.assertIn('usuarios_profile', warning.msg)
+
+        counts.recount()
+        counts.drop_triggers()
+        [warning] = check_row_counts(None, databases=['default'])
+        self.assertIn('faltan triggers', warning.msg)
+
+    def test_recount_command_checks_and_repairs(self):
+        self.create_user('ana')
+        counts.drop_triggers()
+        counts.add_rows('auth_user', -1)
+
+        with self.assertRaises(CommandError):
+            call_command('recount_rows', '--check', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('recount_rows', stdout=out)
+
+        self.assertIn('1 corregidos', out.getvalue())
+        self.assertEqual(counts.missing_triggers(), [])
+        self.assertCountsMatch()
+        call_command('recount_rows', '--check', stdout=io.StringIO())
+
+
+class ProfileDeltaTests(UsuariosTestCase):
+    """PATCH parcial con ?delta=true"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user()
+        self.client = self.client_for(self.user)
+
+    def patch(self, data, **params):
+        query = '&'.join(f'{name}={value}' for name, value in {'delta': 'true', **params}.items())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'{UPDATE_URL}?{query}', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def updated_at(self):
+        return Profile.objects.values_list('updated_at', flat=True).get(user=self.user)
+
+    def test_delta_contains_only_changed_fields(self):
+        data = self.patch({'biografia': 'Hola', 'telefono': ''}).json()['data']
+        self.assertEqual(set(data), {'biografia', 'telefono', 'updated_at'})
+
+    def test_user_only_change_bumps_updated_at(self):
+        before = self.updated_at()
+        etag = self.client.get(PROFILE_URL)['ETag']
+
+        response = self.patch({'user': {'first_name': 'Anabel'}})
+
+        self.assertGreater(self.updated_at(), before)
+        self.assertEqual(response.json()['data']['user'], {'first_name': 'Anabel'})
+        self.assertEqual(response.json()['data']['updated_at'], self.client.get(PROFILE_URL).json()['updated_at'])
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(PROFILE_URL, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_identical_write_changes_nothing(self):
+        self.patch({'biografia': 'Hola', 'user': {'first_name': 'Anabel'}})
+        before = self.updated_at()
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.patch({'biografia': 'Hola', 'user': {'first_name': 'Anabel'}}).json()['data']
+
+        self.assertEqual(set(data), {'updated_at'})
+        self.assertEqual(self.updated_at(), before)
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+
+
+class WriteBehindTests(UsuariosTestCase):
+    """``last_login`` diferido para el login de la API"""
+
+    def buffer(self):
+        buffer = WriteBehindBuffer(flush_interval=60)
+        # Sin hilo de escritura: el test llama a flush()
+        buffer._start = mock.Mock()
+        return buffer
+
+    def last_login(self, user):
+        return User.objects.values_list('last_login', flat=True).get(pk=user.pk)
+
+    def test_touches_are_coalesced_until_flush(self):
+        user = self.create_user()
+        buffer = self.buffer()
+        first, last = timezone.now(), timezone.now() + timedelta(seconds=1)
+
+        buffer.touch(User, user.pk, 'last_login', first)
+        buffer.touch(User, user.pk, 'last_login', last)
+
+        self.assertEqual(buffer.stats()['pending'], 1)
+        self.assertIsNone(self.last_login(user))
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.last_login(user), last)
+
+    def test_failed_flush_is_requeued_without_overwriting_newer_values(self):
+        user = self.create_user()
+        buffer = self.buffer()
+        old, new = timezone.now(), timezone.now() + timedelta(seconds=1)
+        buffer.touch(User, user.pk, 'last_login', old)
+
+        def write(pending):
+            buffer.touch(User, user.pk, 'last_login', new)
+            raise RuntimeError('database is locked')
+
+        with mock.patch.object(buffer, 'write', side_effect=write), self.assertLogs('usuarios.writebehind'):
+            self.assertEqual(buffer.flush(), 0)
+
+        self.assertEqual(buffer.stats()['errors'], 1)
+        buffer.flush()
+        self.assertEqual(self.last_login(user), new)
+
+    @override_settings(WRITE_BEHIND={'FLUSH_INTERVAL': 0})
+    def test_api_login_writes_last_login_through_the_buffer(self):
+        user = self.create_user()
+        response = APIClient().post(LOGIN_URL, {'username': 'ana', 'password': PASSWORD}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(self.last_login(user))
+
+    @override_settings(WRITE_BEHIND={'FLUSH_INTERVAL': 60})
+    def test_session_logins_update_last_login_synchronously(self):
+        # last_login entra en el hash de los enlaces de restablecimiento de contraseña
+        user = self.create_user()
+        self.assertTrue(self.client.login(username='ana', password=PASSWORD))
+        self.assertIsNotNone(self.last_login(user))
+
+
+class MediaServingTests(UsuariosTestCase):
+    """Archivos de MEDIA_ROOT con validadores y Range"""
+
+    content = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.name = default_storage.save('perfiles/rango.bin', ContentFile(self.content))
+        self.url = f'/media/{self.name}'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.body(response), self.content)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_single_ranges(self):
+        for header, expected, content_range in (
+            ('bytes=10-19', self.content[10:20], 'bytes 10-19/1024'),
+            ('bytes=-5', self.content[-5:], 'bytes 1019-1023/1024'),
+            ('bytes=1000-', self.content[1000:], 'bytes 1000-1023/1024'),
+        ):
+            with self.subTest(header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(expected)))
+                self.assertEqual(self.body(response), expected)
+
+    def test_unsatisfiable_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        empty = default_storage.save('perfiles/vacio.bin', ContentFile(b''))
+        response = self.client.get(f'/media/{empty}', HTTP_RANGE='bytes=0-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+        with self.assertRaises(media.RangeNotSatisfiable):
+            media.parse_range('bytes=-5', 0)
+        self.assertIsNone(media.parse_range('bytes=', 0))
+
+    def test_ranges_expose_fileno_only_to_gunicorn(self):
+        class GunicornFileWrapper:
+            __module__ = 'gunicorn.http.wsgi'
+
+        for file_wrapper, range_class in (
+            (None, media.FileRange),
+            (GunicornFileWrapper, media.SendfileRange),
+        ):
+            with self.subTest(range_class=range_class.__name__):
+                request = RequestFactory().get(self.url, HTTP_RANGE='bytes=0-9')
+                request.META['wsgi.file_wrapper'] = file_wrapper
+                response = views.serve_media(request, self.name)
+                self.assertIs(type(response.file_to_stream), range_class)
+                self.assertEqual(hasattr(response.file_to_stream, 'fileno'), range_class is media.SendfileRange)
+                response.close()
+
+    def test_paths_outside_media_root_are_404(self):
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/perfiles/no-existe.png').status_code, 404)
@@ -0,0 +1,242 @@
+"""
+Subida de fotos de perfil por bloques, reanudable.
+
+Protocolo:
+    1. POST  perfil/foto/uploads/                    {"size": <bytes>} -> upload_id
+    2. PATCH perfil/foto/uploads/<id>/               cuerpo = bytes, cabecera Upload-Offset
+       GET   perfil/foto/uploads/<id>/               -> offset actual (para reanudar)
+       DELETE perfil/foto/uploads/<id>/              -> cancelar la subida
+    3. POST  perfil/foto/uploads/<id>/finalize/      -> mueve el archivo a Profile.foto
+
+Los bloques se escriben directamente en un archivo temporal en disco (nunca
+se cargan completos en memoria). El tipo se valida por magic bytes con el
+primer bloque y el tamaño se controla con el conteo acumulado de bytes.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File, locks
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import metrics
+from .models import PhotoUploadSession, upload_profile_image
+
+
+# Límites compartidos con PhotoUploadSerializer
+MAX_PHOTO_SIZE = 5 * 1024 * 1024  # 5MB
+ALLOWED_PHOTO_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif']
+
+# Firmas de archivo aceptadas: (prefijo, content_type, extensión)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+]
+
+# Bytes necesarios para identificar el tipo
+SIGNATURE_LENGTH = max(len(signature) for signature, _, _ in IMAGE_SIGNATURES)
+
+DEFAULT_PHOTO_UPLOADS = {
+    'TEMP_DIR': None,  # None => <MEDIA_ROOT>/../tmp_uploads (mismo disco => rename)
+    'MAX_CHUNK_SIZE': 1024 * 1024,
+    'TTL': timedelta(hours=24),
+    # Subidas sin finalizar por usuario; las siguientes reciben 429
+    'MAX_ACTIVE_PER_USER': 3,
+}
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Error del protocolo de subida; ``status`` es el código HTTP sugerido"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def get_uploads_config():
+    return {**DEFAULT_PHOTO_UPLOADS, **getattr(settings, 'PHOTO_UPLOADS', {})}
+
+
+def get_temp_dir():
+    temp_dir = get_uploads_config()['TEMP_DIR']
+    if temp_dir is None:
+        temp_dir = os.path.join(os.path.dirname(os.fspath(settings.MEDIA_ROOT)), 'tmp_uploads')
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+
+def temp_path(upload):
+    return os.path.join(get_temp_dir(), f'{upload.pk.hex}.part')
+
+
+def sniff_image_type(header):
+    """Retorna (content_type, extensión) según los magic bytes, o None"""
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type, extension
+    return None
+
+
+def current_offset(upload):
+    try:
+        return os.path.getsize(temp_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+def is_expired(upload):
+    return upload.created_at + get_uploads_config()['TTL'] < timezone.now()
+
+
+def create_upload(user, size):
+    """Crear una sesión de subida y su archivo temporal vacío"""
+    if size <= 0:
+        raise UploadError('El tamaño debe ser mayor que 0')
+    if size > MAX_PHOTO_SIZE:
+        raise UploadError('La imagen es muy grande. Máximo 5MB permitido.', status=413)
+
+    purge_expired(user)
+    limit = get_uploads_config()['MAX_ACTIVE_PER_USER']
+    with transaction.atomic():
+        # Insertar antes de contar: el INSERT toma el lock de escritura y dos
+        # creaciones simultáneas no pueden ver ambas el mismo conteo
+        upload = PhotoUploadSession.objects.create(user=user, size=size)
+        if PhotoUploadSession.objects.filter(user=user).count() > limit:
+            raise UploadError(
+                f'Demasiadas subidas en curso. Máximo {limit}; finalice o espere a que expiren.',
+                status=429
+            )
+    open(temp_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload, stream, offset, length):
+    """
+    Agregar un bloque leído de ``stream`` en la posición ``offset``.
+    Retorna el nuevo offset.
+    """
+    config = get_uploads_config()
+    if is_expired(upload):
+        raise UploadError('La subida expiró', status=410)
+    if length is None:
+        raise UploadError('Content-Length requerido', status=411)
+    if length > config['MAX_CHUNK_SIZE']:
+        raise UploadError(f'Bloque demasiado grande. Máximo {config["MAX_CHUNK_SIZE"]} bytes.', status=413)
+
+    path = temp_path(upload)
+    # El primer bloque debe traer la firma completa del archivo
+    signature_length = min(SIGNATURE_LENGTH, upload.size)
+    with open(path, 'ab') as fh:
+        # Serializar escrituras concurrentes sobre la misma subida
+        locks.lock(fh, locks.LOCK_EX)
+        try:
+            position = fh.seek(0, os.SEEK_END)
+            if offset != position:
+                raise UploadError('Upload-Offset no coincide', status=409, offset=position)
+            if position + length > upload.size:
+                raise UploadError('El bloque excede el tamaño declarado', status=413, offset=position)
+            if position == 0 and length < signature_length:
+                raise UploadError(
+                    f'El primer bloque debe tener al menos {signature_length} bytes',
+                    offset=position
+                )
+
+            received = 0
+            header = b''
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                if position == 0 and len(header) < signature_length:
+                    header += data[:signature_length - len(header)]
+                    if len(header) == signature_length:
+                        detected = sniff_image_type(header)
+                        if detected is None:
+                            fh.truncate(position)
+                            raise UploadError(
+                                'Tipo de archivo no permitido. Use JPG, PNG o GIF.',
+                                status=415, offset=position
+                            )
+                        upload.content_type = detected[0]
+                fh.write(data)
+                received += len(data)
+
+            fh.flush()
+            if received != length:
+                # Conexión cortada: descartar el bloque parcial
+                fh.truncate(position)
+                raise UploadError('Bloque incompleto', status=400, offset=position)
+        finally:
+            locks.unlock(fh)
+
+    metrics.upload_bytes.inc(length, kind='reanudable')
+    if position == 0:
+        upload.save(update_fields=['content_type'])
+    return position + length
+
+
+def finalize_upload(upload):
+    """
+    Validar el archivo completo y moverlo al storage de fotos.
+    Retorna el nombre del archivo en el storage.
+    """
+    path = temp_path(upload)
+    if current_offset(upload) != upload.size:
+        raise UploadError('La subida está incompleta', status=409, offset=current_offset(upload))
+
+    with open(path, 'rb') as fh:
+        detected = sniff_image_type(fh.read(SIGNATURE_LENGTH))
+        fh.seek(0)
+        try:
+            with Image.open(fh) as image:
+                image.verify()
+        except Exception:
+            detected = None
+    if detected is None or detected[0] not in ALLOWED_PHOTO_TYPES:
+        discard_upload(upload)
+        raise UploadError('El archivo no es una imagen válida', status=400)
+
+    name = upload_profile_image(None, f'foto.{detected[1]}')
+    try:
+        destination = default_storage.path(name)
+    except NotImplementedError:
+        # Storage remoto: no hay rename posible, se copia en streaming
+        with open(path, 'rb') as fh:
+            name = default_storage.save(name, File(fh))
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+        if settings.FILE_UPLOAD_PERMISSIONS is not None:
+            os.chmod(destination, settings.FILE_UPLOAD_PERMISSIONS)
+
+    upload.delete()
+    return name
+
+
+def discard_upload(upload):
+    """Eliminar la sesión y su archivo temporal"""
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_expired(user=None):
+    """Eliminar sesiones expiradas (de un usuario o de todos)"""
+    limit = timezone.now() - get_uploads_config()['TTL']
+    expired = PhotoUploadSession.objects.filter(created_at__lt=limit)
+    if user is not None:
+        expired = expired.filter(user=user)
+    for upload in expired:
+        discard_upload(upload)
@@ -1,22 +1,40 @@
 """
 URLs para la app usuarios
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Bajo ASGI las vistas async nativas evitan el paso por un hilo en cada petición
+if getattr(settings, 'ASYNC_API_VIEWS', False):
+    from . import async_views as api_views
+else:
+    api_views = views
+
 app_name = 'usuarios'
 
 urlpatterns = [
     # Autenticación
-    path('login/', views.login_view, name='login'),
+    path('login/', api_views.login_view, name='login'),
     path('token/refresh/', views.refresh_token, name='token_refresh'),
     
     # Perfil
-    path('perfil/', views.get_profile, name='get_profile'),
-    path('usuario/perfil/', views.update_profile, name='update_profile'),
+    path('perfil/', api_views.get_profile, name='get_profile'),
+    path('perfiles/', views.profile_directory, name='profile_directory'),
+    path('perfiles/buscar/', views.search_profiles, name='search_profiles'),
+    path('usuario/perfil/', api_views.update_profile, name='update_profile'),
     path('perfil/foto/', views.upload_profile_photo, name='upload_photo'),
+    path('perfil/foto/uploads/', views.photo_upload_init, name='photo_upload_init'),
+    path('perfil/foto/uploads/<uuid:upload_id>/', views.photo_upload_chunk, name='photo_upload_chunk'),
+    path(
+        'perfil/foto/uploads/<uuid:upload_id>/finalize/',
+        views.photo_upload_finalize,
+        name='photo_upload_finalize'
+    ),
     
     # Utilidades
-    path('user/info/', views.user_info, name='user_info'),
-    path('status/', views.api_status, name='api_status'),
+    path('user/info/', api_views.user_info, name='user_info'),
+    path('status/', api_views.api_status, name='api_status'),
+    path('batch/', views.batch, name='batch'),
+    path('metrics/', views.api_metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,24 +1,65 @@
 """
 Views para la API de usuarios y perfiles.
 """
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.views.decorators.http import require_GET, require_safe
 
-from .models import Profile
+from . import media, metrics, search, uploads
+from .batch import execute_batch, get_or_load
+from .cache import get_profile_cache, invalidate_profile
+from .conditional import (
+    PreconditionFailed,
+    check_if_match,
+    get_profile_validators,
+    is_conditional,
+    lookup_profile_validators,
+    not_modified,
+    set_validators,
+    user_etag,
+)
+from .images import delete_variants, enqueue_variants
+from .instrumentation import phase
+from .login import LoginRejected, check_credentials
+from .models import PhotoUploadSession, Profile
+from .pagination import ProfileKeysetPagination
+from .readers import get_profile_reader
+from .revocation import TokenRevoked, rotate_refresh_token
 from .serializers import (
     ProfileSerializer, 
+    ProfileDirectorySerializer,
     ProfileUpdateSerializer, 
     PhotoUploadSerializer,
+    BatchSerializer,
+    FieldSelection,
+    serialize_profiles,
     LoginResponseSerializer,
     ApiResponseSerializer
 )
+from .writebehind import touch_last_login
+
+
+# Endpoints listados por api_status
+API_ENDPOINTS = [
+    '/usuarios/api/login/',
+    '/usuarios/api/perfil/',
+    '/usuarios/api/perfiles/',
+    '/usuarios/api/perfiles/buscar/',
+    '/usuarios/api/usuario/perfil/',
+    '/usuarios/api/perfil/foto/',
+    '/usuarios/api/perfil/foto/uploads/',
+    '/usuarios/api/token/refresh/',
+    '/usuarios/api/batch/',
+    '/usuarios/api/metrics/',
+]
 
 
 def get_api_response(status_type, message, data=None):
@@ -32,6 +73,163 @@ def get_api_response(status_type, message, data=None):
     return response_data
 
 
+def build_profile_entry(user):
+    """
+    Serializar el perfil sin request para que sea cacheable.
+    La entrada incluye los validadores para responder 304 sin serializar.
+    """
+    try:
+        # Dentro de un batch las sub-peticiones comparten la instancia
+        profile = get_or_load(
+            Profile, ('user', user.pk),
+            lambda: Profile.objects.select_related('user').get(user=user)
+        )
+    except Profile.DoesNotExist:
+        # Crear perfil si no existe
+        profile = Profile.objects.create(user=user)
+    etag, last_modified = get_profile_validators(profile)
+    return {
+        'data': serialize_profiles([profile], FieldSelection(ProfileSerializer.Meta.fields))[0],
+        'etag': etag,
+        'last_modified': last_modified,
+    }
+
+
+def absolutize_profile_urls(payload, request):
+    """Convertir las URLs relativas de la foto en absolutas para el request"""
+    payload = dict(payload)
+    for field in ('foto', 'foto_url'):
+        if payload.get(field):
+            payload[field] = request.build_absolute_uri(payload[field])
+    if payload.get('foto_variants'):
+        payload['foto_variants'] = {
+            size: {fmt: request.build_absolute_uri(url) for fmt, url in formats.items()}
+            for size, formats in payload['foto_variants'].items()
+        }
+    return payload
+
+
+def serialize_profile(profile, selection, request):
+    """Serializar un perfil con la selección de campos del request"""
+    return absolutize_profile_urls(serialize_profiles([profile], selection)[0], request)
+
+
+def wants_delta(query_params):
+    """``?delta=true``: responder solo los campos modificados"""
+    return query_params.get('delta', '').lower() in ['true', '1', 'yes']
+
+
+def serialize_profile_delta(profile, changed_fields, request):
+    """Campos escritos por ``ProfileUpdateSerializer.update_profile`` más ``updated_at``"""
+    names = {*changed_fields['profile'], 'updated_at'}
+    if changed_fields['user']:
+        names.add('user')
+    selection = FieldSelection([name for name in ProfileSerializer.Meta.fields if name in names])
+    data = serialize_profile(profile, selection, request)
+    if 'user' in data:
+        data['user'] = {
+            name: value for name, value in data['user'].items()
+            if name in changed_fields['user']
+        }
+    return data
+
+
+def invalid_selection_response(error):
+    """Respuesta 400 para ?fields= / ?exclude= / ?expand= inválidos"""
+    return Response(
+        get_api_response('error', 'Parámetros inválidos', error.detail),
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+def load_profile(user, for_update=False):
+    """
+    Perfil y usuario recién leídos de la base de datos.
+    ``request.user`` puede ser una instantánea de la autenticación con hasta
+    ``AUTH_SNAPSHOT_CACHE['TIMEOUT']`` segundos de antigüedad: las escrituras
+    se hacen siempre sobre estas instancias, nunca sobre la instantánea.
+    """
+    queryset = Profile.objects.select_related('user')
+    if for_update:
+        queryset = queryset.select_for_update()
+    return queryset.get(user_id=user.pk)
+
+
+def save_profile_update(serializer, user, if_match=None):
+    """
+    Aplicar una actualización ya validada dentro de una transacción.
+    Con ``if_match`` se verifica la versión actual de la fila dentro de la
+    misma transacción (PreconditionFailed si otro cliente la modificó).
+    """
+    with transaction.atomic():
+        profile = load_profile(user, for_update=True)
+        if if_match:
+            check_if_match(if_match, get_profile_validators(profile)[0])
+        user = profile.user
+        profile = serializer.update_profile(user, serializer.validated_data)
+        transaction.on_commit(lambda: invalidate_profile(user.pk))
+    return profile
+
+
+def build_user_info(user):
+    """Datos básicos del usuario para user_info"""
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_active': user.is_active,
+        'date_joined': user.date_joined,
+    }
+
+
+def build_api_status():
+    """Datos de estado de la API para api_status"""
+    return {
+        'version': '1.0.0',
+        'endpoints': API_ENDPOINTS,
+    }
+
+
+def replace_profile_photo(profile, foto):
+    """Reemplazar la foto del perfil (archivo subido o nombre ya en el storage)"""
+    # Eliminar foto anterior y sus derivados si existen
+    if profile.foto:
+        profile.foto.delete(save=False)
+    delete_variants(profile.foto_variants)
+    
+    # Guardar nueva foto; los derivados se generan en segundo plano
+    profile.foto = foto
+    profile.foto_variants = {}
+    profile.save()
+    invalidate_profile(profile.user_id)
+    enqueue_variants(profile)
+
+
+def login_rejected_response(error):
+    """Respuesta 429/503 para logins no admitidos"""
+    return Response(
+        get_api_response('error', error.message),
+        status=error.status,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+def upload_error_response(error):
+    """Respuesta para errores del protocolo de subida por bloques"""
+    data = None
+    headers = {}
+    if error.offset is not None:
+        data = {'offset': error.offset}
+        headers['Upload-Offset'] = str(error.offset)
+    return Response(
+        get_api_response('error', error.message, data),
+        status=error.status,
+        headers=headers
+    )
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
@@ -48,11 +246,18 @@ def login_view(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Autenticar usuario
-    user = authenticate(username=username, password=password)
+    # Autenticar usuario (hashes simultáneos acotados por el pool de hashing)
+    try:
+        user = check_credentials(request, username, password)
+    except LoginRejected as e:
+        return login_rejected_response(e)
     
     if user is not None:
         if user.is_active:
+            if jwt_settings.UPDATE_LAST_LOGIN:
+                # Diferido: no ocupa el escritor de SQLite durante el login
+                touch_last_login(user)
+            
             # Generar tokens JWT
             refresh = RefreshToken.for_user(user)
             access_token = refresh.access_token
@@ -81,17 +286,36 @@ def login_view(request):
 def get_profile(request):
     """
     Obtener perfil del usuario autenticado
-    GET /usuarios/api/perfil/
+    GET /usuarios/api/perfil/?fields=&exclude=&expand=user
     """
     try:
-        profile = request.user.profile
-        serializer = ProfileSerializer(profile, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    except Profile.DoesNotExist:
-        # Crear perfil si no existe
-        profile = Profile.objects.create(user=request.user)
-        serializer = ProfileSerializer(profile, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        selection = FieldSelection.parse(request.query_params, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    
+    try:
+        cache = get_profile_cache()
+        entry = cache.get(request.user.pk)
+        if entry is None and is_conditional(request):
+            # Revalidación con la caché fría: basta con leer updated_at y compañía
+            validators = lookup_profile_validators(request.user)
+            if validators is not None:
+                response = not_modified(request, *validators)
+                if response is not None:
+                    return response
+        if entry is None:
+            entry = cache.get_or_build(
+                request.user.pk,
+                lambda: build_profile_entry(request.user)
+            )
+        
+        response = not_modified(request, entry['etag'], entry['last_modified'])
+        if response is not None:
+            return response
+        # La caché guarda el payload completo; la selección solo recorta claves
+        data = absolutize_profile_urls(selection.select(entry['data']), request)
+        response = Response(data, status=status.HTTP_200_OK)
+        return set_validators(response, entry['etag'], entry['last_modified'])
     except Exception as e:
         return Response(
             get_api_response('error', f'Error al obtener perfil: {str(e)}'),
@@ -99,38 +323,146 @@ def get_profile(request):
         )
 
 
-@api_view(['PUT'])
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def profile_directory(request):
+    """
+    Directorio de perfiles con paginación por cursor
+    GET /usuarios/api/perfiles/?tipo_usuario=&tipo_naturaleza=&esta_verificado=&cursor=&fields=
+    """
+    try:
+        selection = FieldSelection.parse(request.query_params, ProfileDirectorySerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    queryset = Profile.objects.all()
+    
+    # Filtros opcionales
+    tipo_usuario = request.query_params.get('tipo_usuario')
+    if tipo_usuario:
+        if tipo_usuario not in dict(Profile.TIPO_USUARIO_CHOICES):
+            return Response(
+                get_api_response('error', 'tipo_usuario inválido'),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(tipo_usuario=tipo_usuario)
+    
+    tipo_naturaleza = request.query_params.get('tipo_naturaleza')
+    if tipo_naturaleza:
+        if tipo_naturaleza not in dict(Profile.TIPO_NATURALEZA_CHOICES):
+            return Response(
+                get_api_response('error', 'tipo_naturaleza inválido'),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(tipo_naturaleza=tipo_naturaleza)
+    
+    esta_verificado = request.query_params.get('esta_verificado')
+    if esta_verificado:
+        queryset = queryset.filter(
+            esta_verificado=esta_verificado.lower() in ['true', '1', 'yes', 'on']
+        )
+    
+    # Lectura de solo las columnas necesarias, sin instancias ni serializer
+    reader = get_profile_reader(ProfileDirectorySerializer, selection)
+    queryset = queryset.values(*reader.columns, *ProfileKeysetPagination.position_fields)
+    
+    paginator = ProfileKeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    with phase('serialize'):
+        data = [absolutize_profile_urls(reader(row), request) for row in page]
+    return paginator.get_paginated_response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_profiles(request):
+    """
+    Búsqueda de perfiles ordenada por relevancia
+    GET /usuarios/api/perfiles/buscar/?q=&limit=&fields=
+    """
+    try:
+        selection = FieldSelection.parse(request.query_params, ProfileDirectorySerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    
+    term = request.query_params.get('q', '').strip()
+    if not search.build_match_query(term):
+        return Response(
+            get_api_response('error', 'El parámetro q es requerido'),
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not search.fts_available():
+        return Response(
+            get_api_response('error', 'Búsqueda no disponible'),
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    
+    try:
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        limit = 20
+    limit = max(1, min(limit, search.MAX_SEARCH_RESULTS))
+    
+    ids = search.ranked_profile_ids(term, limit)
+    reader = get_profile_reader(ProfileDirectorySerializer, selection)
+    rows = {row['id']: row for row in Profile.objects.filter(id__in=ids).values('id', *reader.columns)}
+    with phase('serialize'):
+        data = [absolutize_profile_urls(reader(rows[pk]), request) for pk in ids if pk in rows]
+    return Response(
+        get_api_response('success', 'Resultados de búsqueda', data),
+        status=status.HTTP_200_OK
+    )
+
+
+@api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def update_profile(request):
     """
-    Actualizar perfil completo del usuario
-    PUT /usuarios/api/usuario/perfil/
+    Actualizar perfil del usuario
+    PUT /usuarios/api/usuario/perfil/?fields=          perfil completo
+    PATCH /usuarios/api/usuario/perfil/?fields=&delta=  solo los campos enviados
+    Con ?delta=true se responden solo los campos modificados y updated_at
     """
     try:
-        with transaction.atomic():
-            serializer = ProfileUpdateSerializer(data=request.data)
+        selection = FieldSelection.parse(request.query_params, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    
+    try:
+        serializer = ProfileUpdateSerializer(data=request.data, partial=request.method == 'PATCH')
+        
+        if serializer.is_valid():
+            # Actualizar perfil (If-Match opcional contra actualizaciones perdidas)
+            profile = save_profile_update(
+                serializer,
+                request.user,
+                if_match=request.headers.get('If-Match')
+            )
             
-            if serializer.is_valid():
-                # Actualizar perfil
-                profile = serializer.update_profile(request.user, serializer.validated_data)
-                
-                # Retornar perfil actualizado
-                profile_serializer = ProfileSerializer(profile, context={'request': request})
-                
-                return Response(
-                    get_api_response(
-                        'success', 
-                        'Perfil actualizado correctamente',
-                        profile_serializer.data
-                    ),
-                    status=status.HTTP_200_OK
-                )
+            # Retornar perfil actualizado (o solo lo que cambió)
+            if wants_delta(request.query_params):
+                data = serialize_profile_delta(profile, serializer.changed_fields, request)
             else:
-                return Response(
-                    get_api_response('error', 'Datos inválidos', serializer.errors),
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+                data = serialize_profile(profile, selection, request)
+            response = Response(
+                get_api_response(
+                    'success', 
+                    'Perfil actualizado correctamente',
+                    data
+                ),
+                status=status.HTTP_200_OK
+            )
+            return set_validators(response, *get_profile_validators(profile))
+        else:
+            return Response(
+                get_api_response('error', 'Datos inválidos', serializer.errors),
+                status=status.HTTP_400_BAD_REQUEST
+            )
                 
+    except PreconditionFailed as e:
+        return Response(
+            get_api_response('error', str(e.detail)),
+            status=e.status_code
+        )
     except Exception as e:
         return Response(
             get_api_response('error', f'Error al actualizar perfil: {str(e)}'),
@@ -143,29 +475,28 @@ def update_profile(request):
 def upload_profile_photo(request):
     """
     Subir foto de perfil
-    PATCH /usuarios/api/perfil/foto/
+    PATCH /usuarios/api/perfil/foto/?fields=
     """
     try:
-        profile = request.user.profile
+        selection = FieldSelection.parse(request.query_params, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    
+    try:
+        profile = load_profile(request.user)
         serializer = PhotoUploadSerializer(data=request.data)
         
         if serializer.is_valid():
-            # Eliminar foto anterior si existe
-            if profile.foto:
-                profile.foto.delete(save=False)
-            
-            # Guardar nueva foto
-            profile.foto = serializer.validated_data['foto']
-            profile.save()
+            foto = serializer.validated_data['foto']
+            metrics.upload_bytes.inc(foto.size, kind='directa')
+            replace_profile_photo(profile, foto)
             
             # Retornar respuesta
-            profile_serializer = ProfileSerializer(profile, context={'request': request})
-            
             return Response(
                 get_api_response(
                     'success',
                     'Foto actualizada correctamente',
-                    profile_serializer.data
+                    serialize_profile(profile, selection, request)
                 ),
                 status=status.HTTP_200_OK
             )
@@ -187,6 +518,124 @@ def upload_profile_photo(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def photo_upload_init(request):
+    """
+    Iniciar una subida reanudable de foto
+    POST /usuarios/api/perfil/foto/uploads/  {"size": <bytes>}
+    """
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response(
+            get_api_response('error', 'size es requerido'),
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        upload = uploads.create_upload(request.user, size)
+    except uploads.UploadError as e:
+        return upload_error_response(e)
+    
+    return Response(
+        get_api_response('success', 'Subida iniciada', {
+            'upload_id': str(upload.pk),
+            'offset': 0,
+            'size': upload.size,
+            'max_chunk_size': uploads.get_uploads_config()['MAX_CHUNK_SIZE'],
+        }),
+        status=status.HTTP_201_CREATED,
+        headers={'Upload-Offset': '0'}
+    )
+
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def photo_upload_chunk(request, upload_id):
+    """
+    Consultar el offset (GET), agregar un bloque (PATCH) o cancelar (DELETE)
+    PATCH /usuarios/api/perfil/foto/uploads/<id>/
+    Cabecera Upload-Offset; cuerpo = bytes del bloque
+    """
+    upload = get_object_or_404(PhotoUploadSession, pk=upload_id, user=request.user)
+    
+    if request.method == 'DELETE':
+        uploads.discard_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    if request.method == 'GET':
+        offset = uploads.current_offset(upload)
+        return Response(
+            get_api_response('success', 'Estado de la subida', {
+                'offset': offset,
+                'size': upload.size,
+            }),
+            status=status.HTTP_200_OK,
+            headers={'Upload-Offset': str(offset)}
+        )
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return Response(
+            get_api_response('error', 'Cabecera Upload-Offset requerida'),
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    content_length = request.META.get('CONTENT_LENGTH')
+    length = int(content_length) if content_length and content_length.isdigit() else None
+    
+    try:
+        # Leer del stream del request sin cargar el cuerpo en memoria
+        new_offset = uploads.append_chunk(upload, request.stream, offset, length)
+    except uploads.UploadError as e:
+        return upload_error_response(e)
+    
+    return Response(
+        get_api_response('success', 'Bloque recibido', {
+            'offset': new_offset,
+            'size': upload.size,
+        }),
+        status=status.HTTP_200_OK,
+        headers={'Upload-Offset': str(new_offset)}
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def photo_upload_finalize(request, upload_id):
+    """
+    Completar la subida y asignar la foto al perfil
+    POST /usuarios/api/perfil/foto/uploads/<id>/finalize/?fields=
+    """
+    try:
+        selection = FieldSelection.parse(request.query_params, ProfileSerializer)
+    except serializers.ValidationError as e:
+        return invalid_selection_response(e)
+    
+    upload = get_object_or_404(PhotoUploadSession, pk=upload_id, user=request.user)
+    
+    try:
+        name = uploads.finalize_upload(upload)
+    except uploads.UploadError as e:
+        return upload_error_response(e)
+    
+    try:
+        profile = load_profile(request.user)
+    except Profile.DoesNotExist:
+        profile = Profile.objects.create(user_id=request.user.pk)
+    replace_profile_photo(profile, name)
+    
+    return Response(
+        get_api_response(
+            'success',
+            'Foto actualizada correctamente',
+            serialize_profile(profile, selection, request)
+        ),
+        status=status.HTTP_200_OK
+    )
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def refresh_token(request):
@@ -204,7 +653,8 @@ def refresh_token(request):
             )
         
         try:
-            refresh = RefreshToken(refresh_token)
+            # Rotación: el token recibido queda revocado y se emite uno nuevo
+            refresh = rotate_refresh_token(refresh_token)
             access_token = refresh.access_token
             
             return Response({
@@ -212,6 +662,11 @@ def refresh_token(request):
                 'refresh': str(refresh)
             }, status=status.HTTP_200_OK)
             
+        except TokenRevoked:
+            return Response(
+                get_api_response('error', 'Token revocado'),
+                status=status.HTTP_401_UNAUTHORIZED
+            )
         except Exception:
             return Response(
                 get_api_response('error', 'Token inválido'),
@@ -225,6 +680,28 @@ def refresh_token(request):
         )
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    """
+    Ejecutar varias peticiones de la API en una sola
+    POST /usuarios/api/batch/
+    {"requests": [{"method": "GET", "path": "/usuarios/api/perfil/", "headers": {}, "body": {}}]}
+    """
+    serializer = BatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(
+            get_api_response('error', 'Datos inválidos', serializer.errors),
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    results = execute_batch(request, serializer.validated_data['requests'])
+    return Response(
+        get_api_response('success', 'Batch ejecutado', results),
+        status=status.HTTP_200_OK
+    )
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_info(request):
@@ -232,20 +709,16 @@ def user_info(request):
     Información básica del usuario (para debugging)
     GET /usuarios/api/user/info/
     """
-    user_data = {
-        'id': request.user.id,
-        'username': request.user.username,
-        'email': request.user.email,
-        'first_name': request.user.first_name,
-        'last_name': request.user.last_name,
-        'is_active': request.user.is_active,
-        'date_joined': request.user.date_joined,
-    }
-    
-    return Response(
-        get_api_response('success', 'Información del usuario', user_data),
+    data = build_user_info(request.user)
+    etag = user_etag(data)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    response = Response(
+        get_api_response('success', 'Información del usuario', data),
         status=status.HTTP_200_OK
     )
+    return set_validators(response, etag)
 
 
 @api_view(['GET'])
@@ -259,16 +732,30 @@ def api_status(request):
         get_api_response(
             'success', 
             'API funcionando correctamente',
-            {
-                'version': '1.0.0',
-                'endpoints': [
-                    '/usuarios/api/login/',
-                    '/usuarios/api/perfil/',
-                    '/usuarios/api/usuario/perfil/',
-                    '/usuarios/api/perfil/foto/',
-                    '/usuarios/api/token/refresh/',
-                ]
-            }
+            build_api_status()
         ),
         status=status.HTTP_200_OK
-    )
\ No newline at end of file
+    )
+
+
+@require_GET
+def api_metrics(request):
+    """
+    Métricas de todos los workers en formato de texto de Prometheus
+    GET /usuarios/api/metrics/
+    Vista de Django (no DRF): sin autenticación JWT ni consultas a la base
+    """
+    allowed_ips = metrics.get_metrics_config()['ALLOWED_IPS']
+    if allowed_ips is not None and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Archivos de MEDIA_ROOT (fotos de perfil), también con DEBUG desactivado
+    GET /media/<path>
+    Ver usuarios.media: X-Accel-Redirect / X-Sendfile o FileResponse con Range
+    """
+    return media.media_response(request, path)
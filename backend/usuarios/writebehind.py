@@ -0,0 +1,237 @@
+"""
+Escritura diferida (write-behind) de timestamps no críticos.
+
+``last_login`` se actualiza en cada login; escribirlo en la petición ocupa
+el único escritor de SQLite justo durante las ráfagas de logins. En su lugar
+``touch()`` guarda el valor en memoria, agrupado por ``(modelo, campo, pk)``
+(varios logins del mismo usuario dejan un solo valor), y un hilo del proceso
+escribe todo con un ``bulk_update`` por campo en una sola transacción:
+
+- cada ``FLUSH_INTERVAL`` segundos,
+- antes si hay ``MAX_PENDING`` filas pendientes,
+- y al terminar el proceso (``atexit``).
+
+Un valor tarda como máximo ``FLUSH_INTERVAL`` segundos (más la duración de
+la escritura) en llegar a la base de datos; ``max_staleness`` expone esa
+cota. Si el proceso muere sin pasar por ``atexit`` (SIGKILL) se pierden los
+valores pendientes, por eso solo sirve para datos que toleran perderse.
+``bulk_update`` no dispara señales: el perfil no se reescribe ni se
+invalida ninguna caché.
+
+Solo el login de la API (JWT) pasa por el buffer. ``last_login`` forma parte
+del hash de ``PasswordResetTokenGenerator``: mientras el valor nuevo no se
+escribe, un enlace de restablecimiento de contraseña emitido antes del
+login sigue siendo válido (hasta ``FLUSH_INTERVAL`` segundos, o para siempre
+si el proceso muere con SIGKILL). Por eso los logins de sesión (admin, y
+cualquier flujo que pueda emitir esos enlaces) conservan el
+``update_last_login`` síncrono de Django.
+
+``FLUSH_INTERVAL = 0`` desactiva el buffer: ``touch()`` escribe en el acto
+(tests: la transacción del test no es visible en otros hilos).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WRITE_BEHIND = {
+    'FLUSH_INTERVAL': 5,  # segundos; 0 = escribir en el acto
+    'MAX_PENDING': 1000,  # filas pendientes que adelantan la escritura
+    'BATCH_SIZE': 500,  # filas por UPDATE ... CASE de bulk_update
+}
+
+
+class WriteBehindBuffer:
+    """Valores pendientes ``{(modelo, campo): {pk: valor}}`` y su hilo de escritura"""
+
+    def __init__(self, flush_interval=5, max_pending=1000, batch_size=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._pending = {}
+        self._count = 0
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.flushed = 0
+        self.errors = 0
+        self.last_flush_duration = 0.0
+
+    @property
+    def max_staleness(self):
+        """Cota del tiempo que un valor puede pasar solo en memoria (segundos)"""
+        return self.flush_interval + self.last_flush_duration
+
+    def touch(self, model, pk, field, value):
+        """Anotar ``model(pk).field = value`` para la próxima escritura"""
+        if not self.flush_interval:
+            self.write({(model, field): {pk: value}})
+            return
+        with self._lock:
+            values = self._pending.setdefault((model, field), {})
+            if pk not in values:
+                self._count += 1
+            values[pk] = value
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._count >= self.max_pending
+            count = self._count
+        metrics.write_behind_pending.set(count)
+        self._start()
+        if full:
+            self._wakeup.set()
+
+    async def atouch(self, model, pk, field, value):
+        if not self.flush_interval:
+            await sync_to_async(self.touch)(model, pk, field, value)
+        else:
+            self.touch(model, pk, field, value)
+
+    def flush(self):
+        """Escribir lo pendiente; retorna la cantidad de filas"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            count, self._count = self._count, 0
+            self._oldest = None
+        if not pending:
+            return 0
+        started = time.perf_counter()
+        try:
+            self.write(pending)
+        except Exception:
+            self.errors += 1
+            logger.exception('Error al escribir %d timestamps diferidos', count)
+            self.requeue(pending)
+            return 0
+        finally:
+            self.last_flush_duration = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed += count
+        metrics.write_behind_flushed.inc(count)
+        metrics.write_behind_pending.set(self._count)
+        return count
+
+    def write(self, pending):
+        with transaction.atomic():
+            for (model, field), values in pending.items():
+                model.objects.bulk_update(
+                    [model(pk=pk, **{field: value}) for pk, value in values.items()],
+                    [field],
+                    batch_size=self.batch_size,
+                )
+
+    def requeue(self, pending):
+        """Devolver al buffer los valores de una escritura fallida (sin pisar otros más nuevos)"""
+        with self._lock:
+            for key, values in pending.items():
+                current = self._pending.setdefault(key, {})
+                for pk, value in values.items():
+                    if pk not in current:
+                        current[pk] = value
+                        self._count += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            oldest = self._oldest
+            pending = self._count
+        return {
+            'pending': pending,
+            'oldest_age': time.monotonic() - oldest if oldest is not None else 0.0,
+            'max_staleness': self.max_staleness,
+            'flushes': self.flushes,
+            'flushed': self.flushed,
+            'errors': self.errors,
+            'last_flush_duration': self.last_flush_duration,
+        }
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='usuarios-write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                # El hilo no pasa por request_finished
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_write_behind():
+    """Buffer del proceso configurado en ``settings.WRITE_BEHIND``"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                config = {**DEFAULT_WRITE_BEHIND, **getattr(settings, 'WRITE_BEHIND', {})}
+                _buffer = WriteBehindBuffer(
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    max_pending=config['MAX_PENDING'],
+                    batch_size=config['BATCH_SIZE'],
+                )
+    return _buffer
+
+
+def get_write_behind_stats():
+    return get_write_behind().stats()
+
+
+def flush_write_behind():
+    """Escribir lo pendiente (al terminar el proceso o en tests)"""
+    if _buffer is not None:
+        _buffer.flush()
+
+
+def reset_write_behind():
+    global _buffer
+    _buffer = None
+
+
+atexit.register(flush_write_behind)
+# El hilo de escritura no sobrevive al fork de los workers de gunicorn
+os.register_at_fork(after_in_child=reset_write_behind)
+
+
+@receiver(setting_changed)
+def reset_buffer(setting, **kwargs):
+    if setting == 'WRITE_BEHIND':
+        flush_write_behind()
+        reset_write_behind()
+
+
+def touch_last_login(user):
+    """Actualizar ``user.last_login`` en memoria y anotarlo para la próxima escritura"""
+    user.last_login = timezone.now()
+    get_write_behind().touch(type(user), user.pk, 'last_login', user.last_login)
+
+
+async def atouch_last_login(user):
+    user.last_login = timezone.now()
+    await get_write_behind().atouch(type(user), user.pk, 'last_login', user.last_login)